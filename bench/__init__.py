@@ -0,0 +1 @@
+"""Banc d'essai : classeurs synthétiques (generate) et mesures (run)."""
@@ -0,0 +1,110 @@
+"""Générateur de classeurs synthétiques à la disposition du vrai mandat.
+
+Chaque feuille suit CAMPAIGNS : mêmes noms de feuilles, lignes d'en-tête
+(2/3/3/4 lignes avant les données), colonnes de données, numéro d'ordre,
+identifiant et marque de suppression. Les valeurs imitent le classeur réel :
+noms et régions répétés, CIN et reçus tantôt nombres tantôt textes, dates
+sur une saison, quelques lignes sans date.
+
+    python -m bench.generate sortie.xlsx --rows 100000 [--seed 0]
+
+Les identifiants sont déterministes (record_id(seq)) : le banc d'essai peut
+viser un enregistrement précis sans relire la feuille.
+"""
+import argparse
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import openpyxl
+
+from mandat.campaigns import CAMPAIGNS, DELETED_HEADER, ID_HEADER
+
+REGIONS = [
+    "المسعدين", "الزاوية", "الزهور", "القلعة الكبرى", "القلعة الصغرى", "أكودة", "حمام سوسة",
+    "مساكن", "سيدي بوعلي", "النفيضة", "هرقلة", "كندار", "بوفيشة", "سيدي الهاني", "الكنائس",
+]
+FIRST_NAMES = ["يوسف", "حسن", "رشيدة", "حبيبة", "عز الدين", "زهير", "اقبال", "ناصر", "نادرة", "محمد", "فاطمة", "علي"]
+LAST_NAMES = ["اليزيدي", "بن الحاج علي", "خلفالله", "بوزعبية", "صماري", "دربال", "بن الشيخ", "عزعوزي", "الطرابلسي"]
+SEASON_START = datetime(2026, 1, 5)
+SEASON_DAYS = 120
+
+
+def record_id(seq: int) -> str:
+    """Identifiant (12 caractères) de la ligne numéro "seq" d'une feuille générée."""
+    return f"b{seq:011d}"
+
+
+def _counts(rng, campaign: str, n: int) -> dict:
+    """Totaux et vaccinés (vaccinés <= total) pour chaque paire de la campagne."""
+    out = {}
+    for field in CAMPAIGNS[campaign]["counts"]:
+        if field.startswith("total_"):
+            continue
+        total = "total_" + field[: -len("_vaccines")]
+        totals = rng.integers(0, 250, n)
+        out[total] = totals
+        out[field] = (totals * rng.uniform(0.6, 1.0, n)).astype(np.int64)
+    return out
+
+
+def write_sheet(wb, campaign: str, rows: int, rng):
+    layout = CAMPAIGNS[campaign]
+    ws = wb.create_sheet(layout["sheet"])
+    width = layout["deleted_col"]
+    header_rows = layout["start_row"] - 1
+    for _ in range(header_rows - 1):
+        ws.append([None] * width)
+    header = [None] * width
+    for field, col in layout["columns"].items():
+        header[col - 1] = field
+    header[layout["id_col"] - 1] = ID_HEADER
+    header[layout["deleted_col"] - 1] = DELETED_HEADER
+    ws.append(header)
+
+    counts = _counts(rng, campaign, rows)
+    first = rng.integers(0, len(FIRST_NAMES), rows)
+    last = rng.integers(0, len(LAST_NAMES), rows)
+    regions = rng.integers(0, len(REGIONS), rows)
+    cins = rng.integers(1_000_000, 99_999_999, rows)
+    days = np.sort(rng.integers(0, SEASON_DAYS, rows))
+    undated = rng.random(rows) < 0.002
+    as_text = rng.random(rows) < 0.1  # CIN / reçu saisis comme texte
+
+    cols = layout["columns"]
+    for i in range(rows):
+        row = [None] * width
+        row[cols["nom"] - 1] = f"{FIRST_NAMES[first[i]]} {LAST_NAMES[last[i]]}"
+        row[cols["cin"] - 1] = f"{cins[i]:08d}" if as_text[i] else int(cins[i])
+        row[cols["region"] - 1] = REGIONS[regions[i]]
+        row[cols["recu_num"] - 1] = str(16001 + i) if as_text[i] else 16001 + i
+        row[cols["date"] - 1] = None if undated[i] else SEASON_START + timedelta(days=int(days[i]))
+        for field, values in counts.items():
+            row[cols[field] - 1] = int(values[i])
+        row[layout["seq_col"] - 1] = i + 1
+        row[layout["id_col"] - 1] = record_id(i + 1)
+        ws.append(row)
+
+
+def generate(path: str, rows: int, seed: int = 0, campaigns=None):
+    """Écrit un classeur de "rows" lignes par feuille (openpyxl en écriture seule)."""
+    rng = np.random.default_rng(seed)
+    wb = openpyxl.Workbook(write_only=True)
+    for campaign in campaigns or CAMPAIGNS:
+        write_sheet(wb, campaign, rows, rng)
+    wb.save(path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench.generate", description="Classeur synthétique du mandat.")
+    parser.add_argument("output")
+    parser.add_argument("--rows", type=int, default=10_000, help="lignes par feuille")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    start = time.perf_counter()
+    generate(args.output, args.rows, args.seed)
+    print(f"{args.output} : {args.rows} lignes par feuille en {time.perf_counter() - start:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""Banc d'essai du stockage Excel et des calculs du dashboard.
+
+Pour chaque taille (lignes par feuille), un classeur synthétique est généré
+(bench.generate, gardé dans --workdir pour les exécutions suivantes) puis
+chaque opération est chronométrée --repeat fois :
+
+- load          : excel_io.load_vaccination_data (les quatre feuilles)
+- load_records  : excel_io.load_records_from_excel (écran de modification)
+- append        : excel_io.append_record_to_excel
+- update        : excel_io.update_record_in_excel
+- delete        : excel_io.delete_record_from_excel
+- filter        : aggregates.apply_filters (3 régions, 30 jours) sur les enregistrements
+- aggregate     : aggregates.build_cube puis KPI et totaux par région
+
+Les écritures portent sur une copie du classeur généré. Les résultats sont
+écrits en JSON (--output, sinon sortie standard) ; --baseline compare à un
+résultat précédent et sort en erreur si une médiane dépasse
+--threshold × celle de référence.
+
+    python -m bench.run --sizes 1000,10000,100000 --repeat 3 --output bench.json
+    python -m bench.run --sizes 1000,10000 --baseline bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import openpyxl
+import pandas as pd
+
+from bench.generate import SEASON_START, generate, record_id
+from mandat import aggregates, excel_io
+from mandat.campaigns import CAMPAIGNS
+
+OPERATIONS = ["load", "load_records", "append", "update", "delete", "filter", "aggregate"]
+DEFAULT_SIZES = [1_000, 10_000, 50_000]
+
+
+def _sample_record(campaign: str) -> dict:
+    rec = {"nom": "Banc d'essai", "cin": "01234567", "region": "المسعدين", "recu_num": "B-1",
+           "date": SEASON_START}
+    for field in CAMPAIGNS[campaign]["counts"]:
+        rec[field] = 1
+    return rec
+
+
+def _timed(fn, repeat: int) -> list:
+    times = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        fn(i)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def workbook(workdir: str, rows: int, seed: int) -> str:
+    """Classeur généré pour cette taille (réutilisé s'il existe déjà)."""
+    path = os.path.join(workdir, f"mandat-{rows}-{seed}.xlsx")
+    if not os.path.exists(path):
+        generate(path + ".tmp", rows, seed)
+        os.replace(path + ".tmp", path)
+    return path
+
+
+def bench_size(source: str, rows: int, campaign: str, operations: list, repeat: int) -> list:
+    """Chronomètre les opérations demandées sur un classeur ; une entrée par opération."""
+    path = source + ".work.xlsx"
+    shutil.copyfile(source, path)  # les écritures ne touchent pas le classeur généré
+    rec = _sample_record(campaign)
+    data = excel_io.load_vaccination_data(path)
+    df = data[campaign]
+    regions = list(df["region"].cat.categories[:3])
+    date_range = (pd.Timestamp(SEASON_START), pd.Timestamp(SEASON_START) + pd.Timedelta(days=30))
+
+    runs = {
+        "load": lambda i: excel_io.load_vaccination_data(path),
+        "load_records": lambda i: excel_io.load_records_from_excel(path, campaign),
+        "append": lambda i: excel_io.append_record_to_excel(path, campaign, rec),
+        # une ligne différente à chaque passe, près du milieu de la feuille
+        "update": lambda i: excel_io.update_record_in_excel(path, campaign, record_id(rows // 2 + i), rec),
+        "delete": lambda i: excel_io.delete_record_from_excel(path, campaign, record_id(rows // 3 + i)),
+        "filter": lambda i: aggregates.apply_filters(df, regions, date_range),
+        "aggregate": lambda i: aggregates.by_region(_cube_kpis(df, campaign), campaign),
+    }
+    results = []
+    try:
+        for op in operations:
+            times = _timed(runs[op], repeat)
+            results.append({
+                "rows": rows, "campaign": campaign, "op": op, "repeat": repeat,
+                "min": min(times), "median": statistics.median(times), "max": max(times), "times": times,
+            })
+            print(f"{rows:>8} {op:<13} médiane {results[-1]['median'] * 1000:10.1f} ms", file=sys.stderr)
+    finally:
+        os.remove(path)
+    return results
+
+
+def _cube_kpis(df, campaign):
+    cube = aggregates.build_cube(df, campaign)
+    aggregates.kpis(cube, campaign)
+    return cube
+
+
+def environment() -> dict:
+    return {
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "pandas": pd.__version__,
+        "openpyxl": openpyxl.__version__,
+    }
+
+
+def compare(results: list, baseline: dict, threshold: float) -> list:
+    """Opérations dont la médiane dépasse threshold × la médiane de référence."""
+    reference = {(r["rows"], r["campaign"], r["op"]): r["median"] for r in baseline["results"]}
+    slower = []
+    for r in results:
+        ref = reference.get((r["rows"], r["campaign"], r["op"]))
+        if ref and r["median"] > threshold * ref:
+            slower.append({"rows": r["rows"], "op": r["op"], "median": r["median"], "baseline": ref,
+                           "ratio": round(r["median"] / ref, 2)})
+    return slower
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m bench.run", description="Banc d'essai du mandat sanitaire.")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="lignes par feuille, séparées par des virgules (1000 à 500000)")
+    parser.add_argument("--ops", default=",".join(OPERATIONS), help="opérations à chronométrer")
+    parser.add_argument("--campaign", default="aphto_ovin_caprin", choices=list(CAMPAIGNS))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", default=os.path.join(tempfile.gettempdir(), "mandat-bench"),
+                        help="dossier des classeurs générés (réutilisés d'une exécution à l'autre)")
+    parser.add_argument("--output", "-o", help="fichier JSON de résultats (défaut : sortie standard)")
+    parser.add_argument("--baseline", help="résultats JSON de référence à comparer")
+    parser.add_argument("--threshold", type=float, default=1.25, help="ralentissement toléré (ratio des médianes)")
+    args = parser.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    operations = [op for op in args.ops.split(",") if op]
+    unknown = [op for op in operations if op not in OPERATIONS]
+    if unknown:
+        parser.error(f"Opération inconnue : {', '.join(unknown)}")
+    os.makedirs(args.workdir, exist_ok=True)
+
+    results = []
+    for rows in sizes:
+        source = workbook(args.workdir, rows, args.seed)
+        results.extend(bench_size(source, rows, args.campaign, operations, args.repeat))
+    report = {"environment": environment(), "results": results}
+
+    status = 0
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            report["regressions"] = compare(results, json.load(f), args.threshold)
+        status = 1 if report["regressions"] else 0
+
+    text = json.dumps(report, ensure_ascii=False, indent=2) + "\n"
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        sys.stdout.write(text)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
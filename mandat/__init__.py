@@ -0,0 +1 @@
+"""Couche de données partagée par les pages Streamlit du Mandat Sanitaire."""
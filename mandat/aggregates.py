@@ -0,0 +1,130 @@
+"""Agrégats pré-calculés par campagne × région × jour.
+
+Le "cube" d'une campagne est un DataFrame avec une ligne par couple
+(région, jour) : "n" (nombre d'enregistrements) et la somme de chaque
+colonne de comptage. Il ne dépend que des données, pas des filtres : les
+KPI, graphiques et montants du dashboard filtrent le cube (quelques
+centaines de lignes) au lieu des enregistrements.
+
+Avec le stockage SQLite, le cube est une table tenue à jour dans la même
+transaction que chaque écriture (voir sqlite_store) ; avec le classeur, il
+est reconstruit une fois par version de la campagne.
+
+Les séries temporelles (timeseries) regroupent le cube par jour, semaine ou
+mois selon la durée de la période, pour garder un nombre de points borné.
+"""
+import pandas as pd
+
+from mandat.campaigns import count_fields, vaccinated_fields
+
+CUBE_KEYS = ["region", "date"]
+
+# Résolution de la série temporelle selon la durée de la période (en jours) :
+# (durée maximale, règle de rééchantillonnage pandas, libellé)
+RESOLUTIONS = [
+    (62, "D", "jour"),
+    (366, "W-MON", "semaine"),
+    (None, "MS", "mois"),
+]
+
+
+def cube_columns(campaign: str) -> list:
+    return CUBE_KEYS + ["n"] + count_fields(campaign)
+
+
+def build_cube(df: pd.DataFrame, campaign: str) -> pd.DataFrame:
+    """Cube d'une campagne à partir de ses enregistrements (DataFrame du dashboard)."""
+    counts = count_fields(campaign)
+    if df.empty:
+        # même schéma qu'un cube non vide : date en datetime64 (résolution de la source), comptages entiers
+        dated = "date" in df.columns and pd.api.types.is_datetime64_any_dtype(df["date"])
+        return pd.DataFrame(columns=cube_columns(campaign)).astype(
+            {"date": df["date"].dtype if dated else "datetime64[ns]", "n": "int64", **{c: "int64" for c in counts}}
+        )
+    grouped = df.assign(date=df["date"].dt.normalize()).groupby(CUBE_KEYS, dropna=False, sort=True, observed=True)
+    cube = grouped[counts].sum()
+    cube.insert(0, "n", grouped.size())
+    return cube.reset_index()[cube_columns(campaign)]
+
+
+def apply_filters(df: pd.DataFrame, regions=None, date_range=None) -> pd.DataFrame:
+    """Filtre région / période, sur les enregistrements comme sur le cube."""
+    if regions:
+        df = df[df['region'].isin(regions)]
+    if date_range is not None:
+        df = df[(df['date'] >= date_range[0]) & (df['date'] <= date_range[1])]
+    return df
+
+
+def totals(cube: pd.DataFrame, campaign: str) -> dict:
+    """Totaux d'un cube (éventuellement filtré) : {"n": ..., comptage: ...}."""
+    return {c: int(cube[c].sum()) for c in ["n"] + count_fields(campaign)}
+
+
+def kpis(cube: pd.DataFrame, campaign: str) -> dict:
+    """Indicateurs du dashboard : totaux, animaux vaccinés / recensés et taux (%)."""
+    out = totals(cube, campaign)
+    vaccinated = vaccinated_fields(campaign)
+    out["vaccines"] = sum(out[f] for f in vaccinated)
+    out["animaux"] = sum(out[f] for f in count_fields(campaign) if f not in vaccinated)
+    out["taux"] = round(out["vaccines"] / out["animaux"] * 100, 1) if out["animaux"] > 0 else 0.0
+    return out
+
+
+def by_region(cube: pd.DataFrame, campaign: str) -> pd.DataFrame:
+    """Totaux par région."""
+    return cube.groupby("region", sort=False, observed=True)[["n"] + count_fields(campaign)].sum().reset_index()
+
+
+def by_day(cube: pd.DataFrame, campaign: str) -> pd.DataFrame:
+    """Totaux par jour (jours sans date exclus), triés par date."""
+    return cube.dropna(subset=["date"]).groupby("date")[["n"] + count_fields(campaign)].sum().reset_index()
+
+
+def resolution(start, end) -> tuple:
+    """(règle pandas, libellé) adaptés à une période [start, end]."""
+    days = (pd.Timestamp(end) - pd.Timestamp(start)).days + 1
+    for max_days, rule, label in RESOLUTIONS:
+        if max_days is None or days <= max_days:
+            return rule, label
+
+
+def timeseries(cube: pd.DataFrame, campaign: str, date_range=None):
+    """Vaccinations par jour, semaine ou mois ; renvoie (DataFrame, libellé de la résolution).
+
+    La résolution dépend de la période choisie (ou, à défaut, des dates
+    présentes). Le DataFrame a les colonnes "date" (début de chaque
+    période), "n", les comptages et "total" (animaux vaccinés).
+    """
+    daily = by_day(cube, campaign)
+    if daily.empty:
+        return daily.assign(total=pd.Series(dtype="int64")), "jour"
+    start, end = date_range if date_range is not None else (daily["date"].iloc[0], daily["date"].iloc[-1])
+    rule, label = resolution(start, end)
+    # by_day est trié par date : rééchantillonnage direct sur l'index
+    series = daily.set_index("date").resample(rule, label="left", closed="left").sum()
+    series["total"] = series[vaccinated_fields(campaign)].sum(axis=1)
+    return series.reset_index(), label
+
+
+def timeseries_by_year(cube: pd.DataFrame, campaign: str):
+    """Une série par année ("annee", voir mandat.federation), pour comparer les saisons.
+
+    Les dates de chaque année sont ramenées sur l'année la plus récente : les
+    courbes se superposent jour pour jour. La résolution est la même pour
+    toutes les années (celle de la saison la plus longue).
+    """
+    dated = cube.dropna(subset=["date"])
+    if dated.empty:
+        return timeseries(dated, campaign)[0].assign(annee=pd.Series(dtype="int64")), "jour"
+    latest = int(dated["annee"].max())
+    aligned = [
+        (annee, group.assign(date=group["date"] + pd.DateOffset(years=latest - int(annee))))
+        for annee, group in dated.groupby("annee", observed=True, sort=True)
+    ]
+    span = (min(g["date"].min() for _, g in aligned), max(g["date"].max() for _, g in aligned))
+    series = []
+    for annee, group in aligned:
+        ts, label = timeseries(group, campaign, span)
+        series.append(ts.assign(annee=annee))
+    return pd.concat(series, ignore_index=True), label
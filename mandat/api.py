@@ -0,0 +1,189 @@
+"""Service HTTP JSON local : ajout d'enregistrements et lecture des KPI.
+
+    python -m mandat.api [--host 127.0.0.1] [--port 8502] [--workbook "data/mandat sanitaire 2026.xlsx"]
+
+Routes :
+- GET  /campaigns                          campagnes et version de leurs données
+- GET  /campaigns/<campagne>/kpis          KPI et montant (mêmes chiffres que le dashboard)
+- GET  /campaigns/<campagne>/regions       animaux facturés et montant par région
+- POST /campaigns/<campagne>/records       lot d'enregistrements (liste JSON ou {"records": [...]})
+
+Les GET acceptent les filtres region (répétable), start et end (AAAA-MM-JJ,
+fin incluse) et les prix de la campagne (prix_ovin=1.5...). Les POST sont
+validés comme l'import groupé (bulk_import.validate_records) et ajoutés par
+storage.ingest_records : journal en mode Excel, une transaction en mode
+SQLite, jamais une réécriture complète du classeur par requête.
+
+Le service partage le stockage et les verrous des pages, et lit les cubes
+dans l'instantané tenu à jour par mandat.watcher : un ajout apparaît dans
+les KPI dès que le watcher a vu la nouvelle version (une seconde environ).
+"""
+import argparse
+import json
+import logging
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pandas as pd
+
+from mandat import aggregates, billing, bulk_import, federation, storage, watcher
+from mandat.campaigns import CAMPAIGNS
+from mandat.locking import LockTimeout
+from mandat.report import date_range
+
+DATA_FILE = federation.CURRENT_WORKBOOK
+MAX_BODY = 5 * 1024 * 1024  # octets
+
+logger = logging.getLogger(__name__)
+
+
+class ApiError(Exception):
+    def __init__(self, status: HTTPStatus, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+# ---------------------------
+# ROUTES
+# ---------------------------
+def _filters(query: dict, campaign: str):
+    regions = query.get("region")
+    dates = date_range(query.get("start", [None])[0], query.get("end", [None])[0])
+    prices = {campaign: {k: float(v[0]) for k, v in query.items() if k in billing.PRICE_FIELDS[campaign]}}
+    return regions, dates, prices
+
+
+def get_campaigns(path: str) -> dict:
+    snapshots = watcher.ensure_watcher(path).snapshots()
+    return {"campaigns": [{"campaign": c, "version": str(s.version), "records": len(s.data)} for c, s in snapshots.items()]}
+
+
+def get_kpis(path: str, campaign: str, query: dict) -> dict:
+    regions, dates, prices = _filters(query, campaign)
+    snap = watcher.ensure_watcher(path).snapshots()[campaign]
+    kpis = aggregates.kpis(aggregates.apply_filters(snap.cube, regions, dates), campaign)
+    kpis["montant"] = billing.amount(kpis, campaign, prices)
+    return {"campaign": campaign, "version": str(snap.version), "kpis": kpis}
+
+
+def get_regions(path: str, campaign: str, query: dict) -> dict:
+    regions, dates, prices = _filters(query, campaign)
+    snap = watcher.ensure_watcher(path).snapshots()[campaign]
+    by_region = billing.region_amounts(aggregates.apply_filters(snap.cube, regions, dates), campaign, prices)
+    return {"campaign": campaign, "version": str(snap.version), "regions": by_region.to_dict("records")}
+
+
+def post_records(path: str, campaign: str, payload) -> dict:
+    """Valide le lot et ajoute les lignes valides ; les refus sont renvoyés avec leur motif."""
+    records = payload.get("records") if isinstance(payload, dict) else payload
+    if not isinstance(records, list) or not all(isinstance(r, dict) for r in records):
+        raise ApiError(HTTPStatus.BAD_REQUEST, "Le corps doit être une liste d'enregistrements")
+    try:
+        valid, rejects = bulk_import.validate_records(pd.DataFrame(records), campaign)
+    except ValueError as exc:  # colonnes manquantes
+        raise ApiError(HTTPStatus.UNPROCESSABLE_ENTITY, str(exc))
+    # numéro de ligne du fichier -> position dans le lot (à partir de 0)
+    rejected = [{"index": int(row["ligne"]) - 2, "motif": row["motif"]} for row in rejects.to_dict("records")]
+    storage.ingest_records(path, campaign, bulk_import.records_from_frame(valid, campaign))
+    return {"campaign": campaign, "accepted": len(valid), "rejected": rejected}
+
+
+# ---------------------------
+# SERVEUR
+# ---------------------------
+class ApiHandler(BaseHTTPRequestHandler):
+    server_version = "MandatAPI/1.0"
+    path_xlsx = DATA_FILE  # remplacé par make_server
+
+    def _route(self):
+        url = urlsplit(self.path)
+        parts = [p for p in url.path.split("/") if p]
+        if not parts or parts[0] != "campaigns":
+            raise ApiError(HTTPStatus.NOT_FOUND, "Route inconnue")
+        if len(parts) == 1:
+            return None, None, parse_qs(url.query)
+        if parts[1] not in CAMPAIGNS:
+            raise ApiError(HTTPStatus.NOT_FOUND, f"Campagne inconnue : {parts[1]}")
+        if len(parts) != 3:
+            raise ApiError(HTTPStatus.NOT_FOUND, "Route inconnue")
+        return parts[1], parts[2], parse_qs(url.query)
+
+    def _send(self, status: HTTPStatus, body: dict):
+        data = json.dumps(body, ensure_ascii=False, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _handle(self, method: str):
+        try:
+            campaign, resource, query = self._route()
+            if method == "GET" and campaign is None:
+                body = get_campaigns(self.path_xlsx)
+            elif method == "GET" and resource == "kpis":
+                body = get_kpis(self.path_xlsx, campaign, query)
+            elif method == "GET" and resource == "regions":
+                body = get_regions(self.path_xlsx, campaign, query)
+            elif method == "POST" and resource == "records":
+                length = int(self.headers.get("Content-Length") or 0)
+                if length > MAX_BODY:
+                    raise ApiError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Lot trop volumineux")
+                try:
+                    payload = json.loads(self.rfile.read(length) or b"null")
+                except json.JSONDecodeError as exc:
+                    raise ApiError(HTTPStatus.BAD_REQUEST, f"JSON invalide : {exc}")
+                body = post_records(self.path_xlsx, campaign, payload)
+                self._send(HTTPStatus.CREATED if body["accepted"] else HTTPStatus.UNPROCESSABLE_ENTITY, body)
+                return
+            else:
+                raise ApiError(HTTPStatus.METHOD_NOT_ALLOWED, "Méthode non autorisée")
+            self._send(HTTPStatus.OK, body)
+        except ApiError as exc:
+            self._send(exc.status, {"error": str(exc)})
+        except ValueError as exc:  # filtres mal formés (date, prix)
+            self._send(HTTPStatus.BAD_REQUEST, {"error": str(exc)})
+        except LockTimeout:
+            self._send(HTTPStatus.SERVICE_UNAVAILABLE, {"error": "Stockage occupé, réessayez"})
+        except Exception:  # classeur illisible, erreur SQLite... : le client reçoit quand même une réponse
+            logger.exception("%s %s : erreur interne", method, self.path)
+            self._send(HTTPStatus.INTERNAL_SERVER_ERROR, {"error": "Erreur interne du service"})
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def log_message(self, format, *args):
+        pass  # pas de ligne par requête sur la sortie d'erreur
+
+
+def make_server(path: str = DATA_FILE, host: str = "127.0.0.1", port: int = 8502) -> ThreadingHTTPServer:
+    """Serveur (un thread par requête) prêt à servir ; le watcher est chargé au démarrage."""
+    watcher.ensure_watcher(path)
+    handler = type("Handler", (ApiHandler,), {"path_xlsx": path})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m mandat.api", description="API JSON du mandat sanitaire.")
+    parser.add_argument("--workbook", default=DATA_FILE)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8502)
+    args = parser.parse_args(argv)
+    server = make_server(args.workbook, args.host, args.port)
+    print(f"API du mandat sur http://{args.host}:{args.port}/campaigns")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
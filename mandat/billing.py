@@ -0,0 +1,125 @@
+"""Tarifs de la campagne et montants à payer.
+
+Chaque prix s'applique à une colonne d'animaux vaccinés (PRICE_FIELDS) ;
+les montants se calculent sur le cube d'agrégats (voir mandat.aggregates),
+pour la période et les régions choisies.
+
+invoice() produit le décompte consolidé des quatre campagnes en une passe :
+les cubes sont mis en format long (une ligne par région × jour × colonne
+facturée), joints à la table des prix (price_table), puis regroupés par
+campagne × région × période de facturation.
+"""
+import pandas as pd
+
+from mandat import aggregates
+from mandat.federation import DIMENSIONS
+
+# Prix unitaires par défaut (DT), modifiables dans la calculatrice ou en ligne de commande
+PRIX_DEFAULT = {
+    "aphto_ovin_caprin": {"prix_ovin": 0.0, "prix_caprin": 0.0},
+    "ovin_clavelee": {"prix_ovin": 0.0},
+    "bovin_aphto": {"prix_bovin": 0.0},
+    "rage": {"prix_chien": 0.0},
+}
+
+# Colonne facturée pour chaque prix
+PRICE_FIELDS = {
+    "aphto_ovin_caprin": {"prix_ovin": "ovins_vaccines", "prix_caprin": "caprins_vaccines"},
+    "ovin_clavelee": {"prix_ovin": "ovins_vaccines"},
+    "bovin_aphto": {"prix_bovin": "bovins_vaccines"},
+    "rage": {"prix_chien": "chiens_vaccines"},
+}
+
+
+def campaign_prices(prices: dict, campaign: str) -> dict:
+    """Prix d'une campagne : ceux de "prices", complétés par PRIX_DEFAULT."""
+    return {**PRIX_DEFAULT[campaign], **{k: float(v) for k, v in (prices or {}).get(campaign, {}).items()}}
+
+
+def amount(totals: dict, campaign: str, prices: dict) -> float:
+    """Montant total pour des totaux (aggregates.totals) et une table de prix."""
+    unit = campaign_prices(prices, campaign)
+    return float(sum(totals[field] * unit[key] for key, field in PRICE_FIELDS[campaign].items()))
+
+
+def price_table(prices: dict = None) -> pd.DataFrame:
+    """Table des prix des quatre campagnes : campagne, prix, colonne facturée, prix unitaire."""
+    return pd.DataFrame(
+        [
+            {"campagne": campaign, "prix": key, "champ": field, "prix_unitaire": campaign_prices(prices, campaign)[key]}
+            for campaign, fields in PRICE_FIELDS.items()
+            for key, field in fields.items()
+        ],
+        columns=["campagne", "prix", "champ", "prix_unitaire"],
+    )
+
+
+# Périodes de facturation (fréquences pandas des Period)
+PERIODS = {"mois": "M", "trimestre": "Q", "année": "Y"}
+
+
+def invoice(cubes: dict, prices: dict = None, regions=None, date_range=None, period: str = "M") -> pd.DataFrame:
+    """Décompte consolidé : une ligne par campagne × région × période × prix.
+
+    "cubes" est {campagne: cube} (une ou plusieurs campagnes) ; les filtres
+    région / période s'appliquent à toutes. "period" est une fréquence de
+    PERIODS ("M" : mois), ou None pour toute la période. Les colonnes
+    "annee" et "gouvernorat" des cubes combinés (mandat.federation) sont
+    gardées comme dimensions.
+    """
+    frames = []
+    for campaign, cube in cubes.items():
+        cube = aggregates.apply_filters(cube, regions, date_range)
+        keys = [c for c in ["region", "date"] + DIMENSIONS if c in cube.columns]
+        long = cube.melt(id_vars=keys, value_vars=list(PRICE_FIELDS[campaign].values()),
+                         var_name="champ", value_name="quantite")
+        frames.append(long.assign(campagne=campaign, region=long["region"].astype(object)))
+    long = pd.concat(frames, ignore_index=True).merge(price_table(prices), on=["campagne", "champ"], how="left")
+    long["montant"] = long["quantite"] * long["prix_unitaire"]
+
+    dims = [c for c in DIMENSIONS if c in long.columns]
+    keys = ["campagne"] + dims + ["region"]
+    if period:
+        # une campagne vide peut fournir une colonne date non typée
+        long["date"] = pd.to_datetime(long["date"])
+        long["periode"] = long["date"].dt.to_period(period).astype(str).where(long["date"].notna(), "sans date")
+        keys.append("periode")
+    out = long.groupby(keys + ["prix", "champ"], sort=True, dropna=False).agg(
+        quantite=("quantite", "sum"), prix_unitaire=("prix_unitaire", "first"), montant=("montant", "sum"),
+    )
+    out["montant"] = out["montant"].round(3)  # au millime
+    return out.reset_index()
+
+
+def line_items(datasets: dict, prices: dict = None) -> pd.DataFrame:
+    """Lignes facturées saisie par saisie : une ligne par enregistrement × colonne facturée non nulle.
+
+    "datasets" est {campagne: enregistrements} (DataFrames du dashboard) ;
+    même jointure sur price_table que invoice, sans agrégation.
+    """
+    frames = []
+    for campaign, df in datasets.items():
+        fields = list(PRICE_FIELDS[campaign].values())
+        ids = [c for c in ["nom", "cin", "region", "recu_num", "date"] + DIMENSIONS if c in df.columns]
+        long = df[ids + fields].melt(id_vars=ids, value_vars=fields, var_name="champ", value_name="quantite")
+        frames.append(long[long["quantite"] > 0].assign(campagne=campaign))
+    long = pd.concat(frames, ignore_index=True).merge(price_table(prices), on=["campagne", "champ"], how="left")
+    long["quantite"] = long["quantite"].astype("int64")
+    long["montant"] = (long["quantite"] * long["prix_unitaire"]).round(3)
+    return long
+
+
+def region_table(inv: pd.DataFrame, campaign: str) -> pd.DataFrame:
+    """Animaux facturés (une colonne par colonne facturée) et montant par région, à partir d'un décompte."""
+    fields = list(PRICE_FIELDS[campaign].values())
+    inv = inv[inv["campagne"] == campaign]
+    by_region = inv.pivot_table(index="region", columns="champ", values="quantite", aggfunc="sum")
+    by_region = by_region.reindex(columns=fields, fill_value=0).astype("int64")
+    by_region["montant"] = inv.groupby("region")["montant"].sum()
+    by_region.columns.name = None
+    return by_region.reset_index().sort_values("montant", ascending=False, kind="stable")
+
+
+def region_amounts(cube: pd.DataFrame, campaign: str, prices: dict) -> pd.DataFrame:
+    """Animaux facturés et montant par région, du plus grand montant au plus petit."""
+    return region_table(invoice({campaign: cube}, prices, period=None), campaign)
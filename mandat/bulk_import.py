@@ -0,0 +1,112 @@
+"""Import groupé d'enregistrements depuis un fichier CSV ou Excel.
+
+Le fichier est lu en entier, validé colonne par colonne (opérations
+vectorisées pandas, pas de boucle par ligne), puis les lignes valides sont
+ajoutées en une seule écriture (voir storage.append_records). Les lignes
+refusées sont renvoyées avec leur numéro de ligne et le motif du refus.
+"""
+import io
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+from mandat.campaigns import CAMPAIGNS, TEXT_FIELDS, record_fields
+
+# Paires (vaccinés, total) : on ne peut pas vacciner plus d'animaux qu'il n'y en a
+VACCINATED_TOTALS = {
+    "aphto_ovin_caprin": [("ovins_vaccines", "total_ovins"), ("caprins_vaccines", "total_caprins")],
+    "ovin_clavelee": [("ovins_vaccines", "total_ovins")],
+    "bovin_aphto": [("bovins_vaccines", "total_bovins")],
+    "rage": [("chiens_vaccines", "total_chiens")],
+}
+
+
+def _normalize_header(name) -> str:
+    """"Ovins vaccinés " -> "ovins_vaccines" (casse, accents et espaces ignorés)."""
+    text = unicodedata.normalize("NFKD", str(name)).encode("ascii", "ignore").decode("ascii")
+    return "_".join(text.strip().lower().split())
+
+
+def template_csv(campaign: str) -> bytes:
+    """Fichier CSV vide avec les colonnes attendues pour la campagne."""
+    return (";".join(record_fields(campaign)) + "\n").encode("utf-8-sig")
+
+
+def read_upload(file_obj, filename: str) -> pd.DataFrame:
+    """Lit un fichier CSV (séparateur détecté) ou Excel (première feuille), tout en texte.
+
+    Tout est lu en texte pour ne pas perdre les zéros en tête des CIN ; la
+    conversion des dates et des nombres est faite par validate_records.
+    """
+    data = file_obj.getvalue() if hasattr(file_obj, "getvalue") else file_obj.read()
+    if filename.lower().endswith((".xlsx", ".xlsm")):
+        df = pd.read_excel(io.BytesIO(data), dtype=str)
+    else:
+        df = pd.read_csv(io.BytesIO(data), sep=None, engine="python", dtype=str, encoding="utf-8-sig")
+    df.columns = [_normalize_header(c) for c in df.columns]
+    return df
+
+
+def validate_records(df: pd.DataFrame, campaign: str):
+    """Valide toutes les lignes d'un coup.
+
+    Renvoie (valides, refus) : "valides" a les colonnes de record_fields,
+    typées comme les DataFrames du dashboard ; "refus" contient le numéro
+    de ligne du fichier ("ligne", en-tête = ligne 1), les données d'origine
+    et le motif ("motif").
+    """
+    fields = record_fields(campaign)
+    missing = [f for f in fields if f not in df.columns]
+    if missing:
+        raise ValueError(f"Colonnes manquantes : {', '.join(missing)}")
+
+    # contrôles accumulés (masque, motif) puis appliqués en une fois : pas
+    # d'écriture ligne à ligne ni d'insertion de colonne par contrôle
+    checks = []
+    clean = {}
+    for field in TEXT_FIELDS:
+        clean[field] = df[field].fillna("").astype(str).str.strip()
+        checks.append((clean[field] == "", f"{field} manquant"))
+
+    # AAAA-MM-JJ (cellules date d'Excel lues en texte) ou JJ/MM/AAAA (saisie manuelle)
+    raw_dates = df["date"].fillna("").astype(str).str.strip()
+    iso = raw_dates.str.match(r"^\d{4}-\d{2}-\d{2}")
+    dates = pd.to_datetime(raw_dates.where(~iso), errors="coerce", dayfirst=True, format="mixed")
+    if iso.any():
+        dates[iso] = pd.to_datetime(raw_dates[iso], errors="coerce", format="ISO8601")
+    clean["date"] = dates
+    checks.append((dates.isna(), "date invalide"))
+
+    for field in CAMPAIGNS[campaign]["counts"]:
+        raw = df[field].fillna("").astype(str).str.strip().replace("", "0")
+        values = pd.to_numeric(raw.str.replace(",", ".", regex=False), errors="coerce")
+        bad = values.isna() | (values < 0) | (values % 1 != 0)
+        checks.append((bad, f"{field} n'est pas un entier positif"))
+        clean[field] = values.where(~bad, 0).astype("int64")
+
+    for vaccinated, total in VACCINATED_TOTALS[campaign]:
+        checks.append((clean[vaccinated] > clean[total], f"{vaccinated} > {total}"))
+
+    reasons = np.full(len(df), "", dtype=object)
+    for mask, message in checks:
+        mask = np.asarray(mask, dtype=bool)
+        if mask.any():
+            reasons[mask] += message + " ; "
+    reasons = pd.Series(reasons, index=df.index, dtype=object)
+    clean = pd.DataFrame(clean, index=df.index)
+
+    rejected = reasons != ""
+    valid = clean.loc[~rejected, fields].reset_index(drop=True)
+    rejects = df.loc[rejected].copy()
+    rejects.insert(0, "ligne", rejects.index + 2)
+    rejects["motif"] = reasons[rejected].str.rstrip(" ;")
+    return valid, rejects.reset_index(drop=True)
+
+
+def records_from_frame(df: pd.DataFrame, campaign: str) -> list:
+    """Enregistrements (dictionnaires) prêts pour storage.append_records."""
+    records = df[record_fields(campaign)].to_dict("records")
+    for rec in records:
+        rec["date"] = rec["date"].to_pydatetime()
+    return records
@@ -0,0 +1,112 @@
+"""Description des quatre campagnes et de leur disposition dans le classeur Excel."""
+import uuid
+
+# ---------------------------
+# DISPOSITION DES FEUILLES
+# ---------------------------
+# Les numéros de colonnes sont ceux d'Excel (1 = A). "start_row" est la
+# première ligne de données, "seq_col" la colonne du numéro d'ordre.
+# "id_col" (identifiant stable) et "deleted_col" (marque de suppression)
+# sont des colonnes techniques ajoutées à droite des données.
+CAMPAIGNS = {
+    "aphto_ovin_caprin": {
+        "sheet": "aphto ovin et caprin",
+        "start_row": 3,
+        "seq_col": 13,  # M
+        "max_col": 14,
+        "id_col": 15,  # O
+        "deleted_col": 16,  # P
+        "columns": {
+            "total_caprins": 4,  # D
+            "total_ovins": 5,  # E
+            "caprins_vaccines": 6,  # F
+            "ovins_vaccines": 7,  # G
+            "recu_num": 8,  # H
+            "date": 9,  # I
+            "region": 10,  # J
+            "cin": 11,  # K
+            "nom": 12,  # L
+        },
+        "counts": ["ovins_vaccines", "caprins_vaccines", "total_ovins", "total_caprins"],
+    },
+    "ovin_clavelee": {
+        "sheet": "ovin clavelee",
+        "start_row": 4,
+        "seq_col": 10,  # J
+        "max_col": 10,
+        "id_col": 11,  # K
+        "deleted_col": 12,  # L
+        "columns": {
+            "total_ovins": 3,  # C
+            "ovins_vaccines": 4,  # D
+            "recu_num": 5,  # E
+            "date": 6,  # F
+            "region": 7,  # G
+            "cin": 8,  # H
+            "nom": 9,  # I
+        },
+        "counts": ["ovins_vaccines", "total_ovins"],
+    },
+    "bovin_aphto": {
+        "sheet": "bovin aphto",
+        "start_row": 4,
+        "seq_col": 12,  # L
+        "max_col": 12,
+        "id_col": 13,  # M
+        "deleted_col": 14,  # N
+        "columns": {
+            "total_bovins": 5,  # E
+            "bovins_vaccines": 6,  # F
+            "recu_num": 7,  # G
+            "date": 8,  # H
+            "region": 9,  # I
+            "cin": 10,  # J
+            "nom": 11,  # K
+        },
+        "counts": ["bovins_vaccines", "total_bovins"],
+    },
+    "rage": {
+        "sheet": "داء الكلب",
+        "start_row": 5,
+        "seq_col": 11,  # K
+        "max_col": 11,
+        "id_col": 12,  # L
+        "deleted_col": 13,  # M
+        "columns": {
+            "total_chiens": 4,  # D
+            "chiens_vaccines": 5,  # E
+            "recu_num": 6,  # F
+            "date": 7,  # G
+            "region": 8,  # H
+            "cin": 9,  # I
+            "nom": 10,  # J
+        },
+        "counts": ["chiens_vaccines", "total_chiens"],
+    },
+}
+
+TEXT_FIELDS = ["nom", "cin", "region", "recu_num"]
+
+# En-têtes écrits au-dessus des colonnes techniques
+ID_HEADER = "id"
+DELETED_HEADER = "supprimé"
+
+
+def new_record_id() -> str:
+    """Identifiant stable d'un enregistrement (indépendant de sa ligne)."""
+    return uuid.uuid4().hex[:12]
+
+
+def count_fields(campaign: str) -> list:
+    """Colonnes de comptage (animaux) d'une campagne."""
+    return list(CAMPAIGNS[campaign]["counts"])
+
+
+def vaccinated_fields(campaign: str) -> list:
+    """Colonnes des animaux vaccinés (sans les totaux)."""
+    return [f for f in CAMPAIGNS[campaign]["counts"] if f.endswith("_vaccines")]
+
+
+def record_fields(campaign: str) -> list:
+    """Champs d'un enregistrement, dans l'ordre utilisé par le dashboard."""
+    return ["nom", "cin", "region", "date", "recu_num"] + count_fields(campaign)
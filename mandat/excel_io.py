@@ -0,0 +1,662 @@
+"""Lecture et écriture du classeur Excel du mandat sanitaire (openpyxl)."""
+import hashlib
+import io
+import multiprocessing
+import os
+import re
+import threading
+import zipfile
+import xml.etree.ElementTree as ET
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from copy import copy
+
+import numpy as np
+import openpyxl
+import pandas as pd
+from openpyxl.packaging.custom import StringProperty
+
+from mandat import profiling
+from mandat.campaigns import CAMPAIGNS, DELETED_HEADER, ID_HEADER, new_record_id, record_fields
+from mandat.locking import StaleRecordError, check_version, record_version, workbook_lock
+from mandat.schema import normalize_frame
+
+
+# Propriété personnalisée du classeur : dernière entrée du journal intégrée
+JOURNAL_PROPERTY = "journal_applied"
+
+
+# ---------------------------
+# Helpers
+# ---------------------------
+def find_last_data_row(ws, key_col: int, start_row: int) -> int:
+    """Dernière ligne qui contient une valeur dans key_col (ignore les lignes juste formatées)."""
+    r = ws.max_row
+    while r >= start_row:
+        v = ws.cell(r, key_col).value
+        if v is not None and str(v).strip() != "":
+            return r
+        r -= 1
+    return start_row - 1
+
+
+def copy_row_style(ws, src_row: int, dst_row: int, max_col: int):
+    """Copie le style (bordures/cadres, formats, etc.) de src_row vers dst_row."""
+    ws.row_dimensions[dst_row].height = ws.row_dimensions[src_row].height
+    for c in range(1, max_col + 1):
+        src = ws.cell(src_row, c)
+        dst = ws.cell(dst_row, c)
+        if src.has_style:
+            dst._style = copy(src._style)
+        dst.number_format = src.number_format
+        dst.font = copy(src.font)
+        dst.border = copy(src.border)
+        dst.fill = copy(src.fill)
+        dst.alignment = copy(src.alignment)
+        dst.protection = copy(src.protection)
+
+
+def _open_workbook(file_obj, **kwargs):
+    """Ouvre un classeur depuis un chemin, des bytes ou un fichier uploadé."""
+    if isinstance(file_obj, str):
+        return openpyxl.load_workbook(file_obj, **kwargs)
+    if isinstance(file_obj, (bytes, bytearray)):
+        return openpyxl.load_workbook(io.BytesIO(file_obj), **kwargs)
+    try:
+        data = file_obj.getvalue()
+    except Exception:
+        data = file_obj.read()
+    return openpyxl.load_workbook(io.BytesIO(data), **kwargs)
+
+
+def _save_atomic(wb, path: str):
+    """Enregistre via un fichier temporaire pour ne jamais laisser un classeur à moitié écrit."""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    wb.save(tmp)
+    os.replace(tmp, path)
+
+
+def _write_record(ws, campaign: str, row: int, rec: dict):
+    """Écrit les champs d'un enregistrement sur une ligne de la feuille."""
+    layout = CAMPAIGNS[campaign]
+    for field, col in layout["columns"].items():
+        if field in layout["counts"]:
+            ws.cell(row, col).value = int(rec[field])
+        elif field == "date":
+            ws.cell(row, col).value = rec["date"]
+            ws.cell(row, col).number_format = "DD/MM/YYYY"
+        else:
+            ws.cell(row, col).value = rec[field]
+
+
+def _is_deleted(value) -> bool:
+    """Marque de suppression (colonne "deleted_col") : toute valeur non vide."""
+    return value is not None and str(value).strip() not in ("", "0")
+
+
+# ---------------------------
+# LECTURE
+# ---------------------------
+def _as_int(value) -> int:
+    """Entier tolérant pour les cellules de comptage (vide, texte, flottant)."""
+    if value is None or value == "":
+        return 0
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        try:
+            return int(float(value))
+        except (TypeError, ValueError):
+            return 0
+
+
+def _read_sheet_columns(ws, campaign: str) -> pd.DataFrame:
+    """Lit une feuille en flux (lecture seule) vers des colonnes typées.
+
+    Seules les colonnes utiles sont extraites ; chaque champ a son propre
+    tampon (liste pour le texte et les dates, array d'entiers pour les
+    comptages), sans passer par un dictionnaire par ligne.
+    """
+    layout = CAMPAIGNS[campaign]
+    cols = layout["columns"]
+    fields = record_fields(campaign)
+    counts = layout["counts"]
+    index = {f: cols[f] - 1 for f in fields}
+    nom_i, cin_i = index["nom"], index["cin"]
+    deleted_i = layout["deleted_col"] - 1
+    width = max(max(index.values()), deleted_i) + 1
+
+    buffers = {f: (array("q") if f in counts else []) for f in fields}
+    appenders = [(buffers[f].append, index[f], f in counts) for f in fields]
+
+    for row in ws.iter_rows(min_row=layout["start_row"], max_col=width, values_only=True):
+        if len(row) < width:
+            row = tuple(row) + (None,) * (width - len(row))
+        # Nom et CIN obligatoires, lignes supprimées ignorées
+        if not (row[nom_i] and row[cin_i]) or _is_deleted(row[deleted_i]):
+            continue
+        for push, i, is_count in appenders:
+            push(_as_int(row[i]) if is_count else row[i])
+
+    data = {}
+    for f in fields:
+        if f in counts:
+            data[f] = np.frombuffer(buffers[f], dtype=np.int64) if len(buffers[f]) else np.empty(0, dtype=np.int64)
+        elif f == "date":
+            data[f] = pd.to_datetime(pd.Series(buffers[f], dtype=object), errors="coerce")
+        else:
+            data[f] = buffers[f]
+    return normalize_frame(pd.DataFrame(data, columns=fields), campaign)
+
+
+def _parse_sheets(file_obj, campaigns: list) -> dict:
+    """Lit les feuilles demandées, dans ce processus ou en parallèle (PARSE_WORKERS)."""
+    if PARSE_WORKERS > 1 and len(campaigns) > 1:
+        return _parse_sheets_parallel(file_obj, campaigns)
+    wb = _open_workbook(file_obj, read_only=True, data_only=True)
+    try:
+        return {c: _read_sheet_columns(wb[CAMPAIGNS[c]["sheet"]], c) for c in campaigns}
+    finally:
+        wb.close()
+
+
+@profiling.timed("excel.load_vaccination_data")
+def load_vaccination_data(file_obj):
+    """Charger les données de vaccination depuis le fichier Excel (lecture en flux)"""
+    return _parse_sheets(file_obj, list(CAMPAIGNS))
+
+
+def load_campaign_data(file_obj, campaign: str) -> pd.DataFrame:
+    """Une seule feuille du classeur (lecture en flux), sans lire les autres campagnes"""
+    return _parse_sheets(file_obj, [campaign])[campaign]
+
+
+# ---------------------------
+# LECTURE PARALLÈLE (un processus par feuille)
+# ---------------------------
+# Nombre de processus de lecture ; 0 ou 1 = lecture dans le processus Streamlit
+PARSE_WORKERS = int(os.environ.get("MANDAT_PARSE_WORKERS", "0"))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    """Pool de processus partagé, créé au premier usage et réutilisé ensuite."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # "spawn" : pas de fork d'un serveur Streamlit multi-threadé
+            _pool = ProcessPoolExecutor(
+                max_workers=min(PARSE_WORKERS, len(CAMPAIGNS)),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def _parse_sheet_worker(source, campaign: str) -> pd.DataFrame:
+    """Exécuté dans un processus de lecture : renvoie le DataFrame typé (compact à transférer)."""
+    wb = _open_workbook(source, read_only=True, data_only=True)
+    try:
+        return _read_sheet_columns(wb[CAMPAIGNS[campaign]["sheet"]], campaign)
+    finally:
+        wb.close()
+
+
+@profiling.timed("excel.parse_sheets_parallel")
+def _parse_sheets_parallel(file_obj, campaigns: list) -> dict:
+    # Les processus reçoivent les octets du classeur : ils lisent exactement la
+    # même version que l'appelant, même si le fichier est remplacé entre-temps.
+    if isinstance(file_obj, str):
+        with open(file_obj, "rb") as f:
+            source = f.read()
+    elif isinstance(file_obj, (bytes, bytearray)):
+        source = bytes(file_obj)
+    else:
+        source = file_obj.getvalue() if hasattr(file_obj, "getvalue") else file_obj.read()
+
+    pool = _get_pool()
+    futures = {c: pool.submit(_parse_sheet_worker, source, c) for c in campaigns}
+    return {c: f.result() for c, f in futures.items()}
+
+
+# ---------------------------
+# RECHARGEMENT INCRÉMENTAL PAR FEUILLE
+# ---------------------------
+_NS_MAIN = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_NS_REL = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_NS_PKG = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+# chemin du classeur -> {campagne: (clé, empreinte, df)} ; clé = CRC de la feuille,
+# des textes partagés, des styles et réglage date1904 ; empreinte = sheet_digest
+_sheet_cache = {}
+_sheet_cache_lock = threading.Lock()
+
+_STYLE_REF = re.compile(rb' s="(\d+)"')
+_SHARED_REF = re.compile(rb'(<c\b[^>]*\bt="s"[^>]*>)<v>(\d+)</v>')
+_EMPTY_ROW = re.compile(rb"<row\b[^>]*?(?:/>|></row>)")
+_ROW = re.compile(rb"<row\b[^>]*>")
+_ROW_REF = re.compile(rb'\br="\d+"')
+
+
+def _zip_parts(zf) -> dict:
+    """Parties du classeur utiles au cache : feuilles par nom, styles, textes partagés."""
+    targets = {}
+    for rel in ET.fromstring(zf.read("xl/_rels/workbook.xml.rels")).iter(f"{_NS_PKG}Relationship"):
+        target = rel.get("Target")
+        target = target.lstrip("/") if target.startswith("/") else f"xl/{target}"
+        targets[rel.get("Id")] = (rel.get("Type").rsplit("/", 1)[-1], target)
+
+    parts = {"sheets": {}, "sharedStrings": None, "styles": None}
+    workbook = ET.fromstring(zf.read("xl/workbook.xml"))
+    for sheet in workbook.iter(f"{_NS_MAIN}sheet"):
+        parts["sheets"][sheet.get("name")] = targets[sheet.get(f"{_NS_REL}id")][1]
+    for kind, target in targets.values():
+        if kind in ("sharedStrings", "styles"):
+            parts[kind] = target
+    pr = workbook.find(f"{_NS_MAIN}workbookPr")
+    parts["date1904"] = pr is not None and pr.get("date1904") in ("1", "true")
+    return parts
+
+
+def _shared_strings(zf, part: str) -> list:
+    strings = []
+    with zf.open(part) as f:
+        for _, elem in ET.iterparse(f):
+            if elem.tag == f"{_NS_MAIN}si":
+                strings.append("".join(elem.itertext()).encode("utf-8"))
+                elem.clear()
+    return strings
+
+
+def _number_formats(zf, part: str) -> list:
+    """Format de nombre de chaque style de cellule (cellXfs), seul aspect du style lu par l'import."""
+    styles = ET.fromstring(zf.read(part))
+    codes = {fmt.get("numFmtId"): fmt.get("formatCode") for fmt in styles.iter(f"{_NS_MAIN}numFmt")}
+    xfs = styles.find(f"{_NS_MAIN}cellXfs")
+    if xfs is None:
+        return []
+    return [codes.get(xf.get("numFmtId"), xf.get("numFmtId") or "0").encode("utf-8") for xf in xfs]
+
+
+def _row_tag(match) -> bytes:
+    """Balise <row> réduite à son numéro de ligne."""
+    ref = _ROW_REF.search(match[0])
+    return b"<row " + (ref[0] if ref else b"") + b">"
+
+
+def sheet_digest(xml: bytes, strings: list, formats: list) -> bytes:
+    """Empreinte des données d'une feuille, indépendante de la numérotation du classeur.
+
+    Seules les cellules de <sheetData> comptent (ni les lignes vides, ni la
+    hauteur des lignes, ni la cellule active ou la vue) ; les index de
+    styles y sont remplacés par le format de nombre du style et les index
+    de textes partagés par le texte : une feuille réécrite par openpyxl
+    avec d'autres index garde la même empreinte.
+    """
+    data = xml[xml.find(b"<sheetData"):xml.rfind(b"</sheetData>")]
+    styles = {str(i).encode(): b' s="' + fmt + b'"' for i, fmt in enumerate(formats)}
+    data = _ROW.sub(_row_tag, _EMPTY_ROW.sub(b"", data))
+    data = _STYLE_REF.sub(lambda m: styles.get(m[1], b""), data)
+    if strings:
+        data = _SHARED_REF.sub(lambda m: m[1] + b"<v>" + strings[int(m[2])] + b"</v>", data)
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+def sheet_fingerprints(file_obj) -> dict:
+    """CRC de la partie XML de chaque feuille de campagne (lecture du seul répertoire zip)."""
+    with zipfile.ZipFile(file_obj) as zf:
+        parts = _zip_parts(zf)
+        return {c: zf.getinfo(parts["sheets"][layout["sheet"]]).CRC for c, layout in CAMPAIGNS.items()}
+
+
+@profiling.timed("excel.load_vaccination_data_incremental")
+def load_vaccination_data_incremental(file_obj, cache_key: str) -> dict:
+    """Comme load_vaccination_data, mais ne relit que les feuilles modifiées.
+
+    Une feuille dont la partie xl/worksheets/sheetN.xml, les textes
+    partagés et les styles ont le même CRC qu'au dernier appel pour
+    "cache_key" est reprise telle quelle. Sinon son empreinte (sheet_digest)
+    est recalculée : openpyxl renumérote textes et styles à chaque
+    enregistrement, et réécrit ainsi des feuilles dont le contenu n'a pas
+    changé ; seules les feuilles dont l'empreinte diffère sont relues.
+    """
+    with _sheet_cache_lock:
+        cached = _sheet_cache.get(cache_key, {})
+        sheets, changed = {}, []
+        with zipfile.ZipFile(file_obj) as zf:
+            parts = _zip_parts(zf)
+            shared_crc = zf.getinfo(parts["sharedStrings"]).CRC if parts["sharedStrings"] else 0
+            styles_crc = zf.getinfo(parts["styles"]).CRC if parts["styles"] else 0
+            strings = formats = None
+            for c, layout in CAMPAIGNS.items():
+                part = parts["sheets"][layout["sheet"]]
+                key = (zf.getinfo(part).CRC, shared_crc, styles_crc, parts["date1904"])
+                if c in cached and cached[c][0] == key:
+                    sheets[c] = cached[c]
+                    continue
+                if strings is None:
+                    strings = _shared_strings(zf, parts["sharedStrings"]) if parts["sharedStrings"] else []
+                    formats = _number_formats(zf, parts["styles"]) if parts["styles"] else []
+                digest = (parts["date1904"], sheet_digest(zf.read(part), strings, formats))
+                if c in cached and cached[c][1] == digest:
+                    sheets[c] = (key, digest, cached[c][2])
+                else:
+                    sheets[c] = (key, digest, None)
+                    changed.append(c)
+
+        if changed:
+            if hasattr(file_obj, "seek"):
+                file_obj.seek(0)
+            for c, df in _parse_sheets(file_obj, changed).items():
+                sheets[c] = sheets[c][:2] + (df,)
+
+        _sheet_cache[cache_key] = sheets
+        # copie légère : les appelants peuvent ajouter des colonnes sans toucher au cache
+        return {c: sheets[c][2].copy(deep=False) for c in CAMPAIGNS}
+
+
+def _row_record(ws, campaign: str, row_idx: int):
+    """Enregistrement de la ligne row_idx (None si la ligne n'est pas numérotée ou est supprimée)."""
+    layout = CAMPAIGNS[campaign]
+    seq = ws.cell(row_idx, layout["seq_col"]).value
+    if seq is None or str(seq).strip() == "" or _is_deleted(ws.cell(row_idx, layout["deleted_col"]).value):
+        return None
+
+    record_id = ws.cell(row_idx, layout["id_col"]).value
+    rec = {"row_idx": row_idx, "seq": int(seq), "record_id": str(record_id).strip() if record_id else ""}
+    for field, col in layout["columns"].items():
+        value = ws.cell(row_idx, col).value
+        if field == "date":
+            rec[field] = value
+        elif field in layout["counts"]:
+            rec[field] = value or 0
+        else:
+            rec[field] = value or ""
+    rec["version"] = record_version(campaign, rec)
+    return rec
+
+
+def _sheet_records(ws, campaign: str) -> list:
+    """Enregistrements numérotés (et non supprimés) d'une feuille, avec leur ligne Excel."""
+    records = []
+    for row_idx in range(CAMPAIGNS[campaign]["start_row"], ws.max_row + 1):
+        rec = _row_record(ws, campaign, row_idx)
+        if rec is not None:
+            records.append(rec)
+    return records
+
+
+@profiling.timed("excel.load_records_from_excel")
+def load_records_from_excel(path: str, campaign: str):
+    """Charge tous les enregistrements d'une campagne donnée"""
+    wb = openpyxl.load_workbook(path, data_only=True)
+    records = _sheet_records(wb[CAMPAIGNS[campaign]["sheet"]], campaign)
+    wb.close()
+    return records
+
+
+@profiling.timed("excel.load_all_records_from_excel")
+def load_all_records_from_excel(path: str) -> dict:
+    """Charge les enregistrements des quatre campagnes en une seule ouverture du classeur."""
+    wb = openpyxl.load_workbook(path, data_only=True)
+    records = {c: _sheet_records(wb[layout["sheet"]], c) for c, layout in CAMPAIGNS.items()}
+    wb.close()
+    return records
+
+
+# ---------------------------
+# ÉCRITURE
+# ---------------------------
+def _find_record_row(ws, campaign: str, record_id: str, row_hint: int = None):
+    """Ligne de l'enregistrement "record_id" (None s'il n'existe plus).
+
+    "row_hint" est la ligne lue par l'appelant : on la vérifie d'abord, et on
+    ne parcourt la colonne des identifiants que si elle ne correspond plus.
+    """
+    layout = CAMPAIGNS[campaign]
+    id_col = layout["id_col"]
+    record_id = str(record_id)
+    row = None
+    if row_hint and str(ws.cell(int(row_hint), id_col).value) == record_id:
+        row = int(row_hint)
+    else:
+        for r, (value,) in enumerate(
+            ws.iter_rows(min_row=layout["start_row"], min_col=id_col, max_col=id_col, values_only=True),
+            start=layout["start_row"],
+        ):
+            if value is not None and str(value).strip() == record_id:
+                row = r
+                break
+    if row is None or _is_deleted(ws.cell(row, layout["deleted_col"]).value):
+        return None
+    return row
+
+
+def _locate(ws, campaign: str, record_id: str, row_hint: int, expected_version: str) -> int:
+    row = _find_record_row(ws, campaign, record_id, row_hint)
+    if row is None:
+        raise StaleRecordError("L'enregistrement a été supprimé par un autre utilisateur.")
+    check_version(campaign, _row_record(ws, campaign, row), expected_version)
+    return row
+
+
+@profiling.timed("excel.update_record_in_excel")
+def update_record_in_excel(path: str, campaign: str, record_id: str, rec: dict,
+                           expected_version: str = None, row_hint: int = None):
+    """Modifie un enregistrement existant dans Excel
+
+    L'enregistrement est retrouvé par son identifiant ; si expected_version
+    est fourni, il doit encore avoir le contenu lu par l'utilisateur (sinon
+    StaleRecordError).
+    """
+    with workbook_lock(path):
+        wb = openpyxl.load_workbook(path)
+        ws = wb[CAMPAIGNS[campaign]["sheet"]]
+        row = _locate(ws, campaign, record_id, row_hint, expected_version)
+        _write_record(ws, campaign, row, rec)
+        _save_atomic(wb, path)
+        wb.close()
+
+
+@profiling.timed("excel.delete_record_from_excel")
+def delete_record_from_excel(path: str, campaign: str, record_id: str,
+                             expected_version: str = None, row_hint: int = None):
+    """Supprime un enregistrement en le marquant (la ligne reste en place jusqu'à la purge)"""
+    with workbook_lock(path):
+        wb = openpyxl.load_workbook(path)
+        layout = CAMPAIGNS[campaign]
+        ws = wb[layout["sheet"]]
+        row = _locate(ws, campaign, record_id, row_hint, expected_version)
+        ws.cell(row, layout["deleted_col"]).value = 1
+        _save_atomic(wb, path)
+        wb.close()
+
+
+def append_record_to_excel(path: str, campaign: str, rec: dict):
+    """Ajoute un enregistrement après la dernière ligne numérotée"""
+    append_records_to_excel(path, {campaign: [rec]})
+
+
+def _append_rows(wb, records_by_campaign: dict):
+    """Ajoute les enregistrements après la dernière ligne numérotée de chaque feuille."""
+    for campaign, records in records_by_campaign.items():
+        layout = CAMPAIGNS[campaign]
+        ws = wb[layout["sheet"]]
+        seq_col = layout["seq_col"]
+
+        last = find_last_data_row(ws, key_col=seq_col, start_row=layout["start_row"])
+        for rec in records:
+            new_row = last + 1
+            copy_row_style(ws, src_row=last, dst_row=new_row, max_col=layout["max_col"])
+            _write_record(ws, campaign, new_row, rec)
+            ws.cell(new_row, seq_col).value = int(ws.cell(last, seq_col).value or 0) + 1
+            ws.cell(new_row, layout["id_col"]).value = rec.get("record_id") or new_record_id()
+            last = new_row
+
+
+@profiling.timed("excel.append_records_to_excel")
+def append_records_to_excel(path: str, records_by_campaign: dict, watermark: int = None):
+    """Ajoute plusieurs enregistrements avec un seul chargement/enregistrement du classeur.
+
+    "watermark" est le numéro de la dernière entrée du journal intégrée (voir
+    mandat.journal) ; il est stocké dans les propriétés du classeur.
+    """
+    with workbook_lock(path):
+        wb = openpyxl.load_workbook(path)
+        _append_rows(wb, records_by_campaign)
+        if watermark is not None:
+            if JOURNAL_PROPERTY in wb.custom_doc_props.names:
+                del wb.custom_doc_props[JOURNAL_PROPERTY]
+            wb.custom_doc_props.append(StringProperty(name=JOURNAL_PROPERTY, value=str(int(watermark))))
+
+        _save_atomic(wb, path)
+        wb.close()
+
+
+# ---------------------------
+# MAINTENANCE
+# ---------------------------
+def _write_technical_headers(ws, campaign: str):
+    """En-têtes des colonnes identifiant / suppression, au style de l'en-tête voisin."""
+    layout = CAMPAIGNS[campaign]
+    header_row = layout["start_row"] - 1
+    src = ws.cell(header_row, layout["max_col"])
+    for col, title in ((layout["id_col"], ID_HEADER), (layout["deleted_col"], DELETED_HEADER)):
+        cell = ws.cell(header_row, col)
+        if cell.value is None:
+            cell.value = title
+            if src.has_style:
+                cell._style = copy(src._style)
+
+
+@profiling.timed("excel.assign_record_ids")
+def assign_record_ids(path: str) -> int:
+    """Donne un identifiant aux lignes numérotées qui n'en ont pas encore.
+
+    Migration des classeurs antérieurs aux identifiants ; renvoie le nombre
+    d'identifiants attribués (le classeur n'est réécrit que s'il y en a).
+    """
+    with workbook_lock(path):
+        wb = openpyxl.load_workbook(path)
+        assigned = 0
+        for campaign, layout in CAMPAIGNS.items():
+            ws = wb[layout["sheet"]]
+            for row in range(layout["start_row"], ws.max_row + 1):
+                seq = ws.cell(row, layout["seq_col"]).value
+                cell = ws.cell(row, layout["id_col"])
+                if seq is not None and str(seq).strip() != "" and not cell.value:
+                    cell.value = new_record_id()
+                    assigned += 1
+            _write_technical_headers(ws, campaign)
+        if assigned:
+            _save_atomic(wb, path)
+        wb.close()
+        return assigned
+
+
+def _delete_marked_rows(wb) -> int:
+    """Retire les lignes marquées supprimées, par blocs contigus du bas vers le haut ; renvoie leur nombre."""
+    purged = 0
+    for campaign, layout in CAMPAIGNS.items():
+        ws = wb[layout["sheet"]]
+        col = layout["deleted_col"]
+        rows = [
+            r for r, (value,) in enumerate(
+                ws.iter_rows(min_row=layout["start_row"], min_col=col, max_col=col, values_only=True),
+                start=layout["start_row"],
+            )
+            if _is_deleted(value)
+        ]
+        # blocs contigus [début, fin], traités du dernier au premier
+        runs = []
+        for r in rows:
+            if runs and runs[-1][1] == r - 1:
+                runs[-1][1] = r
+            else:
+                runs.append([r, r])
+        for first, last in reversed(runs):
+            ws.delete_rows(first, last - first + 1)
+        purged += len(rows)
+    return purged
+
+
+@profiling.timed("excel.purge_deleted_rows")
+def purge_deleted_rows(path: str) -> int:
+    """Retire physiquement les lignes marquées supprimées (passe de maintenance).
+
+    Les lignes sont retirées par blocs contigus, du bas vers le haut, avec un
+    seul chargement/enregistrement du classeur. Renvoie le nombre de lignes
+    retirées.
+    """
+    with workbook_lock(path):
+        wb = openpyxl.load_workbook(path)
+        purged = _delete_marked_rows(wb)
+        if purged:
+            _save_atomic(wb, path)
+        wb.close()
+        return purged
+
+
+def read_journal_watermark(file_obj) -> int:
+    """Numéro de la dernière entrée du journal déjà intégrée au classeur (0 si aucune)."""
+    try:
+        with zipfile.ZipFile(file_obj) as zf:
+            xml = zf.read("docProps/custom.xml")
+    except (KeyError, FileNotFoundError):
+        return 0
+    for prop in ET.fromstring(xml):
+        if prop.get("name") == JOURNAL_PROPERTY:
+            return int("".join(prop.itertext()).strip() or 0)
+    return 0
+
+
+@profiling.timed("excel.export_active_workbook")
+def export_active_workbook(file_obj, pending: dict = None) -> bytes:
+    """Copie du classeur à télécharger, construite en mémoire : lignes supprimées
+    retirées et saisies "pending" ({campagne: [enregistrements]}) ajoutées.
+
+    Le classeur source n'est jamais modifié (la purge reste l'affaire de la
+    maintenance périodique).
+    """
+    wb = _open_workbook(file_obj)
+    _append_rows(wb, pending or {})
+    _delete_marked_rows(wb)
+    buf = io.BytesIO()
+    wb.save(buf)
+    wb.close()
+    return buf.getvalue()
+
+
+@profiling.timed("excel.export_workbook")
+def export_workbook(template_path: str, records_by_campaign: dict) -> bytes:
+    """Produit un classeur stylé à partir du modèle et des enregistrements fournis.
+
+    Les lignes de données du modèle sont vidées puis réécrites dans l'ordre des
+    enregistrements ; le style de la première ligne de données sert aux lignes
+    ajoutées au-delà du modèle.
+    """
+    wb = openpyxl.load_workbook(template_path)
+    for campaign, records in records_by_campaign.items():
+        layout = CAMPAIGNS[campaign]
+        ws = wb[layout["sheet"]]
+        start_row = layout["start_row"]
+        template_last = ws.max_row
+
+        for row in ws.iter_rows(min_row=start_row, max_row=template_last, max_col=layout["deleted_col"]):
+            for cell in row:
+                cell.value = None
+        _write_technical_headers(ws, campaign)
+
+        for i, rec in enumerate(records):
+            r = start_row + i
+            if r > template_last:
+                copy_row_style(ws, src_row=start_row, dst_row=r, max_col=layout["max_col"])
+            _write_record(ws, campaign, r, rec)
+            ws.cell(r, layout["seq_col"]).value = int(rec["seq"])
+            ws.cell(r, layout["id_col"]).value = rec.get("record_id") or new_record_id()
+
+    buf = io.BytesIO()
+    wb.save(buf)
+    wb.close()
+    return buf.getvalue()
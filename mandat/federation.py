@@ -0,0 +1,166 @@
+"""Plusieurs classeurs du mandat interrogés ensemble (une année × un gouvernorat chacun).
+
+Le dossier MANDAT_DATA_DIR (data par défaut) est parcouru, sous-dossiers
+compris. L'année est le nombre à quatre chiffres du nom du fichier ; le
+gouvernorat est le sous-dossier ("data/Monastir/mandat sanitaire 2025.xlsx"),
+sinon le reste du nom ("mandat sanitaire 2025 Monastir.xlsx"), sinon
+DEFAULT_GOVERNORATE. Les fichiers de verrou d'Excel ("~$...") et les
+classeurs sans année dans le nom sont ignorés.
+
+Le classeur courant (CURRENT_WORKBOOK, celui de la saisie) est lu par le
+stockage de référence et le watcher ; les autres sont des archives en
+lecture seule, chargées directement depuis Excel par load_workbook. Les
+pages gardent une entrée de cache par archive (clé : chemin et
+fingerprint) et ne chargent que les classeurs retenus par les filtres
+année / gouvernorat.
+
+combine() assemble les instantanés retenus : enregistrements et cubes
+reçoivent les colonnes "annee" et "gouvernorat" (DIMENSIONS) ; les agrégats
+(aggregates) sommant toujours par groupe, un cube combiné s'utilise comme
+celui d'un seul classeur.
+"""
+import os
+import re
+from datetime import date
+from typing import NamedTuple
+
+import pandas as pd
+
+from mandat import aggregates, excel_io, storage
+from mandat.campaigns import CAMPAIGNS
+from mandat.watcher import Snapshot
+
+DATA_DIR = os.environ.get("MANDAT_DATA_DIR", "data")
+CURRENT_WORKBOOK = os.environ.get("MANDAT_WORKBOOK", os.path.join(DATA_DIR, "mandat sanitaire 2026.xlsx"))
+DEFAULT_GOVERNORATE = os.environ.get("MANDAT_GOVERNORATE", "Sousse")
+DIMENSIONS = ["annee", "gouvernorat"]
+
+_YEAR = re.compile(r"(?<!\d)(?:19|20)\d{2}(?!\d)")
+_PREFIX = re.compile(r"^\s*mandat(\s+sanitaire)?", re.IGNORECASE)
+
+
+class Workbook(NamedTuple):
+    path: str
+    annee: int
+    gouvernorat: str
+
+
+def describe(path: str, root: str = DATA_DIR) -> Workbook:
+    """Année et gouvernorat d'un classeur d'après son chemin (None si le nom n'a pas d'année)."""
+    name = os.path.splitext(os.path.basename(path))[0]
+    year = _YEAR.search(name)
+    if year is None:
+        return None
+    parent = os.path.relpath(os.path.dirname(os.path.abspath(path)), os.path.abspath(root))
+    if parent not in (".", "") and not parent.startswith(".."):
+        governorate = parent.split(os.sep)[0]
+    else:
+        rest = _PREFIX.sub("", name[:year.start()] + " " + name[year.end():])
+        governorate = re.sub(r"[\s_\-]+", " ", rest).strip() or DEFAULT_GOVERNORATE
+    return Workbook(path, int(year.group()), governorate)
+
+
+def current() -> Workbook:
+    """Le classeur de la saisie (année en cours si son nom n'en indique pas)."""
+    return describe(CURRENT_WORKBOOK) or Workbook(CURRENT_WORKBOOK, date.today().year, DEFAULT_GOVERNORATE)
+
+
+def catalog(root: str = DATA_DIR) -> list:
+    """Classeurs du dossier de données, triés par année puis gouvernorat.
+
+    Le classeur courant en fait toujours partie, même hors du dossier.
+    """
+    workbooks = _scan(root)
+    if not any(map(is_current, workbooks)):
+        workbooks.append(current())
+    return sorted(workbooks, key=lambda wb: (wb.annee, wb.gouvernorat, wb.path))
+
+
+def _scan(root: str) -> list:
+    workbooks = []
+    for folder, dirs, files in os.walk(root):
+        dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+        for name in files:
+            if name.startswith(("~$", ".")) or not name.lower().endswith(".xlsx"):
+                continue
+            wb = describe(os.path.join(folder, name), root)
+            if wb is not None:
+                workbooks.append(wb)
+    return workbooks
+
+
+def select(workbooks: list, years=None, governorates=None) -> list:
+    """Classeurs retenus par les filtres (liste vide ou None : pas de filtre)."""
+    return [
+        wb for wb in workbooks
+        if (not years or wb.annee in years) and (not governorates or wb.gouvernorat in governorates)
+    ]
+
+
+def is_current(wb: Workbook) -> bool:
+    return is_current_path(wb.path)
+
+
+def is_current_path(path: str) -> bool:
+    return os.path.abspath(path) == os.path.abspath(CURRENT_WORKBOOK)
+
+
+def fingerprint(path: str) -> tuple:
+    """(date de modification, taille) : change à chaque enregistrement du fichier."""
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+
+# ---------------------------
+# CHARGEMENT ET ASSEMBLAGE
+# ---------------------------
+def load_workbook(path: str) -> dict:
+    """Instantanés {campagne: Snapshot} d'un classeur d'archive, lu depuis Excel."""
+    version = fingerprint(path)
+    datasets = excel_io.load_vaccination_data(path)
+    return {c: Snapshot(version, df, aggregates.build_cube(df, c)) for c, df in datasets.items()}
+
+
+def load_dataset(path: str, campaign: str) -> pd.DataFrame:
+    """Enregistrements d'une campagne d'un classeur quelconque (rapports, relevés).
+
+    Le classeur courant passe par le stockage de référence (journal, SQLite) ;
+    les autres sont lus directement depuis Excel, une feuille à la fois : ni
+    base SQLite ni verrou créés à côté d'une archive, et jamais un
+    instantané figé d'une version précédente du fichier.
+    """
+    if is_current_path(path):
+        return storage.load_dataset(path, campaign)
+    return excel_io.load_campaign_data(path, campaign)
+
+
+def load_cube(path: str, campaign: str) -> pd.DataFrame:
+    """Cube d'une campagne d'un classeur quelconque (voir load_dataset)."""
+    if is_current_path(path):
+        return storage.load_cube(path, campaign)
+    return aggregates.build_cube(excel_io.load_campaign_data(path, campaign), campaign)
+
+
+def _tagged(frames: list) -> pd.DataFrame:
+    df = pd.concat(frames, ignore_index=True)
+    # les catégories diffèrent d'un classeur à l'autre : on les réunit
+    return df.astype({c: "category" for c in ["region", "gouvernorat"] if c in df.columns})
+
+
+def combine(parts: list) -> dict:
+    """Instantanés combinés à partir de [(Workbook, {campagne: Snapshot}), ...].
+
+    La version d'une campagne combinée est le tuple des (chemin, version)
+    de chaque classeur : elle change dès qu'un des classeurs change.
+    """
+    combined = {}
+    for campaign in CAMPAIGNS:
+        data, cubes, version = [], [], []
+        for wb, snapshots in parts:
+            snap = snapshots[campaign]
+            dims = {"annee": wb.annee, "gouvernorat": wb.gouvernorat}
+            data.append(snap.data.assign(**dims))
+            cubes.append(snap.cube.assign(**dims))
+            version.append((wb.path, snap.version))
+        combined[campaign] = Snapshot(tuple(version), _tagged(data), _tagged(cubes))
+    return combined
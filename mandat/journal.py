@@ -0,0 +1,305 @@
+"""Journal d'ajouts (JSON lines) devant le classeur Excel.
+
+Une saisie est d'abord écrite en fin de journal (quelques millisecondes,
+fsync compris). Un compacteur en arrière-plan intègre ensuite toutes les
+entrées en attente dans le classeur avec un seul chargement/enregistrement.
+
+Chaque entrée porte un numéro croissant "n", attribué sous le verrou du
+journal à la suite du dernier numéro connu. Le classeur mémorise le
+numéro de la dernière entrée intégrée (excel_io.read_journal_watermark) :
+les lecteurs ne fusionnent que les entrées au-delà, et une reprise après
+incident n'intègre jamais deux fois la même entrée.
+"""
+import io
+import json
+import logging
+import os
+import threading
+import zipfile
+from datetime import date, datetime
+
+import pandas as pd
+
+from mandat import excel_io
+from mandat.campaigns import CAMPAIGNS, new_record_id, record_fields
+from mandat.locking import file_lock, record_version, workbook_lock
+from mandat.schema import normalize_frame
+
+# Délai maximal avant intégration, et taille de lot qui déclenche une intégration immédiate
+FLUSH_INTERVAL = float(os.environ.get("MANDAT_JOURNAL_INTERVAL", "5"))
+FLUSH_BATCH = int(os.environ.get("MANDAT_JOURNAL_BATCH", "50"))
+
+logger = logging.getLogger(__name__)
+_lock = threading.Lock()
+_compactors = {}
+
+
+def journal_path(xlsx_path: str) -> str:
+    """Chemin du journal associé au classeur."""
+    return os.path.splitext(xlsx_path)[0] + ".journal.jsonl"
+
+
+def _journal_lock(xlsx_path: str):
+    """Verrou court, partagé entre processus, sur le fichier journal lui-même."""
+    return file_lock(journal_path(xlsx_path) + ".lock")
+
+
+def _encode(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _decode(campaign: str, rec: dict) -> dict:
+    rec = dict(rec)
+    if rec.get("date"):
+        rec["date"] = datetime.fromisoformat(rec["date"])
+    for field in CAMPAIGNS[campaign]["counts"]:
+        rec[field] = int(rec.get(field) or 0)
+    return rec
+
+
+def _last_n(xlsx_path: str) -> int:
+    """Dernier numéro attribué : dernière entrée du journal, sinon filigrane du classeur.
+
+    À appeler sous _journal_lock : la compaction ne retire du journal que des
+    entrées déjà couvertes par le filigrane, le maximum ne recule donc jamais.
+    """
+    last = 0
+    try:
+        with open(journal_path(xlsx_path), "r", encoding="utf-8") as f:
+            for line in f:
+                last = max(last, _entry_n(line))
+    except FileNotFoundError:
+        pass
+    return max(last, excel_io.read_journal_watermark(xlsx_path))
+
+
+# ---------------------------
+# ÉCRITURE / LECTURE DU JOURNAL
+# ---------------------------
+def append(xlsx_path: str, campaign: str, rec: dict) -> int:
+    """Ajoute une saisie au journal (durable au retour) et renvoie son numéro.
+
+    L'identifiant de l'enregistrement est attribué ici : la saisie est
+    adressable (modification, suppression) avant même son intégration.
+    """
+    return append_many(xlsx_path, campaign, [rec])[0]
+
+
+def append_many(xlsx_path: str, campaign: str, records: list) -> list:
+    """Ajoute un lot de saisies avec une seule écriture et un seul fsync ; renvoie leurs numéros."""
+    records = [{**rec, "record_id": rec.get("record_id") or new_record_id()} for rec in records]
+    with _lock, _journal_lock(xlsx_path):
+        last = _last_n(xlsx_path)
+        numbers = list(range(last + 1, last + 1 + len(records)))
+        lines = [
+            json.dumps({"n": n, "campaign": campaign, "rec": {k: _encode(v) for k, v in rec.items()}}, ensure_ascii=False)
+            for n, rec in zip(numbers, records)
+        ]
+        with open(journal_path(xlsx_path), "a", encoding="utf-8") as f:
+            f.write("".join(line + "\n" for line in lines))
+            f.flush()
+            os.fsync(f.fileno())
+    ensure_compactor(xlsx_path).wake()
+    return numbers
+
+
+def committed(xlsx_path: str, numbers) -> set:
+    """Numéros (parmi "numbers") déjà intégrés au classeur ; les autres sont en attente."""
+    try:
+        applied = excel_io.read_journal_watermark(xlsx_path)
+    except (OSError, zipfile.BadZipFile):  # classeur en cours de remplacement
+        return set()
+    return {n for n in numbers if n <= applied}
+
+
+def read_entries(xlsx_path: str) -> list:
+    """Toutes les entrées du journal (une dernière ligne tronquée est ignorée)."""
+    try:
+        with open(journal_path(xlsx_path), "r", encoding="utf-8") as f:
+            lines = f.readlines()
+    except FileNotFoundError:
+        return []
+    entries = []
+    for line in lines:
+        try:
+            entry = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        entry["rec"] = _decode(entry["campaign"], entry["rec"])
+        entries.append(entry)
+    return entries
+
+
+def pending_versions(xlsx_path: str) -> dict:
+    """Numéro de la dernière entrée du journal, par campagne (clé de cache)."""
+    versions = {}
+    try:
+        with open(journal_path(xlsx_path), "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                versions[entry["campaign"]] = max(versions.get(entry["campaign"], 0), entry["n"])
+    except FileNotFoundError:
+        pass
+    return versions
+
+
+# ---------------------------
+# LECTEURS AVEC FUSION DU JOURNAL
+# ---------------------------
+def load_vaccination_data(xlsx_path: str) -> dict:
+    """Comme excel_io.load_vaccination_data, plus les saisies encore dans le journal."""
+    entries = read_entries(xlsx_path)  # journal d'abord, classeur ensuite
+    with open(xlsx_path, "rb") as f:
+        applied = excel_io.read_journal_watermark(f)
+        f.seek(0)
+        datasets = excel_io.load_vaccination_data_incremental(f, os.path.abspath(xlsx_path))
+
+    for campaign in CAMPAIGNS:
+        fields = record_fields(campaign)
+        tail = [
+            {k: e["rec"].get(k) for k in fields}
+            for e in entries
+            if e["n"] > applied and e["campaign"] == campaign and e["rec"].get("nom") and e["rec"].get("cin")
+        ]
+        if tail:
+            tail = pd.DataFrame(tail, columns=fields)
+            tail["date"] = pd.to_datetime(tail["date"], errors="coerce")
+            datasets[campaign] = normalize_frame(pd.concat([datasets[campaign], tail], ignore_index=True), campaign)
+    return datasets
+
+
+def load_records(xlsx_path: str, campaign: str) -> list:
+    """Comme excel_io.load_records_from_excel, plus les saisies encore dans le journal.
+
+    Les saisies en attente reçoivent la ligne et le numéro qu'elles auront
+    probablement une fois intégrées ; la ligne n'est qu'une indication, les
+    modifications retrouvent l'enregistrement par son identifiant.
+    """
+    entries = read_entries(xlsx_path)
+    with open(xlsx_path, "rb") as f:
+        applied = excel_io.read_journal_watermark(f)
+        f.seek(0)
+        records = excel_io.load_records_from_excel(f, campaign)
+
+    if records:
+        row_idx, seq = records[-1]["row_idx"], records[-1]["seq"]
+    else:
+        row_idx, seq = CAMPAIGNS[campaign]["start_row"] - 1, 0
+    for e in entries:
+        if e["n"] > applied and e["campaign"] == campaign:
+            row_idx, seq = row_idx + 1, seq + 1
+            rec = {"row_idx": row_idx, "seq": seq, **e["rec"]}
+            rec["version"] = record_version(campaign, rec)
+            records.append(rec)
+    return records
+
+
+def export_workbook(xlsx_path: str) -> bytes:
+    """Classeur à télécharger : le fichier, plus les saisies encore dans le journal.
+
+    Rien n'est écrit : ni intégration ni purge, la copie est faite en mémoire
+    (excel_io.export_active_workbook).
+    """
+    entries = read_entries(xlsx_path)  # journal d'abord, classeur ensuite
+    with open(xlsx_path, "rb") as f:
+        data = f.read()
+    applied = excel_io.read_journal_watermark(io.BytesIO(data))
+    pending = {}
+    for e in entries:
+        if e["n"] > applied:
+            pending.setdefault(e["campaign"], []).append(e["rec"])
+    return excel_io.export_active_workbook(data, pending)
+
+
+# ---------------------------
+# INTÉGRATION DANS LE CLASSEUR
+# ---------------------------
+_compact_lock = threading.Lock()
+
+
+def compact(xlsx_path: str, extra: dict = None) -> int:
+    """Intègre les entrées en attente dans le classeur (un seul load/save).
+
+    "extra" ({campagne: [enregistrements]}) est ajouté dans le même
+    enregistrement du classeur, après les entrées du journal (import groupé).
+    Renvoie le nombre d'entrées du journal intégrées.
+    """
+    with _compact_lock, workbook_lock(xlsx_path):
+        entries = read_entries(xlsx_path)
+        if not entries:
+            if extra:
+                excel_io.append_records_to_excel(xlsx_path, extra)
+            return 0
+        applied = excel_io.read_journal_watermark(xlsx_path)
+        todo = [e for e in entries if e["n"] > applied]
+        watermark = max(e["n"] for e in entries)
+
+        if todo or extra:
+            batch = {}
+            for e in todo:
+                batch.setdefault(e["campaign"], []).append(e["rec"])
+            for campaign, records in (extra or {}).items():
+                batch.setdefault(campaign, []).extend(records)
+            excel_io.append_records_to_excel(xlsx_path, batch, watermark=watermark)
+
+        # On ne garde que les entrées arrivées pendant l'enregistrement
+        with _lock, _journal_lock(xlsx_path):
+            path = journal_path(xlsx_path)
+            with open(path, "r", encoding="utf-8") as f:
+                lines = f.readlines()
+            keep = [line for line in lines if _entry_n(line) > watermark]
+            tmp = f"{path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.writelines(keep)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, path)
+        return len(todo)
+
+
+def _entry_n(line: str) -> int:
+    try:
+        return int(json.loads(line)["n"])
+    except (json.JSONDecodeError, KeyError, TypeError, ValueError):
+        return 0
+
+
+class _Compactor(threading.Thread):
+    """Thread d'arrière-plan qui intègre le journal par lots."""
+
+    def __init__(self, xlsx_path: str):
+        super().__init__(name=f"journal-compactor:{os.path.basename(xlsx_path)}", daemon=True)
+        self.xlsx_path = xlsx_path
+        self._event = threading.Event()
+        self._pending = 0
+
+    def wake(self):
+        self._pending += 1
+        if self._pending >= FLUSH_BATCH:
+            self._event.set()
+
+    def run(self):
+        while True:
+            self._event.wait(FLUSH_INTERVAL)
+            self._event.clear()
+            self._pending = 0
+            try:
+                compact(self.xlsx_path)
+            except Exception:  # le journal reste intact, on réessaie au prochain tour
+                logger.exception("intégration du journal impossible : %s", self.xlsx_path)
+
+
+def ensure_compactor(xlsx_path: str) -> _Compactor:
+    """Démarre (une seule fois par processus) le compacteur du classeur."""
+    key = os.path.abspath(xlsx_path)
+    with _lock:
+        compactor = _compactors.get(key)
+        if compactor is None:
+            compactor = _compactors[key] = _Compactor(xlsx_path)
+            compactor.start()
+    return compactor
@@ -0,0 +1,111 @@
+"""Verrous inter-processus et contrôle de version des enregistrements.
+
+Toute écriture du classeur (load_workbook ... save) se fait sous un verrou
+exclusif posé sur un fichier ".lock" voisin, avec une attente bornée.
+Chaque enregistrement lu porte une "version" (empreinte de son contenu) ;
+une modification ou une suppression vérifie, sous verrou, que la ligne
+visée a toujours cette empreinte avant d'écrire.
+"""
+import hashlib
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from mandat.campaigns import record_fields
+
+LOCK_TIMEOUT = float(os.environ.get("MANDAT_LOCK_TIMEOUT", "30"))
+
+
+class LockTimeout(RuntimeError):
+    """Le verrou n'a pas pu être obtenu dans le délai imparti."""
+
+
+class StaleRecordError(RuntimeError):
+    """L'enregistrement a été modifié ou supprimé depuis sa lecture."""
+
+
+def record_version(campaign: str, rec: dict) -> str:
+    """Empreinte du contenu d'un enregistrement (identifiant compris)."""
+    parts = [str(rec.get("record_id") or "")]
+    for field in record_fields(campaign):
+        value = rec.get(field)
+        if field == "date" and value is not None and hasattr(value, "strftime"):
+            value = value.strftime("%Y-%m-%d")
+        parts.append("" if value is None else str(value))
+    return hashlib.sha1("\x1f".join(parts).encode("utf-8")).hexdigest()[:16]
+
+
+def check_version(campaign: str, current: dict, expected: str):
+    """Lève StaleRecordError si "current" n'a plus la version attendue."""
+    if expected is not None and (current is None or record_version(campaign, current) != expected):
+        raise StaleRecordError("L'enregistrement a été modifié par un autre utilisateur.")
+
+
+# ---------------------------
+# VERROU FICHIER
+# ---------------------------
+_held = threading.local()
+
+
+def _try_lock(fd) -> bool:
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+
+def _unlock(fd):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+@contextmanager
+def file_lock(lock_path: str, timeout: float = None):
+    """Verrou exclusif sur "lock_path", réentrant pour le thread qui le détient."""
+    held = getattr(_held, "paths", None)
+    if held is None:
+        held = _held.paths = {}
+    key = os.path.abspath(lock_path)
+    if key in held:
+        held[key] += 1
+        try:
+            yield
+        finally:
+            held[key] -= 1
+        return
+
+    timeout = LOCK_TIMEOUT if timeout is None else timeout
+    fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+    deadline = time.monotonic() + timeout
+    try:
+        while not _try_lock(fd):
+            if time.monotonic() >= deadline:
+                raise LockTimeout(f"Fichier occupé par un autre utilisateur : {lock_path}")
+            time.sleep(0.05)
+        held[key] = 1
+        try:
+            yield
+        finally:
+            del held[key]
+            _unlock(fd)
+    finally:
+        os.close(fd)
+
+
+def workbook_lock(xlsx_path: str, timeout: float = None):
+    """Verrou des écritures du classeur."""
+    return file_lock(os.path.splitext(xlsx_path)[0] + ".lock", timeout)
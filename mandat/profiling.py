@@ -0,0 +1,174 @@
+"""Chronométrage des étapes d'un rerun de page (profilage à la demande).
+
+Activé par la variable d'environnement MANDAT_PROFILE=1, ou pour une session
+par le paramètre d'URL ?profile=1 (voir ui.start_profiling). Sans activation,
+chaque point de mesure coûte une lecture d'attribut.
+
+- start_run(page) ouvre un rerun pour le thread courant ;
+- lap(nom) attribue à "nom" le temps écoulé depuis le point précédent
+  (découpage d'un script de page sans le réindenter) ;
+- stage(nom) / @timed(nom) mesurent un bloc ou une fonction (lecture et
+  écriture du classeur), imbriqués dans l'étape en cours ;
+- finish_run() clôt le rerun : ses étapes rejoignent l'historique glissant
+  (percentiles par étape) et une ligne JSON est ajoutée au journal
+  MANDAT_PROFILE_LOG (logs/profile.jsonl par défaut).
+
+Les mesures faites hors rerun (threads d'arrière-plan) ne sont écrites dans
+le journal que si MANDAT_PROFILE est activé.
+"""
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+ENABLED = os.environ.get("MANDAT_PROFILE", "").strip().lower() in ("1", "true", "yes")
+LOG_PATH = os.environ.get("MANDAT_PROFILE_LOG", os.path.join("logs", "profile.jsonl"))
+HISTORY = 200  # reruns gardés par page pour les percentiles
+
+logger = logging.getLogger(__name__)
+_local = threading.local()
+_history = defaultdict(lambda: deque(maxlen=HISTORY))  # page -> [(étape, secondes), ...] par rerun
+_history_lock = threading.Lock()
+_log_lock = threading.Lock()
+
+
+class Run:
+    """Étapes mesurées pendant un rerun : liste de (nom, secondes) dans l'ordre.
+
+    Les étapes mesurées par stage/timed entre deux lap sont rangées sous
+    le lap qui les contient (préfixe "↳") : elles ne s'ajoutent pas au total.
+    """
+
+    def __init__(self, page: str):
+        self.page = page
+        self.started = time.perf_counter()
+        self.last = self.started
+        self.stages = []
+        self.total = None
+        self._stack = []
+        self._nested = []
+
+    def add_lap(self, name: str, seconds: float):
+        self.stages.append((name, seconds))
+        self.stages.extend(self._nested)
+        self._nested = []
+
+    def add_nested(self, name: str, seconds: float):
+        self._nested.append(("↳ " + " › ".join(self._stack + [name]), seconds))
+
+    def close(self):
+        self.total = time.perf_counter() - self.started
+        self.stages.extend(self._nested)
+        self._nested = []
+
+
+def current() -> Run:
+    return getattr(_local, "run", None)
+
+
+def start_run(page: str) -> Run:
+    _local.run = Run(page)
+    return _local.run
+
+
+def lap(name: str):
+    """Temps écoulé depuis le point précédent (ou le début du rerun), attribué à "name"."""
+    run = current()
+    if run is None:
+        return
+    now = time.perf_counter()
+    run.add_lap(name, now - run.last)
+    run.last = now
+
+
+@contextmanager
+def stage(name: str):
+    run = current()
+    if run is None and not ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    if run is not None:
+        run._stack.append(name)
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        if run is not None:
+            run._stack.pop()
+            run.add_nested(name, seconds)
+        else:
+            _write_log({"page": f"thread:{threading.current_thread().name}", "total": seconds,
+                        "stages": [[name, seconds]]})
+
+
+def timed(name: str):
+    """Décorateur : mesure chaque appel de la fonction comme une étape "name"."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if current() is None and not ENABLED:
+                return fn(*args, **kwargs)
+            with stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def finish_run() -> Run:
+    """Clôt le rerun du thread courant (None si aucun) et l'enregistre."""
+    run = current()
+    if run is None:
+        return None
+    _local.run = None
+    run.close()
+    with _history_lock:
+        _history[run.page].append(run.stages + [("total", run.total)])
+    _write_log({"page": run.page, "total": run.total, "stages": [[n, s] for n, s in run.stages]})
+    return run
+
+
+# ---------------------------
+# HISTORIQUE ET JOURNAL
+# ---------------------------
+def breakdown(run: Run) -> pd.DataFrame:
+    """Étapes d'un rerun, en millisecondes et en part du total."""
+    df = pd.DataFrame(run.stages, columns=["étape", "secondes"])
+    df["ms"] = (df["secondes"] * 1000).round(1)
+    df["% du rerun"] = (df["secondes"] / run.total * 100).round(1) if run.total else 0.0
+    return df.drop(columns="secondes")
+
+
+def percentiles(page: str) -> pd.DataFrame:
+    """p50 / p90 / p99 (ms) de chaque étape sur les derniers reruns de la page."""
+    with _history_lock:
+        runs = list(_history[page])
+    samples = defaultdict(list)
+    for stages in runs:
+        for name, seconds in stages:
+            samples[name].append(seconds * 1000)
+    rows = []
+    for name, values in samples.items():
+        p50, p90, p99 = np.percentile(values, [50, 90, 99])
+        rows.append({"étape": name, "reruns": len(values), "p50 ms": round(p50, 1),
+                     "p90 ms": round(p90, 1), "p99 ms": round(p99, 1)})
+    return pd.DataFrame(rows, columns=["étape", "reruns", "p50 ms", "p90 ms", "p99 ms"])
+
+
+def _write_log(entry: dict):
+    entry = {"ts": datetime.now().isoformat(timespec="milliseconds"), **entry}
+    try:
+        with _log_lock:
+            os.makedirs(os.path.dirname(LOG_PATH) or ".", exist_ok=True)
+            with open(LOG_PATH, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    except OSError:  # le profilage ne doit jamais casser la page
+        logger.exception("journal de profilage impossible : %s", LOG_PATH)
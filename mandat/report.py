@@ -0,0 +1,132 @@
+"""Rapport KPI et montants en ligne de commande (sans Streamlit ni Plotly).
+
+Mêmes chiffres que le dashboard et la calculatrice : les cubes d'agrégats
+sont lus par federation.load_cube (stockage de référence pour le classeur
+courant, lecture directe d'Excel pour les autres), filtrés comme dans les pages
+(aggregates.apply_filters), puis résumés par aggregates.kpis et
+billing.region_amounts.
+
+Exemples :
+    python -m mandat.report "data/mandat sanitaire 2026.xlsx"
+    python -m mandat.report data/*.xlsx --campaign rage --region المسعدين \\
+        --start 2026-01-01 --end 2026-03-31 --prices prix.json --format json
+    python -m mandat.report classeur.xlsx --price aphto_ovin_caprin.prix_ovin=1.5 --by region
+
+Le fichier de prix a la forme de billing.PRIX_DEFAULT :
+{"aphto_ovin_caprin": {"prix_ovin": 1.5, "prix_caprin": 1.2}, ...}
+"""
+import argparse
+import json
+import os
+import sys
+
+import pandas as pd
+
+from mandat import aggregates, billing, federation
+from mandat.campaigns import CAMPAIGNS, count_fields
+
+
+def date_range(start=None, end=None):
+    """(début, fin) au sens du dashboard (fin incluse jusqu'à 23:59:59), ou None."""
+    if start is None and end is None:
+        return None
+    start_dt = pd.Timestamp(start) if start else pd.Timestamp.min
+    end_dt = pd.Timestamp(end) + pd.Timedelta(days=1) - pd.Timedelta(seconds=1) if end else pd.Timestamp.max
+    return start_dt, end_dt
+
+
+def campaign_report(path: str, campaign: str, regions=None, dates=None, prices=None):
+    """(KPI, montants par région) d'une campagne d'un classeur."""
+    cube = aggregates.apply_filters(federation.load_cube(path, campaign), regions, dates)
+    kpis = aggregates.kpis(cube, campaign)
+    kpis["montant"] = billing.amount(kpis, campaign, prices)
+    return kpis, billing.region_amounts(cube, campaign, prices)
+
+
+def build_report(paths: list, campaigns: list, regions=None, dates=None, prices=None, by: str = "campaign") -> pd.DataFrame:
+    """Une ligne par classeur × campagne (by="campaign") ou × région (by="region")."""
+    rows = []
+    for path in paths:
+        workbook = os.path.basename(path)
+        for campaign in campaigns:
+            kpis, by_region = campaign_report(path, campaign, regions, dates, prices)
+            if by == "region":
+                for rec in by_region.to_dict("records"):
+                    rows.append({"classeur": workbook, "campagne": campaign, **rec})
+            else:
+                rows.append({"classeur": workbook, "campagne": campaign, **kpis})
+    report = pd.DataFrame(rows)
+    if report.empty:
+        # aucune ligne : l'en-tête reste écrit ("pas de données" plutôt que rien)
+        report = pd.DataFrame(columns=_columns(campaigns, by))
+    # colonnes communes d'abord, puis les comptages propres à chaque campagne
+    # (vides pour les autres : entiers "Int64" plutôt que flottants)
+    first = [c for c in ["classeur", "campagne", "region", "n", "vaccines", "animaux", "taux", "montant"] if c in report.columns]
+    counts = [c for c in report.columns if c not in first]
+    return report[first + counts].astype({c: "Int64" for c in counts})
+
+
+def _columns(campaigns: list, by: str) -> list:
+    """Colonnes du rapport pour ces campagnes, même sans aucune ligne."""
+    if by == "region":
+        common = ["classeur", "campagne", "region", "montant"]
+        fields = [f for c in campaigns for f in billing.PRICE_FIELDS[c].values()]
+    else:
+        common = ["classeur", "campagne", "n", "vaccines", "animaux", "taux", "montant"]
+        fields = [f for c in campaigns for f in count_fields(c)]
+    return common + list(dict.fromkeys(fields))
+
+
+def parse_prices(prices_file=None, overrides=()) -> dict:
+    """Table de prix : fichier JSON puis "campagne.prix_x=valeur" en ligne de commande."""
+    prices = {}
+    if prices_file:
+        with open(prices_file, "r", encoding="utf-8") as f:
+            prices = json.load(f)
+    for item in overrides:
+        key, _, value = item.partition("=")
+        campaign, _, price = key.partition(".")
+        if campaign not in billing.PRICE_FIELDS or price not in billing.PRICE_FIELDS[campaign]:
+            raise ValueError(f"Prix inconnu : {key}")
+        prices.setdefault(campaign, {})[price] = float(value)
+    return prices
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m mandat.report", description="KPI et montants du mandat sanitaire.")
+    parser.add_argument("workbooks", nargs="+", help="classeur(s) Excel du mandat")
+    parser.add_argument("--campaign", action="append", choices=list(CAMPAIGNS), help="campagne (répétable, défaut : toutes)")
+    parser.add_argument("--region", action="append", help="région (répétable, défaut : toutes)")
+    parser.add_argument("--start", help="date de début AAAA-MM-JJ")
+    parser.add_argument("--end", help="date de fin AAAA-MM-JJ (incluse)")
+    parser.add_argument("--prices", help="fichier JSON des prix (forme de PRIX_DEFAULT)")
+    parser.add_argument("--price", action="append", default=[], help="campagne.prix_x=valeur (répétable)")
+    parser.add_argument("--by", choices=["campaign", "region"], default="campaign", help="une ligne par campagne ou par région")
+    parser.add_argument("--format", choices=["csv", "json"], default="csv")
+    parser.add_argument("--output", "-o", help="fichier de sortie (défaut : sortie standard)")
+    args = parser.parse_args(argv)
+
+    try:
+        prices = parse_prices(args.prices, args.price)
+    except (OSError, ValueError) as exc:
+        parser.error(str(exc))
+    missing = [p for p in args.workbooks if not os.path.exists(p)]
+    if missing:
+        parser.error(f"Fichier introuvable : {', '.join(missing)}")
+
+    report = build_report(args.workbooks, args.campaign or list(CAMPAIGNS), args.region,
+                          date_range(args.start, args.end), prices, args.by)
+    if args.format == "json":
+        text = report.to_json(orient="records", force_ascii=False, indent=2) + "\n"
+    else:
+        text = report.to_csv(index=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8", newline="") as f:
+            f.write(text)
+    else:
+        sys.stdout.write(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
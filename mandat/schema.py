@@ -0,0 +1,66 @@
+"""Schéma typé des DataFrames de campagne.
+
+Tous les lecteurs (classeur, journal, SQLite) passent leurs DataFrames par
+normalize_frame, qui impose les mêmes types quelle que soit la source :
+- textes répétés (nom, cin, région) en catégories : un code entier par ligne
+  et chaque texte stocké une seule fois ; les groupby par région travaillent
+  sur les codes ;
+- numéro de reçu (quasi unique) en texte ;
+- comptages en int32 (int64 seulement si une valeur dépasse) : signés et
+  assez larges pour que sommes et différences ligne à ligne ne débordent
+  pas, et qu'une concaténation avec un cube int64 reste entière ;
+- date en datetime64.
+"""
+import numpy as np
+import pandas as pd
+
+from mandat.campaigns import record_fields
+
+CATEGORY_FIELDS = ["nom", "cin", "region"]
+STRING_FIELDS = ["recu_num"]
+
+
+def _as_text(value):
+    """Texte d'une cellule : les CIN et reçus saisis comme nombres perdent leur ".0"."""
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    text = str(value).strip()
+    return text or None
+
+
+def _text_values(series: pd.Series) -> pd.Series:
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series  # déjà normalisée
+    return series.astype(object).map(_as_text, na_action="ignore")
+
+
+COUNT_DTYPE = np.int32
+_COUNT_LIMITS = np.iinfo(COUNT_DTYPE)
+
+
+def _compact_counts(series: pd.Series) -> pd.Series:
+    values = pd.to_numeric(series, errors="coerce").fillna(0).astype("int64")
+    # pas de type non signé ni de plus petit type : l'arithmétique déborderait sans erreur
+    if len(values) and (values.min() < _COUNT_LIMITS.min or values.max() > _COUNT_LIMITS.max):
+        return values
+    return values.astype(COUNT_DTYPE)
+
+
+def normalize_frame(df: pd.DataFrame, campaign: str) -> pd.DataFrame:
+    """DataFrame d'une campagne aux types du schéma (colonnes de record_fields)."""
+    df = df.reset_index(drop=True)
+    out = {}
+    for field in record_fields(campaign):
+        col = df[field]
+        if field in CATEGORY_FIELDS:
+            out[field] = _text_values(col).astype("category")
+        elif field in STRING_FIELDS:
+            out[field] = _text_values(col).astype("string")
+        elif field == "date":
+            out[field] = col if pd.api.types.is_datetime64_any_dtype(col) else pd.to_datetime(col, errors="coerce")
+        else:
+            out[field] = _compact_counts(col)
+    return pd.DataFrame(out, columns=record_fields(campaign))
+
@@ -0,0 +1,175 @@
+"""Index de recherche par trigrammes pour l'écran Modifier/Supprimer.
+
+Chaque champ indexé (nom, CIN, région) est ramené en minuscules
+(casefold) puis découpé en trigrammes ; chaque trigramme pointe vers
+l'ensemble des enregistrements qui le contiennent. Une recherche
+"contient" intersecte les ensembles des trigrammes de la requête, puis
+vérifie les seuls candidats restants. Les requêtes de moins de trois
+caractères sont vérifiées directement sur les textes déjà normalisés.
+
+Les trigrammes pointent vers les textes distincts, et chaque texte vers
+ses enregistrements. Quand les textes retenus couvrent une grande partie
+des enregistrements (requête d'une lettre, région entière), le résultat est
+calculé sur des tableaux de codes numpy plutôt qu'ensemble par ensemble.
+
+L'index est tenu à jour par différence (sync) : seuls les enregistrements
+ajoutés, modifiés ou supprimés depuis la dernière synchronisation sont
+réindexés.
+"""
+import itertools
+import threading
+from collections import defaultdict
+
+import numpy as np
+
+SEARCH_FIELDS = ["nom", "cin", "region"]
+
+
+def fold(value) -> str:
+    """Texte de recherche : None -> "", nombres sans ".0", casse ignorée."""
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip().casefold()
+
+
+def trigrams(text: str) -> set:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class TrigramIndex:
+    """Index trigrammes des champs SEARCH_FIELDS d'une campagne, par record_id."""
+
+    def __init__(self, fields=SEARCH_FIELDS):
+        self.fields = list(fields)
+        self._lock = threading.Lock()
+        # Les trigrammes pointent vers des textes distincts (une région n'est
+        # indexée qu'une fois, quel que soit le nombre d'enregistrements)
+        self._texts = {f: {} for f in self.fields}  # champ -> record_id -> texte normalisé
+        self._ids = {f: defaultdict(set) for f in self.fields}  # champ -> texte -> record_ids
+        self._grams = {f: defaultdict(set) for f in self.fields}  # champ -> trigramme -> textes
+        self._versions = {}  # record_id -> version indexée
+        self._positions = {}  # record_id -> position dans la dernière liste synchronisée
+        self._order = np.empty(0, dtype=object)  # record_id par position
+        self._text_codes = {f: {} for f in self.fields}  # champ -> texte -> code entier
+        self._next_code = {f: itertools.count() for f in self.fields}  # codes jamais réutilisés
+        self._codes = {f: np.empty(0, dtype=np.int64) for f in self.fields}  # champ -> code par position
+        self._synced = None
+
+    # ---------------------------
+    # MISE À JOUR
+    # ---------------------------
+    def _add(self, record_id: str, rec: dict):
+        for f in self.fields:
+            text = fold(rec.get(f))
+            self._texts[f][record_id] = text
+            ids = self._ids[f][text]
+            if not ids:
+                for gram in trigrams(text):
+                    self._grams[f][gram].add(text)
+            ids.add(record_id)
+        self._versions[record_id] = rec.get("version")
+
+    def _remove(self, record_id: str):
+        for f in self.fields:
+            text = self._texts[f].pop(record_id, None)
+            if text is None:
+                continue
+            ids = self._ids[f][text]
+            ids.discard(record_id)
+            if not ids:
+                del self._ids[f][text]
+                self._text_codes[f].pop(text, None)
+                for gram in trigrams(text):
+                    self._grams[f][gram].discard(text)
+                    if not self._grams[f][gram]:
+                        del self._grams[f][gram]
+        self._versions.pop(record_id, None)
+
+    def sync(self, records: list, token=None):
+        """Met l'index en accord avec "records" (ne réindexe que les différences).
+
+        "token" est la version des données (storage.campaign_version) : si
+        elle n'a pas changé depuis le dernier appel, rien n'est fait.
+        """
+        with self._lock:
+            if token is not None and token == self._synced:
+                return self
+            current = {rec["record_id"]: rec for rec in records}
+            for record_id in [r for r in self._versions if r not in current]:
+                self._remove(record_id)
+            for record_id, rec in current.items():
+                if record_id not in self._versions:
+                    self._add(record_id, rec)
+                elif self._versions[record_id] != rec.get("version"):
+                    self._remove(record_id)
+                    self._add(record_id, rec)
+            self._positions = {rec["record_id"]: i for i, rec in enumerate(records)}
+            self._order = np.array([rec["record_id"] for rec in records], dtype=object)
+            for f in self.fields:
+                self._codes[f] = np.fromiter(
+                    (self._code(f, self._texts[f][rec["record_id"]]) for rec in records),
+                    dtype=np.int64, count=len(records),
+                )
+            self._synced = token
+            return self
+
+    def _code(self, field: str, text: str) -> int:
+        code = self._text_codes[field].get(text)
+        if code is None:
+            code = self._text_codes[field][text] = next(self._next_code[field])
+        return code
+
+    # ---------------------------
+    # RECHERCHE
+    # ---------------------------
+    def _matching_texts(self, field: str, query: str) -> list:
+        """Textes distincts du champ qui contiennent "query" (déjà normalisée)."""
+        if len(query) < 3:
+            candidates = self._ids[field].keys()
+        else:
+            grams = sorted((self._grams[field].get(g, set()) for g in trigrams(query)), key=len)
+            candidates = set(grams[0]).intersection(*grams[1:])
+        # les trigrammes ne garantissent pas l'ordre : vérification des seuls candidats
+        return [text for text in candidates if query in text]
+
+    def search(self, queries: dict):
+        """record_id des enregistrements qui contiennent chaque requête non vide de
+        "queries" ({champ: texte}), dans l'ordre de la liste synchronisée ; None si
+        aucune requête.
+
+        L'index est partagé : un autre appelant peut l'avoir resynchronisé sur une
+        version plus récente entre sync et search. Les identifiants restent
+        valables d'une version à l'autre ; c'est à l'appelant de les rapporter à
+        sa propre liste (ceux qu'elle ne contient pas sont ignorés).
+        """
+        queries = {f: fold(q) for f, q in queries.items() if q and fold(q)}
+        if not queries:
+            return None
+        with self._lock:
+            # requête la plus longue d'abord : la plus sélective et la seule qui
+            # passe forcément par les trigrammes
+            order = sorted(queries, key=lambda f: -len(queries[f]))
+            first = order[0]
+            texts = self._matching_texts(first, queries[first])
+            size = sum(len(self._ids[first][t]) for t in texts)
+            if size == 0:
+                return []
+
+            if size * 8 < len(self._positions):
+                # peu de candidats : vérification directe des autres champs
+                result = set().union(*(self._ids[first][t] for t in texts))
+                for f in order[1:]:
+                    query, field_texts = queries[f], self._texts[f]
+                    result = {r for r in result if query in field_texts[r]}
+                return sorted(result, key=self._positions.__getitem__)
+
+            mask = self._mask(first, texts)
+            for f in order[1:]:
+                mask &= self._mask(f, self._matching_texts(f, queries[f]))
+            return self._order[mask].tolist()
+
+    def _mask(self, field: str, texts: list) -> np.ndarray:
+        codes = self._text_codes[field]
+        return np.isin(self._codes[field], [codes[t] for t in texts if t in codes])
@@ -0,0 +1,390 @@
+"""Stockage SQLite des enregistrements : une table par campagne.
+
+La base est créée à côté du classeur (même nom, extension .sqlite) et
+initialisée une seule fois à partir de celui-ci. Le classeur Excel n'est
+ensuite plus qu'un format d'export.
+
+Chaque ligne porte un identifiant stable "record_id" ; une suppression ne
+fait que poser la marque "deleted", les lignes marquées sont retirées par
+purge_deleted.
+
+La table "<campagne>_agg" contient les agrégats par région et par jour
+(voir mandat.aggregates) ; elle est mise à jour dans la transaction de
+chaque écriture.
+"""
+import os
+import sqlite3
+from contextlib import contextmanager
+from datetime import date, datetime
+
+import pandas as pd
+
+from mandat import excel_io
+from mandat.aggregates import cube_columns
+from mandat.campaigns import CAMPAIGNS, TEXT_FIELDS, count_fields, new_record_id, record_fields
+from mandat.locking import LockTimeout, StaleRecordError, check_version, record_version
+from mandat.schema import normalize_frame
+
+
+def db_path(xlsx_path: str) -> str:
+    """Chemin de la base SQLite associée au classeur."""
+    return os.path.splitext(xlsx_path)[0] + ".sqlite"
+
+
+def _connect(db: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(db, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+@contextmanager
+def _read(db: str):
+    conn = _connect(db)
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+@contextmanager
+def _write(db: str):
+    """Transaction d'écriture exclusive (BEGIN IMMEDIATE)."""
+    conn = _connect(db)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+    except sqlite3.OperationalError as exc:  # "database is locked" après le délai d'attente
+        conn.close()
+        raise LockTimeout(f"Base occupée par un autre utilisateur : {db}") from exc
+    try:
+        yield conn
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+
+def _create_schema(conn):
+    for campaign in CAMPAIGNS:
+        counts = ", ".join(f"{c} INTEGER NOT NULL DEFAULT 0" for c in count_fields(campaign))
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {campaign} (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                seq INTEGER NOT NULL,
+                record_id TEXT NOT NULL,
+                deleted INTEGER NOT NULL DEFAULT 0,
+                nom TEXT NOT NULL DEFAULT '',
+                cin TEXT NOT NULL DEFAULT '',
+                region TEXT NOT NULL DEFAULT '',
+                recu_num TEXT NOT NULL DEFAULT '',
+                date TEXT,
+                {counts}
+            )
+        """)
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{campaign}_region_date ON {campaign}(region, date)")
+        conn.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS idx_{campaign}_record_id ON {campaign}(record_id)")
+        # Agrégats : "day" vaut '' pour les enregistrements sans date
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {campaign}_agg (
+                region TEXT NOT NULL,
+                day TEXT NOT NULL,
+                n INTEGER NOT NULL DEFAULT 0,
+                {counts},
+                PRIMARY KEY (region, day)
+            )
+        """)
+    conn.execute("CREATE TABLE IF NOT EXISTS meta (campaign TEXT PRIMARY KEY, version INTEGER NOT NULL DEFAULT 0)")
+    conn.executemany("INSERT OR IGNORE INTO meta (campaign, version) VALUES (?, 0)", [(c,) for c in CAMPAIGNS])
+
+
+def _migrate(conn):
+    """Met à niveau les bases créées par une version précédente."""
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    for campaign in CAMPAIGNS:
+        columns = {row[1] for row in conn.execute(f"PRAGMA table_info({campaign})")}
+        if "record_id" not in columns:
+            # identifiants stables et marques de suppression
+            conn.execute(f"ALTER TABLE {campaign} ADD COLUMN record_id TEXT NOT NULL DEFAULT ''")
+            conn.execute(f"ALTER TABLE {campaign} ADD COLUMN deleted INTEGER NOT NULL DEFAULT 0")
+            ids = [(new_record_id(), row_id) for (row_id,) in conn.execute(f"SELECT id FROM {campaign}")]
+            conn.executemany(f"UPDATE {campaign} SET record_id = ? WHERE id = ?", ids)
+    _create_schema(conn)
+    for campaign in CAMPAIGNS:
+        if f"{campaign}_agg" not in tables:
+            _rebuild_aggregates(conn, campaign)
+
+
+# ---------------------------
+# CONVERSIONS
+# ---------------------------
+def _to_text(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def _to_count(value) -> int:
+    try:
+        return int(float(value or 0))
+    except (TypeError, ValueError):
+        return 0
+
+
+def _to_iso(value):
+    if value is None or value == "":
+        return None
+    if isinstance(value, (datetime, date)):
+        return value.strftime("%Y-%m-%d")
+    ts = pd.to_datetime(value, errors="coerce", dayfirst=True)
+    return None if pd.isna(ts) else ts.strftime("%Y-%m-%d")
+
+
+def _from_iso(value):
+    return datetime.strptime(value, "%Y-%m-%d") if value else None
+
+
+def _row_values(campaign: str, rec: dict) -> list:
+    """Valeurs SQL d'un enregistrement, dans l'ordre de record_fields."""
+    values = []
+    for field in record_fields(campaign):
+        if field == "date":
+            values.append(_to_iso(rec.get("date")))
+        elif field in TEXT_FIELDS:
+            values.append(_to_text(rec.get(field)))
+        else:
+            values.append(_to_count(rec.get(field)))
+    return values
+
+
+def _bump_version(conn, campaign: str):
+    conn.execute("UPDATE meta SET version = version + 1 WHERE campaign = ?", (campaign,))
+
+
+# ---------------------------
+# AGRÉGATS
+# ---------------------------
+def _rebuild_aggregates(conn, campaign: str):
+    counts = count_fields(campaign)
+    conn.execute(f"DELETE FROM {campaign}_agg")
+    conn.execute(f"""
+        INSERT INTO {campaign}_agg (region, day, n, {', '.join(counts)})
+        SELECT region, COALESCE(date, ''), COUNT(*), {', '.join(f'SUM({c})' for c in counts)}
+        FROM {campaign} WHERE deleted = 0
+        GROUP BY region, COALESCE(date, '')
+    """)
+
+
+def _apply_aggregates(conn, campaign: str, value_rows: list, sign: int):
+    """Ajoute (sign=1) ou retire (sign=-1) des enregistrements des agrégats.
+
+    "value_rows" sont des listes de valeurs SQL dans l'ordre de record_fields.
+    """
+    fields = record_fields(campaign)
+    counts = count_fields(campaign)
+    region_i, date_i = fields.index("region"), fields.index("date")
+    count_i = [fields.index(c) for c in counts]
+    deltas = {}
+    for values in value_rows:
+        key = (values[region_i], values[date_i] or "")
+        delta = deltas.setdefault(key, [0] * (len(counts) + 1))
+        delta[0] += sign
+        for k, i in enumerate(count_i, start=1):
+            delta[k] += sign * values[i]
+
+    conn.executemany(
+        f"""
+        INSERT INTO {campaign}_agg (region, day, n, {', '.join(counts)})
+        VALUES ({', '.join('?' * (len(counts) + 3))})
+        ON CONFLICT(region, day) DO UPDATE SET
+            {', '.join(f'{c} = {c} + excluded.{c}' for c in ['n'] + counts)}
+        """,
+        [list(key) + delta for key, delta in deltas.items()],
+    )
+    if sign < 0:
+        conn.executemany(
+            f"DELETE FROM {campaign}_agg WHERE region = ? AND day = ? AND n <= 0", list(deltas)
+        )
+
+
+# ---------------------------
+# INITIALISATION
+# ---------------------------
+_migrated = set()
+
+
+def ensure_store(xlsx_path: str) -> str:
+    """Crée la base à partir du classeur si elle n'existe pas encore."""
+    db = db_path(xlsx_path)
+    if os.path.exists(db):
+        if db not in _migrated:
+            with _write(db) as conn:
+                _migrate(conn)
+            _migrated.add(db)
+        return db
+
+    tmp = f"{db}.{os.getpid()}.tmp"
+    conn = sqlite3.connect(tmp, isolation_level=None)
+    try:
+        conn.execute("BEGIN")
+        _create_schema(conn)
+        for campaign, records in excel_io.load_all_records_from_excel(xlsx_path).items():
+            fields = record_fields(campaign)
+            rows = [
+                [rec["seq"], rec.get("record_id") or new_record_id()] + _row_values(campaign, rec)
+                for rec in records
+                if rec["nom"] and rec["cin"]  # on ignore les lignes numérotées mais vides
+            ]
+            conn.executemany(
+                f"INSERT INTO {campaign} (seq, record_id, {', '.join(fields)}) "
+                f"VALUES ({', '.join('?' * (len(fields) + 2))})",
+                rows,
+            )
+            _rebuild_aggregates(conn, campaign)
+        conn.execute("COMMIT")
+    finally:
+        conn.close()
+    # Remplacement atomique : un autre processus a pu initialiser la base entre-temps
+    if os.path.exists(db):
+        os.remove(tmp)
+    else:
+        os.replace(tmp, db)
+    _migrated.add(db)
+    return db
+
+
+def campaign_versions(xlsx_path: str) -> dict:
+    """Version de chaque campagne, incrémentée à chaque écriture dans sa table."""
+    with _read(ensure_store(xlsx_path)) as conn:
+        return dict(conn.execute("SELECT campaign, version FROM meta").fetchall())
+
+
+# ---------------------------
+# LECTURE
+# ---------------------------
+def _load_frame(conn, campaign: str) -> pd.DataFrame:
+    df = pd.read_sql_query(
+        f"SELECT {', '.join(record_fields(campaign))} FROM {campaign} WHERE deleted = 0 ORDER BY seq", conn
+    )
+    df["date"] = pd.to_datetime(df["date"], errors="coerce")
+    return normalize_frame(df, campaign)
+
+
+def load_datasets(xlsx_path: str) -> dict:
+    """DataFrames par campagne, au même format que excel_io.load_vaccination_data."""
+    with _read(ensure_store(xlsx_path)) as conn:
+        return {campaign: _load_frame(conn, campaign) for campaign in CAMPAIGNS}
+
+
+def load_dataset(xlsx_path: str, campaign: str) -> pd.DataFrame:
+    """DataFrame d'une seule campagne."""
+    with _read(ensure_store(xlsx_path)) as conn:
+        return _load_frame(conn, campaign)
+
+
+def load_cube(xlsx_path: str, campaign: str) -> pd.DataFrame:
+    """Agrégats région × jour d'une campagne (même format que aggregates.build_cube)."""
+    counts = count_fields(campaign)
+    with _read(ensure_store(xlsx_path)) as conn:
+        cube = pd.read_sql_query(
+            f"SELECT region, day AS date, n, {', '.join(counts)} FROM {campaign}_agg ORDER BY region, day", conn
+        )
+    cube["date"] = pd.to_datetime(cube["date"].replace("", None), errors="coerce")
+    return cube[cube_columns(campaign)]
+
+
+def _record_from_row(campaign: str, row) -> dict:
+    rec = {"row_idx": row[0], "seq": row[1], "record_id": row[2]}
+    rec.update(zip(record_fields(campaign), row[3:]))
+    rec["date"] = _from_iso(rec["date"])
+    rec["version"] = record_version(campaign, rec)
+    return rec
+
+
+def _select_records(conn, campaign: str, record_id: str = None) -> list:
+    sql = f"SELECT id, seq, record_id, {', '.join(record_fields(campaign))} FROM {campaign} WHERE deleted = 0"
+    if record_id is not None:
+        cur = conn.execute(f"{sql} AND record_id = ?", (str(record_id),))
+    else:
+        cur = conn.execute(f"{sql} ORDER BY seq")
+    return [_record_from_row(campaign, row) for row in cur]
+
+
+def load_records(xlsx_path: str, campaign: str) -> list:
+    """Enregistrements non supprimés d'une campagne ; "row_idx" contient l'identifiant SQL."""
+    with _read(ensure_store(xlsx_path)) as conn:
+        return _select_records(conn, campaign)
+
+
+# ---------------------------
+# ÉCRITURE
+# ---------------------------
+def append_record(xlsx_path: str, campaign: str, rec: dict):
+    append_records(xlsx_path, campaign, [rec])
+
+
+def append_records(xlsx_path: str, campaign: str, records: list):
+    """Ajoute plusieurs enregistrements dans une seule transaction."""
+    fields = record_fields(campaign)
+    values = [_row_values(campaign, rec) for rec in records]
+    with _write(ensure_store(xlsx_path)) as conn:
+        seq = conn.execute(f"SELECT COALESCE(MAX(seq), 0) FROM {campaign}").fetchone()[0]
+        conn.executemany(
+            f"INSERT INTO {campaign} (seq, record_id, {', '.join(fields)}) "
+            f"VALUES ({', '.join('?' * (len(fields) + 2))})",
+            [
+                [seq + i, rec.get("record_id") or new_record_id()] + row
+                for i, (rec, row) in enumerate(zip(records, values), start=1)
+            ],
+        )
+        _apply_aggregates(conn, campaign, values, 1)
+        _bump_version(conn, campaign)
+
+
+def _check_current(conn, campaign: str, record_id: str, expected_version: str) -> dict:
+    current = _select_records(conn, campaign, record_id)
+    if not current:
+        raise StaleRecordError("L'enregistrement a été supprimé par un autre utilisateur.")
+    check_version(campaign, current[0], expected_version)
+    return current[0]
+
+
+def update_record(xlsx_path: str, campaign: str, record_id: str, rec: dict, expected_version: str = None):
+    assignments = ", ".join(f"{f} = ?" for f in record_fields(campaign))
+    with _write(ensure_store(xlsx_path)) as conn:
+        current = _check_current(conn, campaign, record_id, expected_version)
+        values = _row_values(campaign, rec)
+        conn.execute(f"UPDATE {campaign} SET {assignments} WHERE record_id = ?", values + [str(record_id)])
+        _apply_aggregates(conn, campaign, [_row_values(campaign, current)], -1)
+        _apply_aggregates(conn, campaign, [values], 1)
+        _bump_version(conn, campaign)
+
+
+def delete_record(xlsx_path: str, campaign: str, record_id: str, expected_version: str = None):
+    with _write(ensure_store(xlsx_path)) as conn:
+        current = _check_current(conn, campaign, record_id, expected_version)
+        conn.execute(f"UPDATE {campaign} SET deleted = 1 WHERE record_id = ?", (str(record_id),))
+        _apply_aggregates(conn, campaign, [_row_values(campaign, current)], -1)
+        _bump_version(conn, campaign)
+
+
+def purge_deleted(xlsx_path: str) -> int:
+    """Retire les lignes marquées supprimées (passe de maintenance) ; renvoie leur nombre."""
+    purged = 0
+    with _write(ensure_store(xlsx_path)) as conn:
+        for campaign in CAMPAIGNS:
+            purged += conn.execute(f"DELETE FROM {campaign} WHERE deleted = 1").rowcount
+    return purged
+
+
+# ---------------------------
+# EXPORT
+# ---------------------------
+def export_workbook(xlsx_path: str) -> bytes:
+    """Classeur Excel stylé reconstruit depuis la base (le classeur sert de modèle)."""
+    with _read(ensure_store(xlsx_path)) as conn:
+        records = {c: _select_records(conn, c) for c in CAMPAIGNS}
+    return excel_io.export_workbook(xlsx_path, records)
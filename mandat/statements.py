@@ -0,0 +1,216 @@
+"""Relevés individuels : un fichier par personne (CIN) avec ses lignes facturées.
+
+    python -m mandat.statements ["data/mandat sanitaire 2026.xlsx"] --output-dir releves \\
+        [--prices prix.json] [--price rage.prix_chien=2] [--campaign rage] \\
+        [--start 2026-01-01] [--end 2026-01-31] [--format csv|xlsx] [--workers 4]
+
+Les campagnes sont lues une à une (federation.load_dataset : stockage de
+référence pour le classeur courant, lecture directe d'Excel pour une
+archive) et mises en lignes facturées par billing.line_items avec les prix
+de la calculatrice (fichier JSON ou --price, comme mandat.report). Les
+lignes de chaque campagne sont aussitôt réparties sur disque en PARTITIONS
+tranches selon le CIN : une personne est entière dans une tranche, et une
+seule tranche à la fois est en mémoire pour l'écriture.
+
+Les relevés d'une tranche sont écrits par un pool de processus, par lots de
+BATCH personnes ; au plus deux lots par processus sont en attente, et
+l'index (releves.csv : une ligne par personne, son nombre de lignes et son
+montant) est écrit au fil des lots.
+"""
+import argparse
+import csv
+import multiprocessing
+import os
+import pickle
+import re
+import sys
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+import openpyxl
+import pandas as pd
+
+from mandat import aggregates, billing, federation
+from mandat.campaigns import CAMPAIGNS
+from mandat.report import date_range, parse_prices
+
+BATCH = 50  # personnes par tâche du pool
+PARTITIONS = 16  # tranches de CIN sur disque
+INDEX_FILE = "releves.csv"
+
+COLUMNS = {
+    "campagne": "Campagne", "date": "Date", "region": "Région", "recu_num": "N° reçu",
+    "champ": "Animaux", "quantite": "Quantité", "prix_unitaire": "Prix unitaire", "montant": "Montant",
+}
+INDEX_COLUMNS = ["cin", "nom", "lignes", "animaux", "montant", "fichier"]
+
+
+def cin_key(cin: pd.Series) -> pd.Series:
+    """CIN comparables : un CIN saisi comme nombre a perdu ses zéros de tête (8 chiffres)."""
+    text = cin.astype("string").str.strip()
+    return text.where(~text.str.fullmatch(r"\d{1,7}").fillna(False), text.str.zfill(8))
+
+
+def statement_lines(path: str, campaign: str, prices: dict = None, dates=None) -> pd.DataFrame:
+    """Lignes facturées d'une campagne, avec le CIN normalisé (lignes sans CIN écartées)."""
+    dataset = aggregates.apply_filters(federation.load_dataset(path, campaign), date_range=dates)
+    lines = billing.line_items({campaign: dataset}, prices)
+    lines["cin"] = cin_key(lines["cin"])
+    return lines.dropna(subset=["cin"])
+
+
+def partition_lines(path: str, campaigns: list, workdir: str, prices: dict = None, dates=None) -> list:
+    """Répartit les lignes de chaque campagne en PARTITIONS fichiers selon le CIN ; renvoie leurs chemins.
+
+    Une seule campagne est en mémoire à la fois ; chaque fichier reçoit un
+    bloc (pickle) par campagne.
+    """
+    paths = [os.path.join(workdir, f"tranche_{i:02d}.pkl") for i in range(PARTITIONS)]
+    for campaign in campaigns:
+        lines = statement_lines(path, campaign, prices, dates)
+        part = pd.util.hash_pandas_object(lines["cin"], index=False).to_numpy() % PARTITIONS
+        for i, chunk in lines.groupby(part, sort=False):
+            with open(paths[i], "ab") as f:
+                pickle.dump(chunk, f, protocol=pickle.HIGHEST_PROTOCOL)
+    return [p for p in paths if os.path.exists(p)]
+
+
+def read_partition(path: str) -> pd.DataFrame:
+    """Lignes d'une tranche, toutes campagnes, triées par CIN puis date."""
+    chunks = []
+    with open(path, "rb") as f:
+        while True:
+            try:
+                chunks.append(pickle.load(f))
+            except EOFError:
+                break
+    lines = pd.concat(chunks, ignore_index=True)
+    return lines.sort_values(["cin", "date", "campagne"], kind="stable", ignore_index=True)
+
+
+# ---------------------------
+# ÉCRITURE DES RELEVÉS (processus du pool)
+# ---------------------------
+def _file_name(cin: str, fmt: str) -> str:
+    return f"releve_{re.sub(r'[^0-9A-Za-z]+', '_', cin)}.{fmt}"
+
+
+def write_statement(lines: pd.DataFrame, output_dir: str, fmt: str) -> dict:
+    """Écrit le relevé d'une personne ; renvoie sa ligne d'index."""
+    cin = lines["cin"].iloc[0]
+    nom = lines["nom"].mode().iloc[0] if lines["nom"].notna().any() else ""
+    table = lines[list(COLUMNS)].rename(columns=COLUMNS)
+    table["Date"] = table["Date"].dt.strftime("%d/%m/%Y")
+    total = {"Campagne": "Total", "Quantité": int(lines["quantite"].sum()), "Montant": round(float(lines["montant"].sum()), 3)}
+    name = _file_name(cin, fmt)
+    path = os.path.join(output_dir, name)
+
+    if fmt == "xlsx":
+        wb = openpyxl.Workbook(write_only=True)
+        ws = wb.create_sheet("Relevé")
+        ws.append(["Nom", nom])
+        ws.append(["CIN", cin])
+        ws.append([])
+        ws.append(list(table.columns))
+        for row in table.itertuples(index=False):
+            ws.append([None if pd.isna(v) else v for v in row])
+        ws.append([total.get(c) for c in table.columns])
+        wb.save(path)
+    else:
+        table = pd.concat([table, pd.DataFrame([total])], ignore_index=True)
+        with open(path, "w", encoding="utf-8-sig", newline="") as f:
+            f.write(f"Nom;{nom}\nCIN;{cin}\n\n")
+            table.to_csv(f, index=False, sep=";")
+    return {"cin": cin, "nom": nom, "lignes": len(lines), "animaux": total["Quantité"],
+            "montant": total["Montant"], "fichier": name}
+
+
+def write_batch(batch: pd.DataFrame, output_dir: str, fmt: str) -> list:
+    """Relevés d'un lot de personnes (tâche du pool)."""
+    return [write_statement(lines, output_dir, fmt) for _, lines in batch.groupby("cin", sort=False)]
+
+
+def batches(lines: pd.DataFrame, size: int = BATCH):
+    """Lots de "size" personnes (lignes triées par CIN), produits à la demande."""
+    cin = lines["cin"].to_numpy(dtype=object)
+    starts = np.flatnonzero(np.r_[True, cin[1:] != cin[:-1]])
+    for i in range(0, len(starts), size):
+        end = starts[i + size] if i + size < len(starts) else len(lines)
+        yield lines.iloc[starts[i]:end]
+
+
+def generate(parts, output_dir: str, fmt: str = "csv", workers: int = None) -> tuple:
+    """Écrit un relevé par CIN et l'index ; renvoie (nombre de relevés, montant total).
+
+    "parts" est un itérable de DataFrames de lignes triées par CIN (une
+    tranche chacun, une personne entière par tranche), lus à la demande.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    count, amount = 0, 0.0
+    with open(os.path.join(output_dir, INDEX_FILE), "w", encoding="utf-8-sig", newline="") as f:
+        index = csv.DictWriter(f, INDEX_COLUMNS, delimiter=";")
+        index.writeheader()
+
+        def record(rows):
+            nonlocal count, amount
+            index.writerows(rows)
+            count += len(rows)
+            amount += sum(r["montant"] for r in rows)
+
+        if workers == 1:
+            for lines in parts:
+                for batch in batches(lines):
+                    record(write_batch(batch, output_dir, fmt))
+            return count, round(amount, 3)
+
+        # "spawn" : le stockage a pu démarrer des threads (compacteur, maintenance)
+        # dont un fork copierait les verrous
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(workers, mp_context=context) as pool:
+            pending = set()
+            for lines in parts:
+                for batch in batches(lines):
+                    if len(pending) >= 2 * workers:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            record(future.result())
+                    pending.add(pool.submit(write_batch, batch, output_dir, fmt))
+            for future in pending:
+                record(future.result())
+    return count, round(amount, 3)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m mandat.statements", description="Relevés individuels par CIN.")
+    parser.add_argument("workbook", nargs="?", default=federation.CURRENT_WORKBOOK, help="classeur Excel du mandat")
+    parser.add_argument("--output-dir", "-o", default="releves", help="dossier des relevés (défaut : releves)")
+    parser.add_argument("--campaign", action="append", choices=list(CAMPAIGNS), help="campagne (répétable, défaut : toutes)")
+    parser.add_argument("--start", help="date de début AAAA-MM-JJ")
+    parser.add_argument("--end", help="date de fin AAAA-MM-JJ (incluse)")
+    parser.add_argument("--prices", help="fichier JSON des prix (forme de PRIX_DEFAULT)")
+    parser.add_argument("--price", action="append", default=[], help="campagne.prix_x=valeur (répétable)")
+    parser.add_argument("--format", choices=["csv", "xlsx"], default="csv")
+    parser.add_argument("--workers", type=int, default=None, help="processus d'écriture (défaut : un par cœur)")
+    args = parser.parse_args(argv)
+
+    try:
+        prices = parse_prices(args.prices, args.price)
+    except (OSError, ValueError) as exc:
+        parser.error(str(exc))
+    if not os.path.exists(args.workbook):
+        parser.error(f"Fichier introuvable : {args.workbook}")
+
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory(prefix="releves-") as workdir:
+        partitions = partition_lines(args.workbook, args.campaign or list(CAMPAIGNS), workdir,
+                                     prices, date_range(args.start, args.end))
+        count, amount = generate(map(read_partition, partitions), args.output_dir, args.format, args.workers)
+    print(f"{count} relevé(s), {amount:,.3f} DT, dans {args.output_dir} en {time.perf_counter() - start:.1f} s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,213 @@
+"""Point d'entrée des pages pour lire et écrire les enregistrements.
+
+Le stockage de référence est choisi par la variable d'environnement
+MANDAT_BACKEND :
+- "sqlite" (défaut) : base SQLite à côté du classeur, Excel produit à la demande ;
+- "excel" : le classeur est lu et réécrit directement ; les nouvelles saisies
+  passent par un journal intégré par lots (voir mandat.journal).
+
+Dans les deux cas, "path" désigne le classeur Excel du mandat. Les
+enregistrements sont adressés par leur identifiant stable "record_id" ; une
+suppression pose une marque, et les lignes marquées sont retirées par une
+passe de maintenance périodique (MANDAT_MAINTENANCE_INTERVAL, en secondes).
+"""
+import logging
+import os
+import threading
+import time
+
+from mandat import aggregates, excel_io, journal, sqlite_store
+
+BACKEND = os.environ.get("MANDAT_BACKEND", "sqlite").strip().lower()
+MAINTENANCE_INTERVAL = float(os.environ.get("MANDAT_MAINTENANCE_INTERVAL", "3600"))
+
+logger = logging.getLogger(__name__)
+_maintenance = {}
+_maintenance_lock = threading.Lock()
+
+
+def campaign_versions(path: str) -> dict:
+    """Jeton de version par campagne (clé de cache).
+
+    Seul le jeton de la campagne modifiée change : les caches des autres
+    campagnes restent valides. En mode Excel, le jeton combine le CRC de la
+    feuille dans le zip et la dernière entrée du journal pour la campagne.
+    """
+    if BACKEND == "excel":
+        crcs = excel_io.sheet_fingerprints(path)
+        pending = journal.pending_versions(path)
+        return {c: (crc, pending.get(c, 0)) for c, crc in crcs.items()}
+    return sqlite_store.campaign_versions(path)
+
+
+def campaign_version(path: str, campaign: str):
+    return campaign_versions(path)[campaign]
+
+
+def data_version(path: str):
+    """Jeton qui change à chaque modification des données (clé de cache)."""
+    return tuple(sorted(campaign_versions(path).items()))
+
+
+def load_datasets(path: str) -> dict:
+    """DataFrames des quatre campagnes pour le dashboard."""
+    ensure_maintenance(path)
+    if BACKEND == "excel":
+        journal.ensure_compactor(path)
+        return journal.load_vaccination_data(path)
+    return sqlite_store.load_datasets(path)
+
+
+def load_dataset(path: str, campaign: str):
+    """DataFrame d'une campagne (les feuilles inchangées ne sont pas relues)."""
+    ensure_maintenance(path)
+    if BACKEND == "excel":
+        journal.ensure_compactor(path)
+        return journal.load_vaccination_data(path)[campaign]
+    return sqlite_store.load_dataset(path, campaign)
+
+
+def load_cube(path: str, campaign: str):
+    """Agrégats campagne × région × jour (voir mandat.aggregates)."""
+    if BACKEND == "excel":
+        # reconstruit une fois par version de la campagne (clé de cache des pages)
+        return aggregates.build_cube(load_dataset(path, campaign), campaign)
+    return sqlite_store.load_cube(path, campaign)
+
+
+def load_records(path: str, campaign: str) -> list:
+    """Enregistrements d'une campagne pour l'écran de modification.
+
+    "record_id" est l'identifiant stable de l'enregistrement, "row_idx" sa
+    position actuelle dans le stockage (simple indication) et "version"
+    l'empreinte de son contenu ; les trois sont à repasser à update/delete.
+    """
+    ensure_maintenance(path)
+    if BACKEND == "excel":
+        journal.ensure_compactor(path)
+        records = journal.load_records(path, campaign)
+        if any(not rec.get("record_id") for rec in records):
+            # classeur antérieur aux identifiants : migration unique
+            excel_io.assign_record_ids(path)
+            records = journal.load_records(path, campaign)
+        return records
+    return sqlite_store.load_records(path, campaign)
+
+
+def append_record(path: str, campaign: str, rec: dict):
+    """Ajoute une saisie et renvoie son ticket (voir pending_tickets).
+
+    En mode Excel, la saisie est durable dès son écriture dans le journal ;
+    le compacteur l'intègre ensuite au classeur avec les autres saisies en
+    attente (un seul enregistrement). Le ticket est son numéro de journal.
+    En mode SQLite, la saisie est écrite tout de suite : ticket None.
+    """
+    if BACKEND == "excel":
+        return journal.append(path, campaign, rec)
+    sqlite_store.append_record(path, campaign, rec)
+    return None
+
+
+def pending_tickets(path: str, tickets: list) -> set:
+    """Tickets de saisies pas encore intégrées au stockage de référence."""
+    tickets = [t for t in tickets if t is not None]
+    if BACKEND != "excel" or not tickets:
+        return set()
+    return set(tickets) - journal.committed(path, tickets)
+
+
+def append_records(path: str, campaign: str, records: list):
+    """Ajoute un lot d'enregistrements en une seule écriture (import groupé)."""
+    if not records:
+        return
+    if BACKEND == "excel":
+        # le journal en attente est intégré dans le même enregistrement du classeur
+        journal.compact(path, extra={campaign: records})
+    else:
+        sqlite_store.append_records(path, campaign, records)
+
+
+def ingest_records(path: str, campaign: str, records: list):
+    """Ajoute un petit lot (API, formulaires mobiles) sans réécrire le classeur.
+
+    En mode Excel le lot part dans le journal (une écriture, un fsync) et
+    sera intégré par le compacteur avec les autres saisies ; en mode SQLite
+    c'est une seule transaction. Pour les gros imports, voir append_records.
+    """
+    if not records:
+        return
+    if BACKEND == "excel":
+        journal.append_many(path, campaign, records)
+    else:
+        sqlite_store.append_records(path, campaign, records)
+
+
+def update_record(path: str, campaign: str, record_id: str, rec: dict,
+                  expected_version: str = None, row_hint: int = None):
+    """Modifie un enregistrement.
+
+    Lève locking.StaleRecordError si l'enregistrement a changé ou a été
+    supprimé depuis la lecture qui a fourni expected_version,
+    locking.LockTimeout si le stockage reste occupé trop longtemps.
+    """
+    if BACKEND == "excel":
+        journal.compact(path)  # les saisies du journal deviennent des lignes réelles
+        excel_io.update_record_in_excel(path, campaign, record_id, rec, expected_version, row_hint)
+    else:
+        sqlite_store.update_record(path, campaign, record_id, rec, expected_version)
+
+
+def delete_record(path: str, campaign: str, record_id: str,
+                  expected_version: str = None, row_hint: int = None):
+    """Marque un enregistrement supprimé (mêmes erreurs que update_record)."""
+    if BACKEND == "excel":
+        journal.compact(path)
+        excel_io.delete_record_from_excel(path, campaign, record_id, expected_version, row_hint)
+    else:
+        sqlite_store.delete_record(path, campaign, record_id, expected_version)
+
+
+def purge_deleted(path: str) -> int:
+    """Retire physiquement les enregistrements marqués supprimés."""
+    if BACKEND == "excel":
+        journal.compact(path)
+        return excel_io.purge_deleted_rows(path)
+    return sqlite_store.purge_deleted(path)
+
+
+def export_workbook(path: str) -> bytes:
+    """Contenu du classeur Excel à télécharger."""
+    if BACKEND == "excel":
+        # copie en mémoire sans les lignes supprimées : un téléchargement ne modifie pas le classeur
+        return journal.export_workbook(path)
+    return sqlite_store.export_workbook(path)
+
+
+# ---------------------------
+# MAINTENANCE PÉRIODIQUE
+# ---------------------------
+class _Maintenance(threading.Thread):
+    """Thread d'arrière-plan qui purge les suppressions à intervalle régulier."""
+
+    def __init__(self, path: str):
+        super().__init__(name=f"maintenance:{os.path.basename(path)}", daemon=True)
+        self.path = path
+
+    def run(self):
+        while True:
+            time.sleep(MAINTENANCE_INTERVAL)
+            try:
+                purge_deleted(self.path)
+            except Exception:  # on réessaie au prochain tour
+                logger.exception("purge impossible : %s", self.path)
+
+
+def ensure_maintenance(path: str):
+    """Démarre (une seule fois par processus) la maintenance du classeur."""
+    if MAINTENANCE_INTERVAL <= 0:
+        return
+    key = os.path.abspath(path)
+    with _maintenance_lock:
+        if key not in _maintenance:
+            _maintenance[key] = _Maintenance(path)
+            _maintenance[key].start()
@@ -0,0 +1,135 @@
+"""Composants Streamlit partagés par les pages.
+
+Les figures Plotly sont gardées dans un cache LRU commun à toutes les
+sessions (figure_cache) : la page les reconstruit seulement quand la
+version des données ou les filtres changent.
+
+Le navigateur d'enregistrements (record_browser) remplace les tableaux et
+listes qui envoyaient toutes les lignes au navigateur à chaque rerun : le
+tri et le découpage en pages sont faits côté serveur, et seule la page
+courante, réduite aux colonnes affichées, est sérialisée.
+"""
+import math
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from mandat import profiling
+
+PAGE_SIZES = [25, 50, 100, 250]
+FIGURE_CACHE_ENTRIES = 64
+
+
+# ---------------------------
+# CACHE DE FIGURES
+# ---------------------------
+class FigureCache:
+    """Cache LRU de figures : clé -> figure (en lecture seule une fois construite)."""
+
+    def __init__(self, max_entries: int = FIGURE_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._figures = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_build(self, key, build):
+        with self._lock:
+            if key in self._figures:
+                self._figures.move_to_end(key)
+                return self._figures[key]
+        # construction hors verrou : deux sessions peuvent construire la même
+        # figure en même temps, la dernière remplace l'autre
+        fig = build()
+        with self._lock:
+            self._figures[key] = fig
+            self._figures.move_to_end(key)
+            while len(self._figures) > self.max_entries:
+                self._figures.popitem(last=False)
+        return fig
+
+
+@st.cache_resource
+def figure_cache() -> FigureCache:
+    return FigureCache()
+
+
+# ---------------------------
+# NAVIGATEUR D'ENREGISTREMENTS
+# ---------------------------
+
+
+def sort_positions(df: pd.DataFrame, sort_by: str, ascending: bool = True) -> np.ndarray:
+    """Positions des lignes de df triées sur une colonne (tri stable, valeurs vides en dernier)."""
+    col = df[sort_by].reset_index(drop=True)
+    if col.dtype == object:
+        # CIN et reçus lus du classeur : nombres et textes mêlés, comparés en texte
+        col = col.where(col.isna(), col.astype(str))
+    return col.sort_values(ascending=ascending, kind="stable", na_position="last").index.to_numpy()
+
+
+def page_rows(df: pd.DataFrame, page: int, page_size: int, sort_by=None, ascending: bool = True) -> pd.DataFrame:
+    """Lignes de la page "page" (à partir de 1) de df trié sur "sort_by"."""
+    start = (page - 1) * page_size
+    if sort_by is None:
+        return df.iloc[start:start + page_size]
+    return df.iloc[sort_positions(df, sort_by, ascending)[start:start + page_size]]
+
+
+def record_browser(df: pd.DataFrame, columns: list, key: str, default_sort=None, height="auto") -> pd.DataFrame:
+    """Affiche df par pages (taille, tri et page choisis par l'utilisateur).
+
+    Seules les colonnes "columns" de la page courante sont envoyées au
+    navigateur. Renvoie les lignes complètes de la page affichée.
+    """
+    col_sort, col_order, col_size, col_page = st.columns([3, 2, 2, 2])
+    with col_sort:
+        sort_by = st.selectbox("Trier par", options=columns,
+                               index=columns.index(default_sort) if default_sort in columns else 0,
+                               key=f"{key}_sort")
+    with col_order:
+        order = st.selectbox("Ordre", options=["Croissant", "Décroissant"], key=f"{key}_order")
+    with col_size:
+        page_size = st.selectbox("Lignes par page", options=PAGE_SIZES, key=f"{key}_size")
+
+    n_pages = max(1, math.ceil(len(df) / page_size))
+    # les filtres ont pu réduire le nombre de pages depuis le dernier rerun
+    if st.session_state.get(f"{key}_page", 1) > n_pages:
+        st.session_state[f"{key}_page"] = n_pages
+    with col_page:
+        page = st.number_input("Page", min_value=1, max_value=n_pages, step=1, key=f"{key}_page")
+
+    rows = page_rows(df, int(page), page_size, sort_by, order == "Croissant")
+    start = (int(page) - 1) * page_size
+    st.caption(f"Page {int(page)} sur {n_pages} — lignes {min(start + 1, len(df))}–{start + len(rows)} sur {len(df)}")
+    view = rows[columns]
+    mixed = [c for c in columns if view[c].dtype == object]
+    if mixed:
+        # colonnes mêlant nombres et textes : affichées en texte (conversion Arrow)
+        view = view.astype({c: "string" for c in mixed})
+    st.dataframe(view, use_container_width=True, hide_index=True, height=height)
+    return rows
+
+
+# ---------------------------
+# PROFILAGE
+# ---------------------------
+def start_profiling(page: str):
+    """Ouvre le chronométrage du rerun si MANDAT_PROFILE=1 ou ?profile=1 dans l'URL."""
+    if profiling.ENABLED or st.query_params.get("profile") in ("1", "true"):
+        return profiling.start_run(page)
+    return None
+
+
+def profiling_panel():
+    """Clôt le rerun chronométré et affiche son détail et les percentiles (expander admin)."""
+    run = profiling.finish_run()
+    if run is None:
+        return
+    with st.expander(f"⏱️ Profilage — rerun en {run.total * 1000:.0f} ms"):
+        st.markdown("**Ce rerun**")
+        st.dataframe(profiling.breakdown(run), use_container_width=True, hide_index=True)
+        st.markdown("**Derniers reruns de la page**")
+        st.dataframe(profiling.percentiles(run.page), use_container_width=True, hide_index=True)
+        st.caption(f"Détail de chaque rerun : {profiling.LOG_PATH}")
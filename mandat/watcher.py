@@ -0,0 +1,89 @@
+"""Surveillance du classeur et préchargement des données du dashboard.
+
+Un thread d'arrière-plan interroge les jetons de version des campagnes
+(storage.campaign_versions, moins d'une milliseconde) à intervalle régulier
+(MANDAT_WATCH_INTERVAL, en secondes). Quand une campagne change, son
+DataFrame et son cube sont relus dans ce thread, hors de toute requête, puis
+remplacent d'un coup l'instantané précédent : les pages lisent toujours un
+instantané complet et déjà chargé, jamais un chargement en cours.
+
+Seul le premier chargement (démarrage du processus) est fait dans la
+requête qui crée le watcher.
+"""
+import logging
+import os
+import threading
+import time
+from typing import NamedTuple
+
+import pandas as pd
+
+from mandat import aggregates, storage
+
+WATCH_INTERVAL = float(os.environ.get("MANDAT_WATCH_INTERVAL", "1"))
+
+logger = logging.getLogger(__name__)
+_watchers = {}
+_watchers_lock = threading.Lock()
+
+
+class Snapshot(NamedTuple):
+    """Données d'une campagne pour une version donnée (en lecture seule)."""
+    version: object
+    data: pd.DataFrame
+    cube: pd.DataFrame
+
+
+class DatasetWatcher(threading.Thread):
+    """Thread qui garde à jour un instantané {campagne: Snapshot} du classeur."""
+
+    def __init__(self, path: str, interval: float = WATCH_INTERVAL):
+        super().__init__(name=f"watcher:{os.path.basename(path)}", daemon=True)
+        self.path = path
+        self.interval = interval
+        self._snapshots = {}
+        self._reloads = 0
+
+    def snapshots(self) -> dict:
+        """Instantané courant {campagne: Snapshot} (remplacé, jamais modifié sur place)."""
+        return self._snapshots
+
+    def refresh(self) -> list:
+        """Recharge les campagnes dont la version a changé ; renvoie leurs noms."""
+        current = self._snapshots
+        changed = []
+        loaded = {}
+        for campaign, version in storage.campaign_versions(self.path).items():
+            old = current.get(campaign)
+            if old is not None and old.version == version:
+                continue
+            # cube tiré du DataFrame qui vient d'être lu : une seule lecture par
+            # campagne, et données et cube toujours de la même version
+            data = storage.load_dataset(self.path, campaign)
+            loaded[campaign] = Snapshot(version, data, aggregates.build_cube(data, campaign))
+            changed.append(campaign)
+        if loaded:
+            # remplacement atomique : un lecteur voit l'ancien ou le nouveau dict, jamais un mélange
+            self._snapshots = {**current, **loaded}
+            self._reloads += 1
+        return changed
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.refresh()
+            except Exception:  # classeur en cours d'écriture, etc. : on réessaie au tour suivant
+                logger.exception("rechargement impossible : %s", self.path)
+
+
+def ensure_watcher(path: str) -> DatasetWatcher:
+    """Watcher du classeur (un par processus), chargé une première fois puis démarré."""
+    key = os.path.abspath(path)
+    with _watchers_lock:
+        if key not in _watchers:
+            watcher = DatasetWatcher(path)
+            watcher.refresh()
+            watcher.start()
+            _watchers[key] = watcher
+        return _watchers[key]
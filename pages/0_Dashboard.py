@@ -3,24 +3,15 @@ import pandas as pd
 import streamlit as st
 import plotly.express as px
 import plotly.graph_objects as go
-import openpyxl
 from datetime import datetime
 import base64
-import io
 import os
 
-DATA_FILE = os.path.join("data", "mandat sanitaire 2026.xlsx")
+from mandat import aggregates, billing, federation, profiling, ui, watcher
+from mandat.billing import PRIX_DEFAULT
 
-def get_file_mtime(path: str) -> float:
-    try:
-        return os.path.getmtime(path)
-    except FileNotFoundError:
-        return 0.0
-
-@st.cache_data
-def load_vaccination_data_from_path(path: str, mtime: float):
-    # on réutilise ta fonction existante (load_vaccination_data) en lui passant le path
-    return load_vaccination_data(path)
+DATA_FILE = federation.CURRENT_WORKBOOK
+ARCHIVE_CACHE_ENTRIES = 8  # classeurs d'autres années / gouvernorats gardés en mémoire
 
 # ---------------------------
 # CONFIGURATION
@@ -32,15 +23,6 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
-# ---------------------------
-# PRIX PAR DÉFAUT (modifiable par l'utilisateur)
-# ---------------------------
-PRIX_DEFAULT = {
-    "aphto_ovin_caprin": {"prix_ovin": 0.0, "prix_caprin": 0.0},
-    "ovin_clavelee": {"prix_ovin": 0.0},
-    "bovin_aphto": {"prix_bovin": 0.0},
-    "rage": {"prix_chien": 0.0},
-}
 # ---------------------------
 # PALETTE BLEUE (logo vétérinaire)
 # ---------------------------
@@ -66,6 +48,61 @@ def apply_transparent_theme(fig):
     )
     return fig
 
+def show_chart(campaign: str, kind: str, filters, build):
+    """Affiche une figure, construite seulement si la campagne (version) ou les filtres ont changé.
+
+    La clé est (campagne, version, filtres, type de graphique) : changer
+    d'onglet ou toucher un autre widget réutilise la figure déjà construite.
+    """
+    key = (campaign, versions[campaign], filters, kind)
+    fig = ui.figure_cache().get_or_build(key, lambda: apply_transparent_theme(build()))
+    st.plotly_chart(fig, use_container_width=True)
+
+def temporal_chart(campaign: str, cube_f: pd.DataFrame, date_range, filters):
+    """Section "Évolution temporelle" : un point par jour, semaine ou mois selon la période."""
+    if not cube_f['date'].notna().any():
+        return
+    st.markdown("""
+        <div class="section-head">
+        <div class="section-icon-pro">📈</div>
+        <div class="section-title-pro">Évolution temporelle des vaccinations</div>
+        <div class="section-line-pro"></div>
+        </div>
+        """, unsafe_allow_html=True)
+
+    def build():
+        if 'annee' in cube_f.columns and cube_f['annee'].nunique() > 1:
+            # plusieurs années : une courbe par saison, superposées jour pour jour
+            temporal_data, resolution = aggregates.timeseries_by_year(cube_f, campaign)
+            fig = go.Figure()
+            for i, (annee, year_data) in enumerate(temporal_data.groupby('annee')):
+                fig.add_trace(go.Scatter(
+                    x=year_data['date'],
+                    y=year_data['total'],
+                    mode='lines+markers',
+                    name=str(annee),
+                    line=dict(color=CHART_COLORS[i % len(CHART_COLORS)], width=3),
+                ))
+            fig.update_layout(height=350, margin=dict(l=10, r=10, t=10, b=10), xaxis_tickformat="%d/%m",
+                              yaxis_title=f"Animaux vaccinés par {resolution}")
+            return fig
+
+        temporal_data, resolution = aggregates.timeseries(cube_f, campaign, date_range)
+
+        fig = go.Figure()
+        fig.add_trace(go.Scatter(
+            x=temporal_data['date'],
+            y=temporal_data['total'],
+            mode='lines+markers',
+            name='Total',
+            line=dict(color=BLUE_MAIN, width=3),
+            marker=dict(size=8, color=BLUE_DARK)
+        ))
+        fig.update_layout(height=350, margin=dict(l=10, r=10, t=10, b=10),
+                          yaxis_title=f"Animaux vaccinés par {resolution}")
+        return fig
+    show_chart(campaign, 'evolution', filters, build)
+
 def kpi_cards(items):
     """Afficher des cartes KPI"""
     html = '<div class="kpi-grid">'
@@ -83,10 +120,10 @@ def kpi_cards(items):
     html += "</div>"
     st.markdown(html, unsafe_allow_html=True)
 
-def apply_date_filter(df: pd.DataFrame, key: str) -> pd.DataFrame:
-    """Filtre un dataframe par plage de dates Streamlit (si la colonne date existe)."""
+def select_date_range(df: pd.DataFrame, key: str):
+    """Widget de période ; renvoie (début, fin) ou None si aucune période n'est choisie."""
     if df.empty or 'date' not in df.columns or df['date'].isna().all():
-        return df
+        return None
 
     # bornes min/max disponibles
     min_date = df['date'].min().date()
@@ -106,120 +143,38 @@ def apply_date_filter(df: pd.DataFrame, key: str) -> pd.DataFrame:
 
         start_dt = pd.to_datetime(start_date)
         end_dt = pd.to_datetime(end_date) + pd.Timedelta(days=1) - pd.Timedelta(seconds=1)
+        return start_dt, end_dt
+
+    return None
+
+@st.cache_resource(max_entries=ARCHIVE_CACHE_ENTRIES)
+def archive_snapshots(path: str, fingerprint):
+    """Classeur d'archive (autre année / gouvernorat), chargé une fois par version du fichier"""
+    return federation.load_workbook(path)
 
-        return df[(df['date'] >= start_dt) & (df['date'] <= end_dt)]
+@st.cache_resource(max_entries=4)
+def federated_snapshots(versions: tuple, _parts: list):
+    """Instantanés combinés des classeurs retenus ; "versions" suffit comme clé de cache"""
+    return federation.combine(_parts)
 
-    return df
+def workbook_snapshots(wb):
+    """(version, instantanés) d'un classeur : watcher pour le classeur courant, cache sinon"""
+    if federation.is_current(wb):
+        snapshots = watcher.ensure_watcher(wb.path).snapshots()
+        return tuple(snap.version for snap in snapshots.values()), snapshots
+    fingerprint = federation.fingerprint(wb.path)
+    return fingerprint, archive_snapshots(wb.path, fingerprint)
 
 def reset_prix():
     # Reset des prix en session
     st.session_state.prix = {k: v.copy() for k, v in PRIX_DEFAULT.items()}
     st.session_state.prix_version = st.session_state.get("prix_version", 0) + 1
 
-# ---------------------------
-# CHARGEMENT DES DONNÉES
-# ---------------------------
-@st.cache_data
-def load_vaccination_data(file_obj):
-    """Charger les données de vaccination depuis le fichier Excel"""
-    if isinstance(file_obj, str):
-        wb = openpyxl.load_workbook(file_obj, data_only=True)
-    elif isinstance(file_obj, (bytes, bytearray)):
-        wb = openpyxl.load_workbook(io.BytesIO(file_obj), data_only=True)
-    else:
-        try:
-            data = file_obj.getvalue()
-        except Exception:
-            data = file_obj.read()
-        wb = openpyxl.load_workbook(io.BytesIO(data), data_only=True)
-    
-    datasets = {}
-    
-    # Charger aphto ovin et caprin
-    ws = wb['aphto ovin et caprin']
-    rows = list(ws.iter_rows(values_only=True))
-    data = []
-    for i, row in enumerate(rows):
-        if i >= 2:  # Skip first 2 rows
-            if row[11] and row[10]:  # Check for name and ID
-                data.append({
-                    'nom': row[11],
-                    'cin': row[10],
-                    'region': row[9],
-                    'date': row[8],
-                    'recu_num': row[7],
-                    'ovins_vaccines': row[6] or 0,
-                    'caprins_vaccines': row[5] or 0,
-                    'total_ovins': row[4] or 0,
-                    'total_caprins': row[3] or 0,
-                })
-    datasets['aphto_ovin_caprin'] = pd.DataFrame(data)
-    
-    # Charger ovin clavelee
-    ws = wb['ovin clavelee']
-    rows = list(ws.iter_rows(values_only=True))
-    data = []
-    for i, row in enumerate(rows):
-        if i >= 3:  # Skip first 3 rows
-            if row[8] and row[7]:  # Check for name and ID
-                data.append({
-                    'nom': row[8],
-                    'cin': row[7],
-                    'region': row[6],
-                    'date': row[5],
-                    'recu_num': row[4],
-                    'ovins_vaccines': row[3] or 0,
-                    'total_ovins': row[2] or 0,
-                })
-    datasets['ovin_clavelee'] = pd.DataFrame(data)
-    
-    # Charger bovin aphto
-    ws = wb['bovin aphto']
-    rows = list(ws.iter_rows(values_only=True))
-    data = []
-    for i, row in enumerate(rows):
-        if i >= 3:  # Skip first 3 rows
-            if row[10] and row[9]:  # Check for name and ID
-                data.append({
-                    'nom': row[10],
-                    'cin': row[9],
-                    'region': row[8],
-                    'date': row[7],
-                    'recu_num': row[6],
-                    'bovins_vaccines': row[5] or 0,
-                    'total_bovins': row[4] or 0,
-                })
-    datasets['bovin_aphto'] = pd.DataFrame(data)
-    
-    # Charger rage (داء الكلب)
-    ws = wb['داء الكلب']
-    rows = list(ws.iter_rows(values_only=True))
-    data = []
-    for i, row in enumerate(rows):
-        if i >= 4:  # Skip first 4 rows
-            if row[9] and row[8]:  # Check for name and ID
-                data.append({
-                    'nom': row[9],
-                    'cin': row[8],
-                    'region': row[7],
-                    'date': row[6],
-                    'recu_num': row[5],
-                    'chiens_vaccines': row[4] or 0,
-                    'total_chiens': row[3] or 0,
-                })
-    datasets['rage'] = pd.DataFrame(data)
-    # --- NORMALISATION DES DATES (IMPORTANT POUR LES FILTRES) ---
-    for k, df in datasets.items():
-        if not df.empty and 'date' in df.columns:
-            df['date'] = pd.to_datetime(df['date'], errors='coerce')
-            datasets[k] = df
-
-    return datasets
-
 # ---------------------------
 # CHARGEMENT CSS
 # ---------------------------
 load_css("style.css")
+ui.start_profiling("dashboard")
 
 # ---------------------------
 # PAGE D'UPLOAD OU DASHBOARD
@@ -234,10 +189,6 @@ if not os.path.exists(DATA_FILE):
     st.error(f"Fichier introuvable: {DATA_FILE}")
     st.stop()
 
-datasets = load_vaccination_data_from_path(DATA_FILE, get_file_mtime(DATA_FILE))
-st.session_state.datasets = datasets
-st.session_state.data_loaded = True
-
 # Dashboard principal
 # ---------------------------
 # EN-TÊTE
@@ -253,7 +204,54 @@ st.markdown("""
     </div>
 </div>
 """, unsafe_allow_html=True)
-datasets = st.session_state.datasets
+profiling.lap("en-tête")
+
+# ---------------------------
+# CLASSEURS (ANNÉE × GOUVERNORAT)
+# ---------------------------
+# Seuls les classeurs retenus par ces filtres sont chargés (voir mandat.federation)
+workbooks = federation.catalog()
+current_workbook = federation.current()
+selected_workbooks = [current_workbook]
+if len(workbooks) > 1:
+    col1, col2 = st.columns(2)
+    with col1:
+        selected_years = st.multiselect("Année", sorted({wb.annee for wb in workbooks}),
+                                        default=[current_workbook.annee], key="workbook_years")
+    with col2:
+        selected_governorates = st.multiselect("Gouvernorat", sorted({wb.gouvernorat for wb in workbooks}),
+                                               default=[current_workbook.gouvernorat], key="workbook_governorates")
+    selected_workbooks = federation.select(workbooks, selected_years, selected_governorates)
+    if not selected_workbooks:
+        st.warning("Aucun classeur pour cette année et ce gouvernorat.")
+        st.stop()
+
+# Autres classeurs, autres bornes : les périodes choisies repartent de la période complète
+selection = tuple(wb.path for wb in selected_workbooks)
+if st.session_state.get("workbook_selection", selection) != selection:
+    for key in [k for k in st.session_state if str(k).endswith("_dates")]:
+        del st.session_state[key]
+st.session_state["workbook_selection"] = selection
+
+# Instantanés tenus à jour en arrière-plan (voir mandat.watcher) ou gardés en cache
+# par classeur : une seule copie des DataFrames (typés, voir mandat.schema) et des
+# cubes, partagée par toutes les sessions ; la page ne les modifie jamais sur place.
+loaded = [(wb, *workbook_snapshots(wb)) for wb in selected_workbooks]
+if len(selected_workbooks) == 1 and federation.is_current(selected_workbooks[0]):
+    snapshots = loaded[0][2]
+    dimension_cols = []
+else:
+    snapshots = federated_snapshots(tuple((wb, version) for wb, version, _ in loaded),
+                                    [(wb, snaps) for wb, _, snaps in loaded])
+    dimension_cols = federation.DIMENSIONS
+    st.caption(f"{len(selected_workbooks)} classeur(s) : "
+               + ", ".join(f"{wb.annee} · {wb.gouvernorat}" for wb in selected_workbooks))
+versions = {campaign: snap.version for campaign, snap in snapshots.items()}
+datasets = {campaign: snap.data for campaign, snap in snapshots.items()}
+cubes = {campaign: snap.cube for campaign, snap in snapshots.items()}
+profiling.lap("chargement des données")
+st.session_state.data_loaded = True
+
 # ---------------------------
 # TABS PRINCIPALES
 # ---------------------------
@@ -270,6 +268,7 @@ tab1, tab2, tab3, tab4, tab5 = st.tabs([
 # ---------------------------
 with tab1:
     df = datasets['aphto_ovin_caprin']
+    cube = cubes['aphto_ovin_caprin']
     
     if len(df) > 0:
         # Filtres
@@ -284,27 +283,28 @@ with tab1:
         col1, col2 = st.columns(2)
 
         with col1:
-            regions = sorted(df['region'].dropna().unique())
+            regions = sorted(cube['region'].dropna().unique())
             selected_regions = st.multiselect("Région (العمادة)", regions, key="aphto_oc_region")
 
         # Application des filtres (région d'abord)
-        filtered_df = df.copy()
-        if selected_regions:
-            filtered_df = filtered_df[filtered_df['region'].isin(selected_regions)]
+        cube_f = aggregates.apply_filters(cube, selected_regions)
 
         with col2:
-            filtered_df = apply_date_filter(filtered_df, key="aphto_oc_dates")
+            date_range = select_date_range(cube_f, key="aphto_oc_dates")
+        cube_f = aggregates.apply_filters(cube_f, date_range=date_range)
+        chart_filters = (tuple(sorted(selected_regions)), date_range)
+        totals = aggregates.totals(cube_f, 'aphto_ovin_caprin')
 
     
         # KPIs
-        total_ovins = int(filtered_df['total_ovins'].sum())
-        total_caprins = int(filtered_df['total_caprins'].sum())
-        ovins_vaccines = int(filtered_df['ovins_vaccines'].sum())
-        caprins_vaccines = int(filtered_df['caprins_vaccines'].sum())
+        total_ovins = totals['total_ovins']
+        total_caprins = totals['total_caprins']
+        ovins_vaccines = totals['ovins_vaccines']
+        caprins_vaccines = totals['caprins_vaccines']
         total_animaux = total_ovins + total_caprins
         total_vaccines = ovins_vaccines + caprins_vaccines
         taux_vaccination = (total_vaccines / total_animaux * 100) if total_animaux > 0 else 0
-        nb_eleveurs = len(filtered_df)
+        nb_eleveurs = totals['n']
         
         kpi_cards([
             {"label": "Total Animaux", "value": f"{total_animaux:,}".replace(",", " "), "delta": "🐑 Ovins + Caprins"},
@@ -314,6 +314,7 @@ with tab1:
             {"label": "Caprins", "value": f"{caprins_vaccines:,}/{total_caprins:,}".replace(",", " "), "delta": f"📊 {(caprins_vaccines/total_caprins*100 if total_caprins>0 else 0):.1f}%"},
         ])
         
+        profiling.lap("aphto · filtres et KPI")
         # Graphiques
         col1, col2 = st.columns(2)
         
@@ -326,24 +327,22 @@ with tab1:
                 </div>
                 """, unsafe_allow_html=True)
 
-            region_data = filtered_df.groupby('region').agg({
-                'ovins_vaccines': 'sum',
-                'caprins_vaccines': 'sum'
-            }).reset_index()
-            region_data['total'] = region_data['ovins_vaccines'] + region_data['caprins_vaccines']
-            region_data = region_data.sort_values('total', ascending=False).head(10)
+            def build():
+                region_data = aggregates.by_region(cube_f, 'aphto_ovin_caprin')
+                region_data['total'] = region_data['ovins_vaccines'] + region_data['caprins_vaccines']
+                region_data = region_data.sort_values('total', ascending=False).head(10)
             
-            fig = px.bar(
-                region_data,
-                x='total',
-                y='region',
-                orientation='h',
-                color='total',
-                color_continuous_scale=CHART_GRADIENT
-            )
-            fig.update_layout(height=400, margin=dict(l=10, r=10, t=10, b=10), showlegend=False)
-            apply_transparent_theme(fig)
-            st.plotly_chart(fig, use_container_width=True)
+                fig = px.bar(
+                    region_data,
+                    x='total',
+                    y='region',
+                    orientation='h',
+                    color='total',
+                    color_continuous_scale=CHART_GRADIENT
+                )
+                fig.update_layout(height=400, margin=dict(l=10, r=10, t=10, b=10), showlegend=False)
+                return fig
+            show_chart('aphto_ovin_caprin', 'regions', chart_filters, build)
         
         with col2:
             st.markdown("""
@@ -353,53 +352,27 @@ with tab1:
                 <div class="section-line-pro"></div>
                 </div>
                 """, unsafe_allow_html=True)            
-            species_data = pd.DataFrame({
-                'Type': ['Ovins', 'Caprins'],
-                'Vaccinés': [ovins_vaccines, caprins_vaccines]
-            })
+            def build():
+                species_data = pd.DataFrame({
+                    'Type': ['Ovins', 'Caprins'],
+                    'Vaccinés': [ovins_vaccines, caprins_vaccines]
+                })
             
-            fig = px.pie(
-                species_data,
-                values='Vaccinés',
-                names='Type',
-                color_discrete_sequence=CHART_COLORS[:2]
-            )
-            fig.update_layout(height=400, margin=dict(l=10, r=10, t=10, b=10))
-            fig.update_traces(textposition='inside', textinfo='percent+label+value')
-            apply_transparent_theme(fig)
-            st.plotly_chart(fig, use_container_width=True)
+                fig = px.pie(
+                    species_data,
+                    values='Vaccinés',
+                    names='Type',
+                    color_discrete_sequence=CHART_COLORS[:2]
+                )
+                fig.update_layout(height=400, margin=dict(l=10, r=10, t=10, b=10))
+                fig.update_traces(textposition='inside', textinfo='percent+label+value')
+                return fig
+            show_chart('aphto_ovin_caprin', 'species', chart_filters, build)
         
         # Evolution temporelle
-        if 'date' in filtered_df.columns and filtered_df['date'].notna().any():
-            st.markdown("""
-                <div class="section-head">
-                <div class="section-icon-pro">📈</div>
-                <div class="section-title-pro">Évolution temporelle des vaccinations</div>
-                <div class="section-line-pro"></div>
-                </div>
-                """, unsafe_allow_html=True)          
-            temporal_data = filtered_df.copy()
-            temporal_data['date'] = pd.to_datetime(temporal_data['date'])
-            temporal_data = temporal_data.groupby(temporal_data['date'].dt.date).agg({
-                'ovins_vaccines': 'sum',
-                'caprins_vaccines': 'sum'
-            }).reset_index()
-            temporal_data['total'] = temporal_data['ovins_vaccines'] + temporal_data['caprins_vaccines']
-            temporal_data = temporal_data.sort_values('date')
-            
-            fig = go.Figure()
-            fig.add_trace(go.Scatter(
-                x=temporal_data['date'],
-                y=temporal_data['total'],
-                mode='lines+markers',
-                name='Total',
-                line=dict(color=BLUE_MAIN, width=3),                    
-                marker=dict(size=8, color=BLUE_DARK)
-            ))
-            fig.update_layout(height=350, margin=dict(l=10, r=10, t=10, b=10))
-            apply_transparent_theme(fig)
-            st.plotly_chart(fig, use_container_width=True)
+        temporal_chart('aphto_ovin_caprin', cube_f, date_range, chart_filters)
         
+        profiling.lap("aphto · graphiques")
         # Tableau détaillé
         st.markdown("""
                 <div class="section-head">
@@ -409,7 +382,9 @@ with tab1:
                 </div>
                 """, unsafe_allow_html=True)   
         display_cols = ['nom', 'region', 'date', 'ovins_vaccines', 'total_ovins', 'caprins_vaccines', 'total_caprins']
-        st.dataframe(filtered_df[display_cols], use_container_width=True, height=400)
+        filtered_df = aggregates.apply_filters(df, selected_regions, date_range)
+        ui.record_browser(filtered_df, dimension_cols + display_cols, key="browser_aphto", default_sort="date", height=400)
+        profiling.lap("aphto · tableau")
     else:
         st.warning("Aucune donnée disponible pour cette campagne.")
 
@@ -418,6 +393,7 @@ with tab1:
 # ---------------------------
 with tab2:
     df = datasets['ovin_clavelee']
+    cube = cubes['ovin_clavelee']
     
     if len(df) > 0:
         # Filtres
@@ -431,23 +407,24 @@ with tab2:
         col1, col2 = st.columns(2)
 
         with col1:
-            regions = sorted(df['region'].dropna().unique())
+            regions = sorted(cube['region'].dropna().unique())
             selected_regions = st.multiselect("Région (العمادة)", regions, key="clavelee_region")
 
         # Application filtre région
-        filtered_df = df.copy()
-        if selected_regions:
-            filtered_df = filtered_df[filtered_df['region'].isin(selected_regions)]
+        cube_f = aggregates.apply_filters(cube, selected_regions)
 
         with col2:
-            filtered_df = apply_date_filter(filtered_df, key="clavelee_dates")
+            date_range = select_date_range(cube_f, key="clavelee_dates")
+        cube_f = aggregates.apply_filters(cube_f, date_range=date_range)
+        chart_filters = (tuple(sorted(selected_regions)), date_range)
+        totals = aggregates.totals(cube_f, 'ovin_clavelee')
 
         
         # KPIs
-        total_ovins = int(filtered_df['total_ovins'].sum())
-        ovins_vaccines = int(filtered_df['ovins_vaccines'].sum())
+        total_ovins = totals['total_ovins']
+        ovins_vaccines = totals['ovins_vaccines']
         taux_vaccination = (ovins_vaccines / total_ovins * 100) if total_ovins > 0 else 0
-        nb_eleveurs = len(filtered_df)
+        nb_eleveurs = totals['n']
         
         kpi_cards([
             {"label": "Total Ovins", "value": f"{total_ovins:,}".replace(",", " "), "delta": "🐏 Population totale"},
@@ -456,6 +433,7 @@ with tab2:
             {"label": "Taux de Vaccination", "value": f"{taux_vaccination:.1f}%", "delta": "📈 Couverture"},
         ])
         
+        profiling.lap("clavelée · filtres et KPI")
         # Graphiques
         col1, col2 = st.columns(2)
         
@@ -467,20 +445,21 @@ with tab2:
             <div class="section-line-pro"></div>
             </div>
             """, unsafe_allow_html=True)
-            region_data = filtered_df.groupby('region')['ovins_vaccines'].sum().reset_index()
-            region_data = region_data.sort_values('ovins_vaccines', ascending=False).head(10)
+            def build():
+                region_data = aggregates.by_region(cube_f, 'ovin_clavelee')
+                region_data = region_data.sort_values('ovins_vaccines', ascending=False).head(10)
             
-            fig = px.bar(
-                region_data,
-                x='ovins_vaccines',
-                y='region',
-                orientation='h',
-                color='ovins_vaccines',
-                color_continuous_scale=CHART_GRADIENT
-            )
-            fig.update_layout(height=400, margin=dict(l=10, r=10, t=10, b=10), showlegend=False)
-            apply_transparent_theme(fig)
-            st.plotly_chart(fig, use_container_width=True)
+                fig = px.bar(
+                    region_data,
+                    x='ovins_vaccines',
+                    y='region',
+                    orientation='h',
+                    color='ovins_vaccines',
+                    color_continuous_scale=CHART_GRADIENT
+                )
+                fig.update_layout(height=400, margin=dict(l=10, r=10, t=10, b=10), showlegend=False)
+                return fig
+            show_chart('ovin_clavelee', 'regions', chart_filters, build)
         
         with col2:
             st.markdown("""
@@ -491,25 +470,27 @@ with tab2:
             </div>
             """, unsafe_allow_html=True)
 
-            region_data = filtered_df.groupby('region').agg({
-                'ovins_vaccines': 'sum',
-                'total_ovins': 'sum'
-            }).reset_index()
-            region_data['taux'] = (region_data['ovins_vaccines'] / region_data['total_ovins'] * 100).round(1)
-            region_data = region_data.sort_values('taux', ascending=False).head(10)
+            def build():
+                region_data = aggregates.by_region(cube_f, 'ovin_clavelee')
+                region_data['taux'] = (region_data['ovins_vaccines'] / region_data['total_ovins'] * 100).round(1)
+                region_data = region_data.sort_values('taux', ascending=False).head(10)
             
-            fig = px.bar(
-                region_data,
-                x='taux',
-                y='region',
-                orientation='h',
-                color='taux',
-                color_continuous_scale=CHART_GRADIENT
-            )
-            fig.update_layout(height=400, margin=dict(l=10, r=10, t=10, b=10), showlegend=False)
-            apply_transparent_theme(fig)
-            st.plotly_chart(fig, use_container_width=True)
+                fig = px.bar(
+                    region_data,
+                    x='taux',
+                    y='region',
+                    orientation='h',
+                    color='taux',
+                    color_continuous_scale=CHART_GRADIENT
+                )
+                fig.update_layout(height=400, margin=dict(l=10, r=10, t=10, b=10), showlegend=False)
+                return fig
+            show_chart('ovin_clavelee', 'rates', chart_filters, build)
         
+        # Evolution temporelle
+        temporal_chart('ovin_clavelee', cube_f, date_range, chart_filters)
+        
+        profiling.lap("clavelée · graphiques")
         # Tableau détaillé
         st.markdown("""
                 <div class="section-head">
@@ -519,7 +500,9 @@ with tab2:
                 </div>
                 """, unsafe_allow_html=True)   
         display_cols = ['nom', 'region', 'date', 'ovins_vaccines', 'total_ovins']
-        st.dataframe(filtered_df[display_cols], use_container_width=True, height=400)
+        filtered_df = aggregates.apply_filters(df, selected_regions, date_range)
+        ui.record_browser(filtered_df, dimension_cols + display_cols, key="browser_clavelee", default_sort="date", height=400)
+        profiling.lap("clavelée · tableau")
     else:
         st.warning("Aucune donnée disponible pour cette campagne.")
 
@@ -528,6 +511,7 @@ with tab2:
 # ---------------------------
 with tab3:
     df = datasets['bovin_aphto']
+    cube = cubes['bovin_aphto']
     
     if len(df) > 0:
         # Filtres
@@ -542,22 +526,23 @@ with tab3:
         col1, col2 = st.columns(2)
 
         with col1:
-            regions = sorted(df['region'].dropna().unique())
+            regions = sorted(cube['region'].dropna().unique())
             selected_regions = st.multiselect("Région (العمادة)", regions, key="bovin_region")
 
         # Application filtre région
-        filtered_df = df.copy()
-        if selected_regions:
-            filtered_df = filtered_df[filtered_df['region'].isin(selected_regions)]
+        cube_f = aggregates.apply_filters(cube, selected_regions)
 
         with col2:
-            filtered_df = apply_date_filter(filtered_df, key="bovin_dates")
+            date_range = select_date_range(cube_f, key="bovin_dates")
+        cube_f = aggregates.apply_filters(cube_f, date_range=date_range)
+        chart_filters = (tuple(sorted(selected_regions)), date_range)
+        totals = aggregates.totals(cube_f, 'bovin_aphto')
 
         # KPIs
-        total_bovins = int(filtered_df['total_bovins'].sum())
-        bovins_vaccines = int(filtered_df['bovins_vaccines'].sum())
+        total_bovins = totals['total_bovins']
+        bovins_vaccines = totals['bovins_vaccines']
         taux_vaccination = (bovins_vaccines / total_bovins * 100) if total_bovins > 0 else 0
-        nb_eleveurs = len(filtered_df)
+        nb_eleveurs = totals['n']
         
         kpi_cards([
             {"label": "Total Bovins", "value": f"{total_bovins:,}".replace(",", " "), "delta": "🐄 Population totale"},
@@ -566,7 +551,9 @@ with tab3:
             {"label": "Taux de Vaccination", "value": f"{taux_vaccination:.1f}%", "delta": "📈 Couverture"},
         ])
         
+        profiling.lap("bovin · filtres et KPI")
         # Graphiques
+        filtered_df = aggregates.apply_filters(df, selected_regions, date_range)
         col1, col2 = st.columns(2)
         
         with col1:
@@ -577,20 +564,21 @@ with tab3:
             <div class="section-line-pro"></div>
             </div>
             """, unsafe_allow_html=True)
-            region_data = filtered_df.groupby('region')['bovins_vaccines'].sum().reset_index()
-            region_data = region_data.sort_values('bovins_vaccines', ascending=False).head(10)
+            def build():
+                region_data = aggregates.by_region(cube_f, 'bovin_aphto')
+                region_data = region_data.sort_values('bovins_vaccines', ascending=False).head(10)
             
-            fig = px.bar(
-                region_data,
-                x='bovins_vaccines',
-                y='region',
-                orientation='h',
-                color='bovins_vaccines',
-                color_continuous_scale=CHART_GRADIENT
-            )
-            fig.update_layout(height=400, margin=dict(l=10, r=10, t=10, b=10), showlegend=False)
-            apply_transparent_theme(fig)
-            st.plotly_chart(fig, use_container_width=True)
+                fig = px.bar(
+                    region_data,
+                    x='bovins_vaccines',
+                    y='region',
+                    orientation='h',
+                    color='bovins_vaccines',
+                    color_continuous_scale=CHART_GRADIENT
+                )
+                fig.update_layout(height=400, margin=dict(l=10, r=10, t=10, b=10), showlegend=False)
+                return fig
+            show_chart('bovin_aphto', 'regions', chart_filters, build)
         
         with col2:
             st.markdown("""
@@ -600,16 +588,21 @@ with tab3:
             <div class="section-line-pro"></div>
             </div>
             """, unsafe_allow_html=True)
-            fig = px.histogram(
-                filtered_df,
-                x='total_bovins',
-                nbins=20,
-                color_discrete_sequence=[BLUE_MAIN]
-            )
-            fig.update_layout(height=400, margin=dict(l=10, r=10, t=10, b=10))
-            apply_transparent_theme(fig)
-            st.plotly_chart(fig, use_container_width=True)
+            def build():
+                fig = px.histogram(
+                    filtered_df,
+                    x='total_bovins',
+                    nbins=20,
+                    color_discrete_sequence=[BLUE_MAIN]
+                )
+                fig.update_layout(height=400, margin=dict(l=10, r=10, t=10, b=10))
+                return fig
+            show_chart('bovin_aphto', 'herd_sizes', chart_filters, build)
         
+        # Evolution temporelle
+        temporal_chart('bovin_aphto', cube_f, date_range, chart_filters)
+        
+        profiling.lap("bovin · graphiques")
         # Tableau détaillé
         st.markdown("""
                 <div class="section-head">
@@ -619,7 +612,8 @@ with tab3:
                 </div>
                 """, unsafe_allow_html=True)   
         display_cols = ['nom', 'region', 'date', 'bovins_vaccines', 'total_bovins']
-        st.dataframe(filtered_df[display_cols], use_container_width=True, height=400)
+        ui.record_browser(filtered_df, dimension_cols + display_cols, key="browser_bovin", default_sort="date", height=400)
+        profiling.lap("bovin · tableau")
     else:
         st.warning("Aucune donnée disponible pour cette campagne.")
 
@@ -628,6 +622,7 @@ with tab3:
 # ---------------------------
 with tab4:
     df = datasets['rage']
+    cube = cubes['rage']
     
     if len(df) > 0:
         # Filtres
@@ -641,22 +636,23 @@ with tab4:
         col1, col2 = st.columns(2)
 
         with col1:
-            regions = sorted(df['region'].dropna().unique())
+            regions = sorted(cube['region'].dropna().unique())
             selected_regions = st.multiselect("Région (العمادة)", regions, key="rage_region")
 
         # Application filtre région
-        filtered_df = df.copy()
-        if selected_regions:
-            filtered_df = filtered_df[filtered_df['region'].isin(selected_regions)]
+        cube_f = aggregates.apply_filters(cube, selected_regions)
 
         with col2:
-            filtered_df = apply_date_filter(filtered_df, key="rage_dates")
+            date_range = select_date_range(cube_f, key="rage_dates")
+        cube_f = aggregates.apply_filters(cube_f, date_range=date_range)
+        chart_filters = (tuple(sorted(selected_regions)), date_range)
+        totals = aggregates.totals(cube_f, 'rage')
 
         # KPIs
-        total_chiens = int(filtered_df['total_chiens'].sum())
-        chiens_vaccines = int(filtered_df['chiens_vaccines'].sum())
+        total_chiens = totals['total_chiens']
+        chiens_vaccines = totals['chiens_vaccines']
         taux_vaccination = (chiens_vaccines / total_chiens * 100) if total_chiens > 0 else 0
-        nb_proprietaires = len(filtered_df)
+        nb_proprietaires = totals['n']
         
         kpi_cards([
             {"label": "Total Chiens", "value": f"{total_chiens:,}".replace(",", " "), "delta": "🐕 Population totale"},
@@ -665,6 +661,7 @@ with tab4:
             {"label": "Taux de Vaccination", "value": f"{taux_vaccination:.1f}%", "delta": "📈 Couverture"},
         ])
         
+        profiling.lap("rage · filtres et KPI")
         # Graphiques
         col1, col2 = st.columns(2)
         
@@ -676,20 +673,21 @@ with tab4:
             <div class="section-line-pro"></div>
             </div>
             """, unsafe_allow_html=True)
-            region_data = filtered_df.groupby('region')['chiens_vaccines'].sum().reset_index()
-            region_data = region_data.sort_values('chiens_vaccines', ascending=False).head(10)
+            def build():
+                region_data = aggregates.by_region(cube_f, 'rage')
+                region_data = region_data.sort_values('chiens_vaccines', ascending=False).head(10)
             
-            fig = px.bar(
-                region_data,
-                x='chiens_vaccines',
-                y='region',
-                orientation='h',
-                color='chiens_vaccines',
-                color_continuous_scale=CHART_GRADIENT
-            )
-            fig.update_layout(height=400, margin=dict(l=10, r=10, t=10, b=10), showlegend=False)
-            apply_transparent_theme(fig)
-            st.plotly_chart(fig, use_container_width=True)
+                fig = px.bar(
+                    region_data,
+                    x='chiens_vaccines',
+                    y='region',
+                    orientation='h',
+                    color='chiens_vaccines',
+                    color_continuous_scale=CHART_GRADIENT
+                )
+                fig.update_layout(height=400, margin=dict(l=10, r=10, t=10, b=10), showlegend=False)
+                return fig
+            show_chart('rage', 'regions', chart_filters, build)
         
         with col2:
             st.markdown("""
@@ -699,24 +697,26 @@ with tab4:
             <div class="section-line-pro"></div>
             </div>
             """, unsafe_allow_html=True)
-            region_data = filtered_df.groupby('region').agg({
-                'chiens_vaccines': 'sum',
-                'total_chiens': 'sum'
-            }).reset_index()
-            region_data['taux'] = (region_data['chiens_vaccines'] / region_data['total_chiens'] * 100).round(1)
-            region_data = region_data.sort_values('chiens_vaccines', ascending=False).head(10)
+            def build():
+                region_data = aggregates.by_region(cube_f, 'rage')
+                region_data['taux'] = (region_data['chiens_vaccines'] / region_data['total_chiens'] * 100).round(1)
+                region_data = region_data.sort_values('chiens_vaccines', ascending=False).head(10)
             
-            fig = px.pie(
-                region_data,
-                values='chiens_vaccines',
-                names='region',
-                color_discrete_sequence=px.colors.sequential.Blues
-            )
-            fig.update_layout(height=400, margin=dict(l=10, r=10, t=10, b=10))
-            fig.update_traces(textposition='inside', textinfo='percent+label')
-            apply_transparent_theme(fig)
-            st.plotly_chart(fig, use_container_width=True)
+                fig = px.pie(
+                    region_data,
+                    values='chiens_vaccines',
+                    names='region',
+                    color_discrete_sequence=px.colors.sequential.Blues
+                )
+                fig.update_layout(height=400, margin=dict(l=10, r=10, t=10, b=10))
+                fig.update_traces(textposition='inside', textinfo='percent+label')
+                return fig
+            show_chart('rage', 'top_regions', chart_filters, build)
         
+        # Evolution temporelle
+        temporal_chart('rage', cube_f, date_range, chart_filters)
+        
+        profiling.lap("rage · graphiques")
         # Tableau détaillé
         st.markdown("""
                 <div class="section-head">
@@ -726,7 +726,9 @@ with tab4:
                 </div>
                 """, unsafe_allow_html=True)   
         display_cols = ['nom', 'region', 'date', 'chiens_vaccines', 'total_chiens']
-        st.dataframe(filtered_df[display_cols], use_container_width=True, height=400)
+        filtered_df = aggregates.apply_filters(df, selected_regions, date_range)
+        ui.record_browser(filtered_df, dimension_cols + display_cols, key="browser_rage", default_sort="date", height=400)
+        profiling.lap("rage · tableau")
     else:
         st.warning("Aucune donnée disponible pour cette campagne.")
 # ---------------------------
@@ -741,6 +743,13 @@ with tab5:
         "rage": {"label": "Rage Canine", "icon": "🐕", "color": "#1565c0"},
     }
 
+    species_labels = {
+        "aphto_ovin_caprin": {"prix_ovin": "Ovins vaccinés 🐑", "prix_caprin": "Caprins vaccinés 🐐"},
+        "ovin_clavelee": {"prix_ovin": "Ovins vaccinés 🐏"},
+        "bovin_aphto": {"prix_bovin": "Bovins vaccinés 🐄"},
+        "rage": {"prix_chien": "Chiens vaccinés 🐕"},
+    }
+
     # Init version
     if "prix_version" not in st.session_state:
         st.session_state.prix_version = 0
@@ -864,6 +873,7 @@ with tab5:
 
     # Section Filtres
     df = datasets[selected_key]
+    cube = cubes[selected_key]
     if df.empty:
         st.markdown("""
         <div style="background: linear-gradient(135deg, #fef3c7 0%, #fef9e7 100%); 
@@ -892,60 +902,29 @@ with tab5:
         c1, c2 = st.columns(2)
 
         with c1:
-            regions = sorted(df['region'].dropna().unique())
+            regions = sorted(cube['region'].dropna().unique())
             selected_regions = st.multiselect("📍 Région (العمادة)", regions, key="calc_region")
 
-        filtered_df = df.copy()
-        if selected_regions:
-            filtered_df = filtered_df[filtered_df["region"].isin(selected_regions)]
+        cube_f = aggregates.apply_filters(cube, selected_regions)
 
         with c2:
-            filtered_df = apply_date_filter(filtered_df, key="calc_dates")
-
-        # Calculs
-        montant_total = 0.0
-        details = []
-
-        if selected_key == "aphto_ovin_caprin":
-            prix_ovin = float(st.session_state.prix[selected_key]["prix_ovin"])
-            prix_caprin = float(st.session_state.prix[selected_key]["prix_caprin"])
-            nb_ovins = float(filtered_df["ovins_vaccines"].sum())
-            nb_caprins = float(filtered_df["caprins_vaccines"].sum())
-            montant_ovins = nb_ovins * prix_ovin
-            montant_caprins = nb_caprins * prix_caprin
-            montant_total = montant_ovins + montant_caprins
-            details = [
-                {"Espèce": "Ovins vaccinés 🐑", "Quantité": f"{nb_ovins:,.0f}".replace(",", " "), "Prix unitaire": f"{prix_ovin:.2f} DT", "Montant": f"{montant_ovins:,.2f} DT".replace(",", " ")},
-                {"Espèce": "Caprins vaccinés 🐐", "Quantité": f"{nb_caprins:,.0f}".replace(",", " "), "Prix unitaire": f"{prix_caprin:.2f} DT", "Montant": f"{montant_caprins:,.2f} DT".replace(",", " ")},
-            ]
-
-        elif selected_key == "ovin_clavelee":
-            prix_ovin = float(st.session_state.prix[selected_key]["prix_ovin"])
-            nb_ovins = float(filtered_df["ovins_vaccines"].sum())
-            montant_total = nb_ovins * prix_ovin
-            details = [
-                {"Espèce": "Ovins vaccinés 🐏", "Quantité": f"{nb_ovins:,.0f}".replace(",", " "), "Prix unitaire": f"{prix_ovin:.2f} DT", "Montant": f"{montant_total:,.2f} DT".replace(",", " ")},
-            ]
-
-        elif selected_key == "bovin_aphto":
-            prix_bovin = float(st.session_state.prix[selected_key]["prix_bovin"])
-            nb_bovins = float(filtered_df["bovins_vaccines"].sum())
-            montant_total = nb_bovins * prix_bovin
-            details = [
-                {"Espèce": "Bovins vaccinés 🐄", "Quantité": f"{nb_bovins:,.0f}".replace(",", " "), "Prix unitaire": f"{prix_bovin:.2f} DT", "Montant": f"{montant_total:,.2f} DT".replace(",", " ")},
-            ]
-
-        else:  # rage
-            prix_chien = float(st.session_state.prix[selected_key]["prix_chien"])
-            nb_chiens = float(filtered_df["chiens_vaccines"].sum())
-            montant_total = nb_chiens * prix_chien
-            details = [
-                {"Espèce": "Chiens vaccinés 🐕", "Quantité": f"{nb_chiens:,.0f}".replace(",", " "), "Prix unitaire": f"{prix_chien:.2f} DT", "Montant": f"{montant_total:,.2f} DT".replace(",", " ")},
-            ]
+            date_range = select_date_range(cube_f, key="calc_dates")
+        cube_f = aggregates.apply_filters(cube_f, date_range=date_range)
+        totals = aggregates.totals(cube_f, selected_key)
+
+        # Calculs : un seul décompte (billing.invoice) pour le détail et les régions
+        invoice = billing.invoice({selected_key: cube_f}, st.session_state.prix, period=None)
+        unit_prices = billing.campaign_prices(st.session_state.prix, selected_key)
+        by_price = invoice.groupby("prix")[["quantite", "montant"]].sum().reindex(list(unit_prices), fill_value=0)
+        montant_total = float(by_price["montant"].sum())
+        details = [
+            {"Espèce": species_labels[selected_key][key], "Quantité": f"{row.quantite:,.0f}".replace(",", " "), "Prix unitaire": f"{unit_prices[key]:.2f} DT", "Montant": f"{row.montant:,.2f} DT".replace(",", " ")}
+            for key, row in by_price.iterrows()
+        ]
 
         # Affichage KPI Cards
         kpi_cards([
-            {"label": "Lignes filtrées", "value": f"{len(filtered_df):,}".replace(",", " "), "delta": "📌 Après filtres"},
+            {"label": "Lignes filtrées", "value": f"{totals['n']:,}".replace(",", " "), "delta": "📌 Après filtres"},
             {"label": "Montant total", "value": f"{montant_total:,.2f} DT".replace(",", " "), "delta": "💰 Total à payer"},
         ])
 
@@ -977,7 +956,7 @@ with tab5:
         </div>
         """, unsafe_allow_html=True)
 
-        if filtered_df.empty:
+        if cube_f.empty:
             st.markdown("""
             <div style="background: linear-gradient(135deg, #dbeafe 0%, #eff6ff 100%); 
                  border: 2px solid #60a5fa; border-radius: 16px; padding: 1.5rem; 
@@ -989,36 +968,35 @@ with tab5:
             </div>
             """, unsafe_allow_html=True)
         else:
-            if selected_key == "aphto_ovin_caprin":
-                prix_ovin = float(st.session_state.prix[selected_key]["prix_ovin"])
-                prix_caprin = float(st.session_state.prix[selected_key]["prix_caprin"])
-                by_region = filtered_df.groupby("region").agg(
-                    ovins_vaccines=("ovins_vaccines", "sum"),
-                    caprins_vaccines=("caprins_vaccines", "sum")
-                ).reset_index()
-                by_region["montant"] = by_region["ovins_vaccines"] * prix_ovin + by_region["caprins_vaccines"] * prix_caprin
-
-            elif selected_key == "ovin_clavelee":
-                prix_ovin = float(st.session_state.prix[selected_key]["prix_ovin"])
-                by_region = filtered_df.groupby("region").agg(
-                    ovins_vaccines=("ovins_vaccines", "sum")
-                ).reset_index()
-                by_region["montant"] = by_region["ovins_vaccines"] * prix_ovin
-
-            elif selected_key == "bovin_aphto":
-                prix_bovin = float(st.session_state.prix[selected_key]["prix_bovin"])
-                by_region = filtered_df.groupby("region").agg(
-                    bovins_vaccines=("bovins_vaccines", "sum")
-                ).reset_index()
-                by_region["montant"] = by_region["bovins_vaccines"] * prix_bovin
-
-            else:  # rage
-                prix_chien = float(st.session_state.prix[selected_key]["prix_chien"])
-                by_region = filtered_df.groupby("region").agg(
-                    chiens_vaccines=("chiens_vaccines", "sum")
-                ).reset_index()
-                by_region["montant"] = by_region["chiens_vaccines"] * prix_chien
-
-            by_region = by_region.sort_values("montant", ascending=False)
+            by_region = billing.region_table(invoice, selected_key)
             st.dataframe(by_region, use_container_width=True, height=300)
 
+    # Décompte consolidé des quatre campagnes (règlement mensuel)
+    st.markdown("""
+    <div style="margin: 2.5rem 0 1rem 0;">
+        <div style="display: flex; align-items: center; gap: 1rem; margin-bottom: 1rem;">
+            <div style="font-size: 28px; background: linear-gradient(135deg, #0d47a1, #42a5f5); 
+                 width: 48px; height: 48px; border-radius: 12px; display: flex; align-items: center; 
+                 justify-content: center; box-shadow: 0 4px 16px rgba(25, 118, 210, 0.25);">🧾</div>
+            <div style="color: #0d47a1; font-size: 20px; font-weight: 800;">Décompte consolidé (toutes campagnes)</div>
+            <div style="flex: 1; height: 2px; background: linear-gradient(90deg, #0d47a1 0%, transparent 100%);"></div>
+        </div>
+    </div>
+    """, unsafe_allow_html=True)
+
+    period_label = st.selectbox("Période de facturation", list(billing.PERIODS), key="calc_invoice_period")
+    consolidated = billing.invoice(cubes, st.session_state.prix, period=billing.PERIODS[period_label])
+    settlement = consolidated.pivot_table(index="campagne", columns="periode", values="montant", aggfunc="sum", fill_value=0,
+                                          margins=True, margins_name="Total").round(3)
+    settlement.index = [type_options.get(c, {}).get("label", c) for c in settlement.index]
+    st.dataframe(settlement, use_container_width=True)
+    with st.expander(f"Détail campagne × région × {period_label} ({len(consolidated)} lignes)"):
+        st.dataframe(consolidated, use_container_width=True, height=300, hide_index=True)
+    st.download_button("⬇️ Télécharger le décompte (CSV)", consolidated.to_csv(index=False).encode("utf-8-sig"),
+                       file_name=f"decompte_{period_label}.csv", mime="text/csv", key="calc_invoice_csv")
+    profiling.lap("calculatrice")
+
+# ---------------------------
+# PROFILAGE (MANDAT_PROFILE=1 ou ?profile=1)
+# ---------------------------
+ui.profiling_panel()
@@ -3,15 +3,16 @@ import pandas as pd
 import streamlit as st
 import plotly.express as px
 import plotly.graph_objects as go
-import openpyxl
 from datetime import datetime
 import base64
-import io
-import os
-from copy import copy
 from datetime import date, datetime
 
-DATA_FILE = os.path.join("data", "mandat sanitaire 2026.xlsx")
+from mandat import bulk_import, federation, profiling, storage, ui
+from mandat.search_index import TrigramIndex
+from mandat.campaigns import record_fields
+from mandat.locking import LockTimeout, StaleRecordError
+
+DATA_FILE = federation.CURRENT_WORKBOOK  # les saisies vont toujours dans le classeur courant
 
 # ---------------------------
 # CHARGEMENT CSS
@@ -26,315 +27,60 @@ if st.session_state.get("save_ok", False):
     st.session_state["save_ok"] = False
 
 load_css("style.css")
-
-def _next_seq(ws, seq_col: int, start_row: int = 1) -> int:
-    """Trouver le prochain numéro de séquence dans la colonne seq_col."""
-    last = 0
-    for r in range(ws.max_row, start_row - 1, -1):
-        v = ws.cell(r, seq_col).value
-        if v is not None and str(v).strip() != "":
-            try:
-                last = int(v)
-            except Exception:
-                last = 0
-            break
-    return last + 1
+ui.start_profiling("saisie")
 
 # ---------------------------
-# Helpers
-# ---------------------------
-def find_last_data_row(ws, key_col: int, start_row: int) -> int:
-    """Dernière ligne qui contient une valeur dans key_col (ignore les lignes juste formatées)."""
-    r = ws.max_row
-    while r >= start_row:
-        v = ws.cell(r, key_col).value
-        if v is not None and str(v).strip() != "":
-            return r
-        r -= 1
-    return start_row - 1
-
-def copy_row_style(ws, src_row: int, dst_row: int, max_col: int):
-    """Copie le style (bordures/cadres, formats, etc.) de src_row vers dst_row."""
-    ws.row_dimensions[dst_row].height = ws.row_dimensions[src_row].height
-    for c in range(1, max_col + 1):
-        src = ws.cell(src_row, c)
-        dst = ws.cell(dst_row, c)
-        if src.has_style:
-            dst._style = copy(src._style)
-        dst.number_format = src.number_format
-        dst.font = copy(src.font)
-        dst.border = copy(src.border)
-        dst.fill = copy(src.fill)
-        dst.alignment = copy(src.alignment)
-        dst.protection = copy(src.protection)
-
+# Lire les enregistrements
 # ---------------------------
-# NOUVELLE FONCTION: Lire les enregistrements
-# ---------------------------
-@st.cache_data
-def load_records_from_excel(path: str, campaign: str):
+@st.cache_data(max_entries=16)
+def load_records_from_excel(path: str, campaign: str, version):
     """Charge tous les enregistrements d'une campagne donnée"""
-    wb = openpyxl.load_workbook(path, data_only=True)
-    records = []
-    
-    if campaign == "aphto_ovin_caprin":
-        ws = wb["aphto ovin et caprin"]
-        start_row = 3
-        
-        for row_idx in range(start_row, ws.max_row + 1):
-            seq = ws.cell(row_idx, 13).value  # M
-            if seq is None or str(seq).strip() == "":
-                continue
-                
-            rec = {
-                "row_idx": row_idx,
-                "seq": int(seq),
-                "nom": ws.cell(row_idx, 12).value or "",  # L
-                "cin": ws.cell(row_idx, 11).value or "",  # K
-                "region": ws.cell(row_idx, 10).value or "",  # J
-                "recu_num": ws.cell(row_idx, 8).value or "",  # H
-                "date": ws.cell(row_idx, 9).value,  # I
-                "total_caprins": ws.cell(row_idx, 4).value or 0,  # D
-                "total_ovins": ws.cell(row_idx, 5).value or 0,  # E
-                "caprins_vaccines": ws.cell(row_idx, 6).value or 0,  # F
-                "ovins_vaccines": ws.cell(row_idx, 7).value or 0,  # G
-            }
-            records.append(rec)
-            
-    elif campaign == "ovin_clavelee":
-        ws = wb["ovin clavelee"]
-        start_row = 4
-        
-        for row_idx in range(start_row, ws.max_row + 1):
-            seq = ws.cell(row_idx, 10).value  # J
-            if seq is None or str(seq).strip() == "":
-                continue
-                
-            rec = {
-                "row_idx": row_idx,
-                "seq": int(seq),
-                "nom": ws.cell(row_idx, 9).value or "",  # I
-                "cin": ws.cell(row_idx, 8).value or "",  # H
-                "region": ws.cell(row_idx, 7).value or "",  # G
-                "recu_num": ws.cell(row_idx, 5).value or "",  # E
-                "date": ws.cell(row_idx, 6).value,  # F
-                "total_ovins": ws.cell(row_idx, 3).value or 0,  # C
-                "ovins_vaccines": ws.cell(row_idx, 4).value or 0,  # D
-            }
-            records.append(rec)
-            
-    elif campaign == "bovin_aphto":
-        ws = wb["bovin aphto"]
-        start_row = 4
-        
-        for row_idx in range(start_row, ws.max_row + 1):
-            seq = ws.cell(row_idx, 12).value  # L
-            if seq is None or str(seq).strip() == "":
-                continue
-                
-            rec = {
-                "row_idx": row_idx,
-                "seq": int(seq),
-                "nom": ws.cell(row_idx, 11).value or "",  # K
-                "cin": ws.cell(row_idx, 10).value or "",  # J
-                "region": ws.cell(row_idx, 9).value or "",  # I
-                "recu_num": ws.cell(row_idx, 7).value or "",  # G
-                "date": ws.cell(row_idx, 8).value,  # H
-                "total_bovins": ws.cell(row_idx, 5).value or 0,  # E
-                "bovins_vaccines": ws.cell(row_idx, 6).value or 0,  # F
-            }
-            records.append(rec)
-            
-    else:  # rage
-        ws = wb["داء الكلب"]
-        start_row = 5
-        
-        for row_idx in range(start_row, ws.max_row + 1):
-            seq = ws.cell(row_idx, 11).value  # K
-            if seq is None or str(seq).strip() == "":
-                continue
-                
-            rec = {
-                "row_idx": row_idx,
-                "seq": int(seq),
-                "nom": ws.cell(row_idx, 10).value or "",  # J
-                "cin": ws.cell(row_idx, 9).value or "",  # I
-                "region": ws.cell(row_idx, 8).value or "",  # H
-                "recu_num": ws.cell(row_idx, 6).value or "",  # F
-                "date": ws.cell(row_idx, 7).value,  # G
-                "total_chiens": ws.cell(row_idx, 4).value or 0,  # D
-                "chiens_vaccines": ws.cell(row_idx, 5).value or 0,  # E
-            }
-            records.append(rec)
-    
-    wb.close()
-    return records
-
-# ---------------------------
-# NOUVELLE FONCTION: Modifier un enregistrement
-# ---------------------------
-def update_record_in_excel(path: str, campaign: str, row_idx: int, rec: dict):
-    """Modifie un enregistrement existant dans Excel"""
-    wb = openpyxl.load_workbook(path)
-    
-    if campaign == "aphto_ovin_caprin":
-        ws = wb["aphto ovin et caprin"]
-        ws.cell(row_idx, 4).value = int(rec["total_caprins"])
-        ws.cell(row_idx, 5).value = int(rec["total_ovins"])
-        ws.cell(row_idx, 6).value = int(rec["caprins_vaccines"])
-        ws.cell(row_idx, 7).value = int(rec["ovins_vaccines"])
-        ws.cell(row_idx, 8).value = rec["recu_num"]
-        ws.cell(row_idx, 9).value = rec["date"]
-        ws.cell(row_idx, 9).number_format = "DD/MM/YYYY"
-        ws.cell(row_idx, 10).value = rec["region"]
-        ws.cell(row_idx, 11).value = rec["cin"]
-        ws.cell(row_idx, 12).value = rec["nom"]
-        
-    elif campaign == "ovin_clavelee":
-        ws = wb["ovin clavelee"]
-        ws.cell(row_idx, 3).value = int(rec["total_ovins"])
-        ws.cell(row_idx, 4).value = int(rec["ovins_vaccines"])
-        ws.cell(row_idx, 5).value = rec["recu_num"]
-        ws.cell(row_idx, 6).value = rec["date"]
-        ws.cell(row_idx, 6).number_format = "DD/MM/YYYY"
-        ws.cell(row_idx, 7).value = rec["region"]
-        ws.cell(row_idx, 8).value = rec["cin"]
-        ws.cell(row_idx, 9).value = rec["nom"]
-        
-    elif campaign == "bovin_aphto":
-        ws = wb["bovin aphto"]
-        ws.cell(row_idx, 5).value = int(rec["total_bovins"])
-        ws.cell(row_idx, 6).value = int(rec["bovins_vaccines"])
-        ws.cell(row_idx, 7).value = rec["recu_num"]
-        ws.cell(row_idx, 8).value = rec["date"]
-        ws.cell(row_idx, 8).number_format = "DD/MM/YYYY"
-        ws.cell(row_idx, 9).value = rec["region"]
-        ws.cell(row_idx, 10).value = rec["cin"]
-        ws.cell(row_idx, 11).value = rec["nom"]
-        
-    else:  # rage
-        ws = wb["داء الكلب"]
-        ws.cell(row_idx, 4).value = int(rec["total_chiens"])
-        ws.cell(row_idx, 5).value = int(rec["chiens_vaccines"])
-        ws.cell(row_idx, 6).value = rec["recu_num"]
-        ws.cell(row_idx, 7).value = rec["date"]
-        ws.cell(row_idx, 7).number_format = "DD/MM/YYYY"
-        ws.cell(row_idx, 8).value = rec["region"]
-        ws.cell(row_idx, 9).value = rec["cin"]
-        ws.cell(row_idx, 10).value = rec["nom"]
-    
-    wb.save(path)
-    wb.close()
+    return storage.load_records(path, campaign)
+
+@st.cache_resource(max_entries=16)
+def records_lookup(path: str, campaign: str, version):
+    """Table, accès par record_id et libellés du sélecteur, calculés une fois par version"""
+    records = load_records_from_excel(path, campaign, version)
+    df = pd.DataFrame(records)
+    if df.empty:
+        return df, {}, {}
+    # Libellés "#seq - nom - date" en une seule passe vectorisée (date absente -> "sans date")
+    dates = pd.to_datetime(df["date"], errors="coerce").dt.strftime("%d/%m/%Y").fillna("sans date")
+    labels = "#" + df["seq"].astype(str) + " - " + df["nom"].fillna("").astype(str) + " - " + dates
+    by_id = {rec["record_id"]: rec for rec in records}
+    return df, by_id, dict(zip(df["record_id"], labels))
+
+@st.cache_resource
+def search_index(path: str, campaign: str):
+    """Index de recherche d'une campagne, partagé entre sessions et resynchronisé à chaque version"""
+    return TrigramIndex()
 
 # ---------------------------
-# NOUVELLE FONCTION: Supprimer un enregistrement
+# Suivi des saisies de la session
 # ---------------------------
-def delete_record_from_excel(path: str, campaign: str, row_idx: int):
-    """Supprime un enregistrement en effaçant la ligne"""
-    wb = openpyxl.load_workbook(path)
-    
-    if campaign == "aphto_ovin_caprin":
-        ws = wb["aphto ovin et caprin"]
-    elif campaign == "ovin_clavelee":
-        ws = wb["ovin clavelee"]
-    elif campaign == "bovin_aphto":
-        ws = wb["bovin aphto"]
-    else:
-        ws = wb["داء الكلب"]
-    
-    ws.delete_rows(row_idx, 1)
-    wb.save(path)
-    wb.close()
-
-        
-def append_record_to_excel(path: str, campaign: str, rec: dict):
-    wb = openpyxl.load_workbook(path)
-
-    if campaign == "aphto_ovin_caprin":
-        ws = wb["aphto ovin et caprin"]
-        start_row = 3
-        seq_col = 13
-        max_col = 14
-
-        last = find_last_data_row(ws, key_col=seq_col, start_row=start_row)
-        new_row = last + 1
-        copy_row_style(ws, src_row=last, dst_row=new_row, max_col=max_col)
-
-        ws.cell(new_row, 4).value  = int(rec["total_caprins"])
-        ws.cell(new_row, 5).value  = int(rec["total_ovins"])
-        ws.cell(new_row, 6).value  = int(rec["caprins_vaccines"])
-        ws.cell(new_row, 7).value  = int(rec["ovins_vaccines"])
-        ws.cell(new_row, 8).value  = rec["recu_num"]
-        ws.cell(new_row, 9).value = rec["date"]
-        ws.cell(new_row, 9).number_format = "DD/MM/YYYY"
-        ws.cell(new_row, 10).value = rec["region"]
-        ws.cell(new_row, 11).value = rec["cin"]
-        ws.cell(new_row, 12).value = rec["nom"]
-        ws.cell(new_row, 13).value = int(ws.cell(last, 13).value or 0) + 1
-
-    elif campaign == "ovin_clavelee":
-        ws = wb["ovin clavelee"]
-        start_row = 4
-        seq_col = 10
-        max_col = 10
-
-        last = find_last_data_row(ws, key_col=seq_col, start_row=start_row)
-        new_row = last + 1
-        copy_row_style(ws, src_row=last, dst_row=new_row, max_col=max_col)
-
-        ws.cell(new_row, 3).value = int(rec["total_ovins"])
-        ws.cell(new_row, 4).value = int(rec["ovins_vaccines"])
-        ws.cell(new_row, 5).value = rec["recu_num"]
-        ws.cell(new_row, 6).value = rec["date"]
-        ws.cell(new_row, 6).number_format = "DD/MM/YYYY"
-        ws.cell(new_row, 7).value = rec["region"]
-        ws.cell(new_row, 8).value = rec["cin"]
-        ws.cell(new_row, 9).value = rec["nom"]
-        ws.cell(new_row, 10).value = int(ws.cell(last, 10).value or 0) + 1
-
-    elif campaign == "bovin_aphto":
-        ws = wb["bovin aphto"]
-        start_row = 4
-        seq_col = 12
-        max_col = 12
-
-        last = find_last_data_row(ws, key_col=seq_col, start_row=start_row)
-        new_row = last + 1
-        copy_row_style(ws, src_row=last, dst_row=new_row, max_col=max_col)
-
-        ws.cell(new_row, 5).value = int(rec["total_bovins"])
-        ws.cell(new_row, 6).value = int(rec["bovins_vaccines"])
-        ws.cell(new_row, 7).value = rec["recu_num"]
-        ws.cell(new_row, 8).value = rec["date"]
-        ws.cell(new_row, 8).number_format = "DD/MM/YYYY"
-        ws.cell(new_row, 9).value = rec["region"]
-        ws.cell(new_row, 10).value = rec["cin"]
-        ws.cell(new_row, 11).value = rec["nom"]
-        ws.cell(new_row, 12).value = int(ws.cell(last, 12).value or 0) + 1
-
-    else:  # rage
-        ws = wb["داء الكلب"]
-        start_row = 5
-        seq_col = 11
-        max_col = 11
-
-        last = find_last_data_row(ws, key_col=seq_col, start_row=start_row)
-        new_row = last + 1
-        copy_row_style(ws, src_row=last, dst_row=new_row, max_col=max_col)
-
-        ws.cell(new_row, 4).value = int(rec["total_chiens"])
-        ws.cell(new_row, 5).value = int(rec["chiens_vaccines"])
-        ws.cell(new_row, 6).value = rec["recu_num"]
-        ws.cell(new_row, 7).value = rec["date"]
-        ws.cell(new_row, 7).number_format = "DD/MM/YYYY"
-        ws.cell(new_row, 8).value = rec["region"]
-        ws.cell(new_row, 9).value = rec["cin"]
-        ws.cell(new_row, 10).value = rec["nom"]
-        ws.cell(new_row, 11).value = int(ws.cell(last, 11).value or 0) + 1
-
-    wb.save(path)
-    wb.close()
+SUBMISSIONS_SHOWN = 10
+
+def submissions_status():
+    """Saisies récentes de la session : en attente dans le journal ou intégrées au classeur"""
+    submissions = st.session_state.get("submissions", [])
+    if not submissions:
+        return
+    pending = storage.pending_tickets(DATA_FILE, [s["ticket"] for s in submissions])
+
+    # Tant qu'une saisie est en attente, seul ce bloc est relancé toutes les 2 secondes
+    @st.fragment(run_every=2 if pending else None)
+    def status_table():
+        still_pending = storage.pending_tickets(DATA_FILE, list(pending)) if pending else set()
+        if pending and not still_pending:
+            # run_every est fixé à la définition du fragment : une relance complète l'arrête
+            st.rerun()
+        st.markdown("##### 🗂️ Saisies de la session")
+        st.dataframe(pd.DataFrame([{
+            "Heure": s["heure"], "Campagne": s["campagne"], "Nom": s["nom"], "N° Reçu": s["recu_num"],
+            "Statut": "⏳ En attente d'intégration" if s["ticket"] in still_pending else "✅ Intégrée",
+        } for s in submissions]), hide_index=True, use_container_width=True)
 
+    status_table()
 
 # Configuration des options de campagne
 type_options = {
@@ -361,7 +107,7 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # TABS
-tab1, tab2 = st.tabs(["➕ Nouvelle Saisie", "✏️ Modifier/Supprimer"])
+tab1, tab2, tab3 = st.tabs(["➕ Nouvelle Saisie", "✏️ Modifier/Supprimer", "📥 Import groupé"])
 
 # ==============================================
 # TAB 1: NOUVELLE SAISIE (code existant)
@@ -560,11 +306,25 @@ with tab1:
     </div>
             """, unsafe_allow_html=True)
             
-            append_record_to_excel(DATA_FILE, campaign, rec)
-            st.session_state["save_ok"] = True
-            st.session_state["save_msg"] = f"✅ Données enregistrées : {nom}"
-            st.cache_data.clear()
-            st.rerun()
+            try:
+                ticket = storage.append_record(DATA_FILE, campaign, rec)
+            except LockTimeout:
+                st.error("⏳ Le fichier est occupé par une autre saisie. Réessayez dans quelques secondes.")
+            else:
+                submissions = st.session_state.setdefault("submissions", [])
+                submissions.insert(0, {"ticket": ticket, "heure": datetime.now().strftime("%H:%M:%S"),
+                                       "campagne": campaign_label, "nom": nom, "recu_num": recu_num})
+                del submissions[SUBMISSIONS_SHOWN:]
+                st.session_state["save_ok"] = True
+                st.session_state["save_msg"] = (
+                    f"✅ Données enregistrées : {nom}" if ticket is None
+                    else f"✅ Saisie reçue : {nom} (intégration au classeur en arrière-plan)"
+                )
+                st.rerun()
+
+    submissions_status()
+
+profiling.lap("nouvelle saisie")
 
 # ==============================================
 # TAB 2: MODIFIER/SUPPRIMER
@@ -579,15 +339,18 @@ with tab2:
     )
     
     # Charger les enregistrements
-    records = load_records_from_excel(DATA_FILE, campaign_edit)
+    records_version = storage.campaign_version(DATA_FILE, campaign_edit)
+    records = load_records_from_excel(DATA_FILE, campaign_edit, records_version)
+    index = search_index(DATA_FILE, campaign_edit).sync(records, records_version)
+    profiling.lap("modification · chargement")
     
     if not records:
         st.warning("⚠️ Aucun enregistrement trouvé pour cette campagne.")
     else:
         st.success(f"✅ {len(records)} enregistrement(s) trouvé(s)")
         
-        # Créer un DataFrame pour l'affichage
-        df_records = pd.DataFrame(records)
+        # Table, accès direct par record_id et libellés (partagés, en lecture seule)
+        df_records, records_by_id, record_labels = records_lookup(DATA_FILE, campaign_edit, records_version)
         
         st.markdown("""
         <div class="form-section-block">
@@ -608,30 +371,35 @@ with tab2:
         with col_f3:
             search_region = st.text_input("Région", key="search_region")
         
-        # Appliquer les filtres
-        filtered_df = df_records.copy()
-        if search_nom:
-            filtered_df = filtered_df[filtered_df['nom'].str.contains(search_nom, case=False, na=False)]
-        if search_cin:
-            filtered_df = filtered_df[filtered_df['cin'].str.contains(search_cin, case=False, na=False)]
-        if search_region:
-            filtered_df = filtered_df[filtered_df['region'].str.contains(search_region, case=False, na=False)]
+        # Appliquer les filtres (index trigrammes, sans parcourir tous les enregistrements).
+        # L'index est partagé entre sessions : ses record_id sont rapportés à la table de
+        # cette session (ceux d'une version plus récente qu'elle ne connaît pas sont ignorés)
+        found = index.search({"nom": search_nom, "cin": search_cin, "region": search_region})
+        filtered_df = df_records if found is None else df_records[df_records["record_id"].isin(
+            [r for r in found if r in records_by_id])]
+        profiling.lap("modification · recherche")
         
         st.markdown(f"**{len(filtered_df)} résultat(s) après filtrage**")
         
         # Afficher le tableau
         if not filtered_df.empty:
-            # Sélection d'un enregistrement
-            selected_seq = st.selectbox(
+            # Une page de résultats à la fois (tri et pagination côté serveur)
+            page_df = ui.record_browser(filtered_df, ["seq", "nom", "cin", "region", "date", "recu_num"],
+                                        key="edit_browser", default_sort="seq")
+            profiling.lap("modification · tableau")
+
+            # Sélection d'un enregistrement de la page affichée
+            selected_id = st.selectbox(
                 "Sélectionner un enregistrement",
-                options=filtered_df['seq'].tolist(),
-                format_func=lambda x: f"#{x} - {filtered_df[filtered_df['seq']==x]['nom'].iloc[0]} - {pd.to_datetime(filtered_df[filtered_df['seq']==x]['date'].iloc[0]).strftime('%d/%m/%Y')}",
+                options=page_df['record_id'].tolist(),
+                format_func=record_labels.get,
                 key="selected_record"
             )
 
             
-            if selected_seq:
-                selected_record = filtered_df[filtered_df['seq'] == selected_seq].iloc[0].to_dict()
+            if selected_id:
+                selected_record = records_by_id[selected_id]
+                selected_seq = selected_record["seq"]
                 
                 st.markdown("---")
                 st.markdown("### ✏️ Modifier les données")
@@ -666,7 +434,8 @@ with tab2:
                     </div>
                     """, unsafe_allow_html=True)
                     
-                    date_edit = st.date_input("Date", value=pd.to_datetime(selected_record["date"]), key="date_edit")
+                    record_date = pd.to_datetime(selected_record["date"], errors="coerce")
+                    date_edit = st.date_input("Date", value=None if pd.isna(record_date) else record_date, key="date_edit")
                     
                     # Champs spécifiques selon la campagne
                     if campaign_edit == "aphto_ovin_caprin":
@@ -721,7 +490,7 @@ with tab2:
                         "cin": cin_edit,
                         "region": region_edit,
                         "recu_num": recu_edit,
-                        "date": pd.to_datetime(date_edit).date(),
+                        "date": date_edit,
                     }
                     
                     if campaign_edit == "aphto_ovin_caprin":
@@ -747,20 +516,104 @@ with tab2:
                             "chiens_vaccines": chiens_vacc_edit,
                         })
                     
-                    update_record_in_excel(DATA_FILE, campaign_edit, selected_record["row_idx"], rec_update)
-                    st.success(f"✅ Enregistrement #{selected_seq} modifié avec succès!")
-                    st.cache_data.clear()
-                    st.rerun()
+                    try:
+                        storage.update_record(DATA_FILE, campaign_edit, selected_record["record_id"], rec_update,
+                                              expected_version=selected_record.get("version"),
+                                              row_hint=selected_record["row_idx"])
+                    except StaleRecordError:
+                        st.error("⚠️ Cet enregistrement a été modifié ou supprimé par un autre utilisateur. Rechargez la liste avant de réessayer.")
+                    except LockTimeout:
+                        st.error("⏳ Le fichier est occupé par une autre saisie. Réessayez dans quelques secondes.")
+                    else:
+                        st.success(f"✅ Enregistrement #{selected_seq} modifié avec succès!")
+                        st.rerun()
                 
                 # Traitement de la suppression
                 if delete_btn:
-                    delete_record_from_excel(DATA_FILE, campaign_edit, selected_record["row_idx"])
-                    st.success(f"🗑️ Enregistrement #{selected_seq} supprimé avec succès!")
-                    st.cache_data.clear()
-                    st.rerun()
+                    try:
+                        storage.delete_record(DATA_FILE, campaign_edit, selected_record["record_id"],
+                                              expected_version=selected_record.get("version"),
+                                              row_hint=selected_record["row_idx"])
+                    except StaleRecordError:
+                        st.error("⚠️ Cet enregistrement a été modifié ou supprimé par un autre utilisateur. Rechargez la liste avant de réessayer.")
+                    except LockTimeout:
+                        st.error("⏳ Le fichier est occupé par une autre saisie. Réessayez dans quelques secondes.")
+                    else:
+                        st.success(f"🗑️ Enregistrement #{selected_seq} supprimé avec succès!")
+                        st.rerun()
         else:
             st.info("ℹ️ Aucun résultat ne correspond aux critères de recherche.")
 
+profiling.lap("modification · formulaire")
+
+# ==============================================
+# TAB 3: IMPORT GROUPÉ (CSV / Excel)
+# ==============================================
+with tab3:
+    campaign_import = st.selectbox(
+        "Type de campagne",
+        options=list(type_options.keys()),
+        format_func=lambda k: type_options[k]["label"],
+        key="import_campaign",
+    )
+
+    st.info(
+        "Une ligne par enregistrement, avec les colonnes : "
+        + ", ".join(f"`{f}`" for f in record_fields(campaign_import))
+        + ". Dates au format JJ/MM/AAAA."
+    )
+    st.download_button(
+        label="⬇️ Modèle CSV",
+        data=bulk_import.template_csv(campaign_import),
+        file_name=f"modele_{campaign_import}.csv",
+        mime="text/csv",
+        key="dl_import_template",
+    )
+
+    # Nouvelle clé après chaque import : le fichier déjà importé n'est pas reproposé
+    import_round = st.session_state.get("import_round", 0)
+    uploaded = st.file_uploader("Fichier à importer", type=["csv", "xlsx"], key=f"import_file_{import_round}")
+    if uploaded is not None:
+        try:
+            valid, rejects = bulk_import.validate_records(
+                bulk_import.read_upload(uploaded, uploaded.name), campaign_import
+            )
+        except ValueError as exc:
+            st.error(f"⚠️ {exc}")
+        else:
+            col1, col2 = st.columns(2)
+            col1.metric("Lignes valides", len(valid))
+            col2.metric("Lignes refusées", len(rejects))
+
+            if len(rejects):
+                st.warning("⚠️ Les lignes suivantes ne seront pas importées :")
+                st.dataframe(rejects, use_container_width=True, hide_index=True)
+                st.download_button(
+                    label="⬇️ Télécharger les lignes refusées",
+                    data=rejects.to_csv(index=False, sep=";").encode("utf-8-sig"),
+                    file_name=f"refus_{campaign_import}.csv",
+                    mime="text/csv",
+                    key="dl_import_rejects",
+                )
+
+            if len(valid):
+                with st.expander(f"👁️ Aperçu ({len(valid)} ligne(s))"):
+                    st.dataframe(valid.head(50), use_container_width=True, hide_index=True)
+                if st.button(f"✅ Importer {len(valid)} enregistrement(s)", type="primary", key="import_btn"):
+                    try:
+                        storage.append_records(
+                            DATA_FILE, campaign_import, bulk_import.records_from_frame(valid, campaign_import)
+                        )
+                    except LockTimeout:
+                        st.error("⏳ Le fichier est occupé par une autre saisie. Réessayez dans quelques secondes.")
+                    else:
+                        st.session_state["save_ok"] = True
+                        st.session_state["save_msg"] = f"✅ {len(valid)} enregistrement(s) importé(s)."
+                        st.session_state["import_round"] = import_round + 1
+                        st.rerun()
+
+profiling.lap("import groupé")
+
 # =========================
 # EXPORT EXCEL (fichier complet)
 # =========================
@@ -776,10 +629,14 @@ st.markdown("""
     """, unsafe_allow_html=True)
 st.markdown('<div class="download-wrap">', unsafe_allow_html=True)
 
-with open(DATA_FILE, "rb") as f:
+# Le classeur est reconstruit à la demande (coûteux sur les grosses campagnes)
+if st.button("📄 Préparer le fichier Excel", use_container_width=True, key="prepare_excel_full"):
+    st.session_state["export_bytes"] = storage.export_workbook(DATA_FILE)
+
+if st.session_state.get("export_bytes"):
     st.download_button(
         label="⬇️ Télécharger mandat_sanitaire_2026.xlsx",
-        data=f,
+        data=st.session_state["export_bytes"],
         file_name="mandat_sanitaire_2026.xlsx",
         mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
         use_container_width=True,
@@ -787,4 +644,9 @@ with open(DATA_FILE, "rb") as f:
     )
 
 st.markdown("</div>", unsafe_allow_html=True)
+profiling.lap("export")
 
+# ---------------------------
+# PROFILAGE (MANDAT_PROFILE=1 ou ?profile=1)
+# ---------------------------
+ui.profiling_panel()
@@ -0,0 +1,29 @@
+import shutil
+
+import pytest
+
+from bench.generate import generate
+from mandat import journal, storage
+
+
+@pytest.fixture(scope="session")
+def workbook_template(tmp_path_factory):
+    """Classeur de test généré une seule fois (bench.generate)."""
+    path = tmp_path_factory.mktemp("modele") / "mandat sanitaire 2025.xlsx"
+    generate(str(path), rows=30, seed=3)
+    return path
+
+
+@pytest.fixture
+def workbook(workbook_template, tmp_path, monkeypatch):
+    """Copie du classeur de test, seule dans son dossier, propre à chaque test.
+
+    Pas d'intégration du journal ni de purge en arrière-plan : les tests
+    appellent compact() et purge_deleted() explicitement.
+    """
+    path = tmp_path / workbook_template.name
+    shutil.copyfile(workbook_template, path)
+    monkeypatch.setattr(journal, "FLUSH_INTERVAL", 3600)
+    monkeypatch.setattr(journal, "FLUSH_BATCH", 10**6)
+    monkeypatch.setattr(storage, "MAINTENANCE_INTERVAL", 3600)
+    return str(path)
@@ -0,0 +1,37 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from mandat import api
+
+
+@pytest.fixture
+def server(workbook):
+    srv = api.make_server(workbook, port=0)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{srv.server_port}"
+    srv.shutdown()
+    srv.server_close()
+
+
+def _get(url):
+    try:
+        with urllib.request.urlopen(url) as resp:
+            return resp.status, json.loads(resp.read())
+    except urllib.error.HTTPError as exc:
+        return exc.code, json.loads(exc.read())
+
+
+def test_unexpected_error_returns_json_500(server, monkeypatch):
+    def broken(path):
+        raise OSError("classeur illisible")
+
+    monkeypatch.setattr(api, "get_campaigns", broken)
+    assert _get(server + "/campaigns") == (500, {"error": "Erreur interne du service"})
+
+
+def test_unknown_route_is_404(server):
+    assert _get(server + "/inconnue")[0] == 404
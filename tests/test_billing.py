@@ -0,0 +1,53 @@
+import pandas as pd
+
+from mandat import aggregates, billing
+
+PRICES = {"rage": {"prix_chien": 2.0}, "ovin_clavelee": {"prix_ovin": 1.5}}
+
+
+def _rage_cube():
+    records = pd.DataFrame({
+        "region": ["A", "A", "B"],
+        "date": pd.to_datetime(["2026-01-05", "2026-02-10", "2026-01-20"]),
+        "chiens_vaccines": [3, 4, 5],
+        "total_chiens": [3, 5, 5],
+    })
+    return aggregates.build_cube(records, "rage")
+
+
+def _empty_cube(campaign):
+    return aggregates.build_cube(pd.DataFrame(columns=["region", "date"]), campaign)
+
+
+def test_empty_cube_has_datetime_dates():
+    cube = _empty_cube("rage")
+    assert pd.api.types.is_datetime64_any_dtype(cube["date"])
+
+
+def test_invoice_with_some_empty_cubes():
+    inv = billing.invoice({"rage": _rage_cube(), "ovin_clavelee": _empty_cube("ovin_clavelee")}, PRICES)
+    assert set(inv["campagne"]) == {"rage"}
+    by_period = inv.groupby("periode")["montant"].sum().to_dict()
+    assert by_period == {"2026-01": 16.0, "2026-02": 8.0}
+
+
+def test_invoice_with_all_cubes_empty():
+    for period in ["M", None]:
+        inv = billing.invoice({"rage": _empty_cube("rage"), "ovin_clavelee": _empty_cube("ovin_clavelee")},
+                              PRICES, period=period)
+        assert inv.empty
+        assert inv["montant"].sum() == 0
+
+
+def test_invoice_with_untyped_empty_cube():
+    # cube vide d'une ancienne source : colonne date en object
+    legacy = pd.DataFrame(columns=aggregates.cube_columns("rage"))
+    inv = billing.invoice({"rage": legacy}, PRICES)
+    assert inv.empty
+
+
+def test_region_amounts_matches_invoice_total():
+    cube = _rage_cube()
+    by_region = billing.region_amounts(cube, "rage", PRICES)
+    assert by_region["montant"].tolist() == [14.0, 10.0]
+    assert by_region["region"].tolist() == ["A", "B"]
@@ -0,0 +1,56 @@
+from datetime import datetime
+
+import pytest
+
+from mandat import excel_io
+
+SHEET = (b'<worksheet><sheetViews><sheetView><selection activeCell="%s"/></sheetView></sheetViews><sheetData>'
+         b'<row r="5"><c r="D5" s="%s" t="n"><v>8</v></c><c r="J5" s="%s" t="s"><v>%s</v></c></row>'
+         b'</sheetData></worksheet>')
+
+
+def _sheet(active, date_style, text_style, text_index):
+    return SHEET % (active, date_style, text_style, text_index)
+
+
+def test_sheet_digest_ignores_renumbering():
+    formats = [b"General", b"DD/MM/YYYY", b"General"]
+    digest = excel_io.sheet_digest(_sheet(b"A1", b"1", b"0", b"0"), [b"Ali", b"Amel"], formats)
+    # autres index de textes et de styles, autre cellule active : même contenu
+    assert excel_io.sheet_digest(_sheet(b"G9", b"1", b"2", b"1"), [b"Amel", b"Ali"], formats) == digest
+    assert excel_io.sheet_digest(_sheet(b"A1", b"1", b"0", b"1"), [b"Ali", b"Amel"], formats) != digest
+    assert excel_io.sheet_digest(_sheet(b"A1", b"0", b"0", b"0"), [b"Ali", b"Amel"], formats) != digest
+
+
+@pytest.fixture
+def recorded_parses(monkeypatch):
+    parsed = []
+    parse = excel_io._parse_sheets
+
+    def recording(file_obj, campaigns):
+        parsed.append(sorted(campaigns))
+        return parse(file_obj, campaigns)
+
+    monkeypatch.setattr(excel_io, "_parse_sheets", recording)
+    return parsed
+
+
+def test_append_reparses_only_the_changed_sheet(workbook, recorded_parses):
+    base = {"cin": "01234567", "region": "Sahloul", "date": datetime(2025, 3, 1), "recu_num": "R1"}
+
+    excel_io.load_vaccination_data_incremental(workbook, workbook)
+    assert recorded_parses == [["aphto_ovin_caprin", "bovin_aphto", "ovin_clavelee", "rage"]]
+
+    # le premier enregistrement par openpyxl réécrit aussi styles et autres feuilles
+    appends = [("rage", {"total_chiens": 2, "chiens_vaccines": 1}),
+               ("bovin_aphto", {"total_bovins": 3, "bovins_vaccines": 3}),
+               ("rage", {"total_chiens": 1, "chiens_vaccines": 1})]
+    for i, (campaign, counts) in enumerate(appends):
+        excel_io.append_records_to_excel(workbook, {campaign: [{**base, **counts, "nom": f"N{i}"}]}, watermark=i + 1)
+        datasets = excel_io.load_vaccination_data_incremental(workbook, workbook)
+        assert recorded_parses[-1] == [campaign]
+        for c, df in excel_io.load_vaccination_data(workbook).items():
+            assert datasets[c].equals(df)
+
+    excel_io.load_vaccination_data_incremental(workbook, workbook)  # rien n'a changé : rien n'est relu
+    assert len(recorded_parses) == 1 + 2 * len(appends)
@@ -0,0 +1,63 @@
+import importlib
+from datetime import datetime
+
+import pytest
+
+from mandat import excel_io, journal
+
+
+def _rec(nom, cin="01234567"):
+    return {"nom": nom, "cin": cin, "region": "Sahloul", "date": datetime(2025, 3, 1),
+            "recu_num": "R1", "total_chiens": 2, "chiens_vaccines": 1}
+
+
+def _names(path):
+    return [rec["nom"] for rec in journal.load_records(path, "rage")]
+
+
+def test_numbers_follow_journal_and_watermark(workbook):
+    assert journal.append_many(workbook, "rage", [_rec("A"), _rec("B")]) == [1, 2]
+    journal.compact(workbook)
+    assert excel_io.read_journal_watermark(workbook) == 2
+    assert journal.read_entries(workbook) == []
+    # journal vidé : la numérotation reprend au filigrane du classeur
+    assert journal.append(workbook, "rage", _rec("C")) == 3
+
+
+def test_pending_entries_survive_compaction_and_restart(workbook, monkeypatch):
+    journal.append(workbook, "rage", _rec("A"))
+    save = excel_io.append_records_to_excel
+
+    def save_then_append(path, batch, watermark=None):
+        save(path, batch, watermark)
+        journal.append(path, "rage", _rec("pendant"))  # arrivée pendant l'enregistrement
+
+    monkeypatch.setattr(excel_io, "append_records_to_excel", save_then_append)
+    assert journal.compact(workbook) == 1
+    monkeypatch.undo()
+
+    assert [e["rec"]["nom"] for e in journal.read_entries(workbook)] == ["pendant"]
+    assert journal.committed(workbook, [1, 2]) == {1}
+
+    importlib.reload(journal)  # redémarrage : aucun état en mémoire
+    journal.FLUSH_INTERVAL = 3600
+    assert _names(workbook)[-2:] == ["A", "pendant"]
+    assert journal.append(workbook, "rage", _rec("après")) == 3
+    assert journal.compact(workbook) == 2
+    assert _names(workbook)[-3:] == ["A", "pendant", "après"]
+    assert journal.read_entries(workbook) == []
+
+
+def test_replayed_watermark_is_idempotent(workbook):
+    before = len(_names(workbook))
+    journal.append_many(workbook, "rage", [_rec("A"), _rec("B")])
+    entries = journal.read_entries(workbook)
+    # incident entre l'enregistrement du classeur et la réécriture du journal
+    excel_io.append_records_to_excel(workbook, {"rage": [e["rec"] for e in entries]}, watermark=2)
+    excel_io.append_records_to_excel(workbook, {}, watermark=2)
+    assert excel_io.read_journal_watermark(workbook) == 2
+    assert len(_names(workbook)) == before + 2
+
+    assert journal.compact(workbook) == 0
+    assert len(_names(workbook)) == before + 2
+    assert len(journal.load_vaccination_data(workbook)["rage"]) == before + 2
@@ -0,0 +1,45 @@
+import threading
+
+import pytest
+
+from mandat import storage
+from mandat.locking import LockTimeout, StaleRecordError, workbook_lock
+
+
+@pytest.mark.parametrize("backend", ["excel", "sqlite"])
+def test_stale_version_is_rejected(workbook, monkeypatch, backend):
+    monkeypatch.setattr(storage, "BACKEND", backend)
+    rec = storage.load_records(workbook, "rage")[0]
+    old = rec["version"]
+
+    storage.update_record(workbook, "rage", rec["record_id"], {**rec, "nom": "modifié"}, old, rec["row_idx"])
+    with pytest.raises(StaleRecordError):
+        storage.update_record(workbook, "rage", rec["record_id"], {**rec, "nom": "perdu"}, old, rec["row_idx"])
+
+    current = next(r for r in storage.load_records(workbook, "rage") if r["record_id"] == rec["record_id"])
+    assert current["nom"] == "modifié"
+    storage.delete_record(workbook, "rage", rec["record_id"], current["version"], current["row_idx"])
+    with pytest.raises(StaleRecordError):
+        storage.update_record(workbook, "rage", rec["record_id"], current, current["version"], current["row_idx"])
+
+
+def test_workbook_lock_times_out(workbook):
+    held, release = threading.Event(), threading.Event()
+
+    def holder():
+        with workbook_lock(workbook):
+            held.set()
+            release.wait(5)
+
+    thread = threading.Thread(target=holder)
+    thread.start()
+    held.wait(5)
+    try:
+        with pytest.raises(LockTimeout):
+            with workbook_lock(workbook, timeout=0.1):
+                pass
+    finally:
+        release.set()
+        thread.join()
+    with workbook_lock(workbook, timeout=1):  # libéré
+        pass
@@ -0,0 +1,20 @@
+import os
+
+from mandat import report
+
+
+def test_archive_workbook_leaves_no_side_files(workbook):
+    report.build_report([workbook], ["rage"])
+    assert sorted(os.listdir(os.path.dirname(workbook))) == ["mandat sanitaire 2025.xlsx"]
+
+
+def test_empty_region_report_keeps_header(workbook, tmp_path, capsys):
+    out = tmp_path / "vide.csv"
+    assert report.main([workbook, "--by", "region", "--campaign", "rage", "--region", "aucune", "-o", str(out)]) == 0
+    assert out.read_text(encoding="utf-8").splitlines() == ["classeur,campagne,region,montant,chiens_vaccines"]
+
+
+def test_region_report_rows(workbook):
+    df = report.build_report([workbook], ["rage"], by="region")
+    assert list(df.columns) == ["classeur", "campagne", "region", "montant", "chiens_vaccines"]
+    assert df["chiens_vaccines"].sum() == report.build_report([workbook], ["rage"])["chiens_vaccines"].sum()
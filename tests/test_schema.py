@@ -0,0 +1,29 @@
+import pandas as pd
+
+from mandat.schema import normalize_frame
+
+
+def _frame(total, vaccines):
+    return normalize_frame(pd.DataFrame({
+        "nom": ["A"] * len(total), "cin": ["01234567"] * len(total), "region": ["Sahloul"] * len(total),
+        "date": pd.to_datetime(["2025-03-01"] * len(total)), "recu_num": ["R1"] * len(total),
+        "total_chiens": total, "chiens_vaccines": vaccines,
+    }), "rage")
+
+
+def test_count_arithmetic_does_not_wrap():
+    df = _frame([200, 5], [100, 7])
+    assert (df["total_chiens"] + df["chiens_vaccines"]).tolist() == [300, 12]
+    assert (df["total_chiens"] - df["chiens_vaccines"]).tolist() == [100, -2]
+    assert (df["total_chiens"] * 1000).tolist() == [200000, 5000]
+
+
+def test_counts_stay_integers_when_concatenated():
+    df = _frame([1, 2], [1, 1])
+    empty = pd.DataFrame({"total_chiens": pd.Series([], dtype="int64")})
+    assert pd.api.types.is_integer_dtype(pd.concat([df, empty])["total_chiens"])
+    assert pd.api.types.is_signed_integer_dtype(df["total_chiens"])
+
+
+def test_large_counts_widen():
+    assert _frame([3_000_000_000], [1])["total_chiens"].iloc[0] == 3_000_000_000
@@ -0,0 +1,86 @@
+import random
+
+import pytest
+
+from mandat.search_index import TrigramIndex, fold
+
+REGIONS = ["Sahloul", "Hammam Sousse", "Msaken", "Kalâa Kebira"]
+NAMES = ["Éloïse Ben Salah", "Mohamed Trabelsi", "Amel Jaziri", "Hédi Gharbi", "Straße", "Ali", "Zied Mejri"]
+
+
+def _records(n, seed=0):
+    rnd = random.Random(seed)
+    return [{"record_id": f"r{i}", "version": "v0", "nom": rnd.choice(NAMES), "cin": f"{rnd.randrange(10**8):08d}",
+             "region": rnd.choice(REGIONS)} for i in range(n)]
+
+
+def _expected(records, queries):
+    queries = {f: fold(q) for f, q in queries.items() if q and fold(q)}
+    return [rec["record_id"] for rec in records if all(q in fold(rec[f]) for f, q in queries.items())]
+
+
+QUERIES = [
+    {"nom": "a"}, {"nom": "él"}, {"nom": "ÉLOÏ"}, {"nom": "hédi"}, {"nom": "hedi"}, {"nom": "STRASSE"},
+    {"region": "kalâa"}, {"region": "sousse", "nom": "ali"}, {"cin": "12"}, {"cin": "12", "nom": "a"}, {"nom": "xyz"},
+]
+
+
+@pytest.mark.parametrize("queries", QUERIES)
+def test_search_matches_brute_force(queries):
+    records = _records(300)
+    assert TrigramIndex().sync(records).search(queries) == _expected(records, queries)
+
+
+def test_short_and_accented_queries():
+    records = [{"record_id": "a", "nom": "Éloïse", "cin": "01234567", "region": "Kalâa Kebira"},
+               {"record_id": "b", "nom": "Eloise", "cin": "7654321", "region": "Msaken"}]
+    index = TrigramIndex().sync(records)
+    assert index.search({"nom": "é"}) == ["a"]
+    assert index.search({"nom": "ÉLOÏ"}) == ["a"]
+    assert index.search({"nom": "eloi"}) == ["b"]  # les accents ne sont pas ignorés
+    assert index.search({"region": "LÂ"}) == ["a"]
+    assert index.search({"cin": "7654321"}) == ["b"]
+    assert index.search({"nom": "  ", "cin": ""}) is None
+
+
+def test_sync_after_edits_and_deletes():
+    records = _records(200, seed=1)
+    index = TrigramIndex().sync(records, token=1)
+
+    records = [dict(rec) for rec in records]
+    for rec in records[::7]:
+        rec.update(nom="Nouveau Nom", version="v1")
+    del records[3:40:3]
+    records.append({"record_id": "neuf", "version": "v0", "nom": "Éloïse Nouvelle", "cin": "00000001", "region": "Msaken"})
+
+    index.sync(records, token=1)  # même jeton : rien n'est fait
+    assert index.search({"nom": "nouveau"}) != _expected(records, {"nom": "nouveau"})
+
+    index.sync(records, token=2)
+    for queries in QUERIES + [{"nom": "nouveau"}, {"nom": "nouvelle"}, {"cin": "00000001"}]:
+        assert index.search(queries) == _expected(records, queries)
+
+    # texte qui disparaît : plus aucun trigramme ne doit y mener
+    records = [rec for rec in records if rec["nom"] != "Straße"]
+    index.sync(records, token=3)
+    assert index.search({"nom": "straße"}) == []
+    assert index.search({"nom": "str"}) == _expected(records, {"nom": "str"})
+
+
+def test_removed_texts_are_pruned():
+    index = TrigramIndex().sync(_records(200, seed=2), token=1)
+    index.sync([{"record_id": "x", "version": "v0", "nom": "Ali", "cin": "1", "region": "Msaken"}], token=2)
+    assert {f: sorted(codes) for f, codes in index._text_codes.items()} == {
+        "nom": ["ali"], "cin": ["1"], "region": ["msaken"]}
+    assert index.search({"nom": "a"}) == ["x"]
+
+
+def test_ids_from_a_newer_version_stay_valid():
+    old = _records(100, seed=3)
+    index = TrigramIndex().sync(old, token=1)
+    new = old[10:] + [{"record_id": "neuf", "version": "v0", "nom": "Ali", "cin": "2", "region": "Msaken"}]
+    index.sync(new, token=2)  # une autre session resynchronise entre-temps
+    found = index.search({"nom": "ali"})
+    assert found == _expected(new, {"nom": "ali"})
+    known = {rec["record_id"] for rec in old}
+    assert [r for r in found if r in known] == [r for r in _expected(old, {"nom": "ali"}) if r in found]
@@ -0,0 +1,35 @@
+import csv
+import os
+
+import pandas as pd
+import pytest
+
+from mandat import billing, federation, statements
+from mandat.campaigns import CAMPAIGNS
+
+PRICES = {"aphto_ovin_caprin": {"prix_ovin": 1.5}, "rage": {"prix_chien": 2.0}}
+
+
+def test_cin_key_restores_leading_zeros():
+    assert statements.cin_key(pd.Series(["1234567", " 01234567", "AB12", None])).tolist()[:3] == [
+        "01234567", "01234567", "AB12"]
+
+
+def test_one_statement_per_cin(workbook, tmp_path):
+    campaigns = list(CAMPAIGNS)
+    workdir = tmp_path / "tranches"
+    workdir.mkdir()
+    parts = statements.partition_lines(workbook, campaigns, str(workdir), PRICES)
+    out = tmp_path / "releves"
+    count, amount = statements.generate(map(statements.read_partition, parts), str(out), workers=1)
+
+    with open(out / statements.INDEX_FILE, encoding="utf-8-sig") as f:
+        index = list(csv.DictReader(f, delimiter=";"))
+    cins = [row["cin"] for row in index]
+    assert len(cins) == len(set(cins)) == count
+    assert sorted(os.listdir(out)) == sorted([statements.INDEX_FILE] + [row["fichier"] for row in index])
+
+    cubes = {c: federation.load_cube(workbook, c) for c in campaigns}
+    assert amount == pytest.approx(billing.invoice(cubes, PRICES)["montant"].sum())
+    # archive : lue depuis Excel, aucun fichier créé à côté
+    assert sorted(os.listdir(tmp_path)) == ["mandat sanitaire 2025.xlsx", "releves", "tranches"]
@@ -0,0 +1,30 @@
+import io
+from datetime import datetime
+from pathlib import Path
+
+import openpyxl
+
+from mandat import excel_io, journal, storage
+from mandat.campaigns import CAMPAIGNS
+
+
+def test_excel_export_leaves_the_workbook_untouched(workbook, monkeypatch):
+    monkeypatch.setattr(storage, "BACKEND", "excel")
+    records = storage.load_records(workbook, "rage")
+    deleted = records[0]
+    storage.delete_record(workbook, "rage", deleted["record_id"], deleted["version"], deleted["row_idx"])
+    storage.append_record(workbook, "rage", {"nom": "En attente", "cin": "01234567", "region": "Sahloul",
+                                             "date": datetime(2025, 3, 1), "recu_num": "R1",
+                                             "total_chiens": 2, "chiens_vaccines": 1})
+    before = Path(workbook).read_bytes(), Path(journal.journal_path(workbook)).read_bytes()
+
+    exported = storage.export_workbook(workbook)
+
+    assert (Path(workbook).read_bytes(), Path(journal.journal_path(workbook)).read_bytes()) == before
+    names = [rec["nom"] for rec in excel_io.load_records_from_excel(io.BytesIO(exported), "rage")]
+    assert names[-1] == "En attente"
+    assert len(names) == len(records)  # une ligne retirée, une ajoutée
+    ws = openpyxl.load_workbook(io.BytesIO(exported))[CAMPAIGNS["rage"]["sheet"]]
+    ids = [row[0] for row in ws.iter_rows(min_col=CAMPAIGNS["rage"]["id_col"], max_col=CAMPAIGNS["rage"]["id_col"],
+                                          values_only=True)]
+    assert deleted["record_id"] not in ids